@@ -0,0 +1,148 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+from typing import Dict, Optional, Union
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the memory of the worker is not limited
+    resource = None
+
+from batch_eval import evaluate_line
+
+TIMED_OUT = "Timed out"
+MEMORY_EXCEEDED = "Memory limit exceeded"
+
+# Budgets of one expression, seconds of computation and bytes of the address space of the worker process.
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_MEMORY_LIMIT = 1024 * 1024 * 1024
+
+Variables = Optional[Dict[str, Union[int, float]]]
+
+def worker_main(memory_limit: int) -> None:
+    """
+    Evaluates expressions received as JSON lines [expression, variables] on the standard input and writes
+    the results as JSON lines to the standard output. The worker runs as a new interpreter (see EvaluationWorker.start),
+    so it does not share the memory of the caller (e.g. all of Qt), which would count to its limit.
+    """
+    if resource is not None and memory_limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # The worker is ready, its start does not count to the timeout of the first expression
+    print(json.dumps("ready"), flush=True)
+
+    for line in sys.stdin:
+        try:
+            expression, variables = json.loads(line)
+            result = evaluate_line(expression, variables)
+        except MemoryError:
+            result = MEMORY_EXCEEDED
+        except Exception:
+            # The worker must not die, the parent would take it for exceeding the memory
+            result = "Math error"
+
+        print(json.dumps(result), flush=True)
+
+class EvaluationWorker():
+    """
+    Process evaluating one expression at a time, which is killed (and started again for the next expression)
+    when the expression takes longer than its timeout or its evaluation is cancelled. The process stays alive
+    between expressions, so it does not start again and keeps its evaluation cache.
+    """
+    def __init__(self, memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT) -> None:
+        self.memory_limit = memory_limit
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.lock: Optional[asyncio.Lock] = None
+
+    async def start(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), str(self.memory_limit or 0),
+                                                            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        await self.process.stdout.readline()
+
+    async def kill(self) -> None:
+        process, self.process = self.process, None
+
+        if process is not None:
+            if process.returncode is None:
+                process.kill()
+
+            process.stdin.close()
+            await process.wait()
+
+    async def evaluate(self, expression: str, variables: Variables = None, timeout: Optional[float] = DEFAULT_TIMEOUT) -> str:
+        """
+        Returns the result of evaluation of <expression> with <variables>, TIMED_OUT if it takes longer
+        than <timeout> seconds (None for no limit) and MEMORY_EXCEEDED if it needs more memory than memory_limit.
+        Cancelling the returned coroutine kills the computation.
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            try:
+                if self.process is None or self.process.returncode is not None:
+                    await self.start()
+
+                self.process.stdin.write(json.dumps([expression, variables]).encode() + b"\n")
+                await self.process.stdin.drain()
+
+                line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+            except asyncio.TimeoutError:
+                await self.kill()
+                return TIMED_OUT
+            except asyncio.CancelledError:
+                await self.kill()
+                raise
+            except ConnectionError:
+                line = b""
+
+            if not line:
+                # The worker died, e.g. the operating system killed it for its memory
+                await self.kill()
+                return MEMORY_EXCEEDED
+
+            return json.loads(line)
+
+    async def close(self) -> None:
+        await self.kill()
+
+async def evaluate_async(expression: str, variables: Variables = None, timeout: Optional[float] = DEFAULT_TIMEOUT,
+                         memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT) -> str:
+    """
+    Evaluates <expression> in a new worker process with the given budgets (see EvaluationWorker.evaluate).
+    EvaluationWorker should be used instead for more expressions, so the worker does not start for every one.
+    """
+    worker = EvaluationWorker(memory_limit)
+
+    try:
+        return await worker.evaluate(expression, variables, timeout)
+    finally:
+        await worker.close()
+
+class BackgroundEvaluator():
+    """
+    Runs an event loop with EvaluationWorker in a background thread, so code without an event loop (e.g. the GUI)
+    can submit expressions and is notified by the returned futures. Cancelling a future kills its computation.
+    """
+    def __init__(self, timeout: Optional[float] = DEFAULT_TIMEOUT, memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT) -> None:
+        self.timeout = timeout
+        self.worker = EvaluationWorker(memory_limit)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, expression: str, variables: Variables = None) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self.worker.evaluate(expression, variables, self.timeout), self.loop)
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.worker.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+if __name__ == "__main__":
+    worker_main(int(sys.argv[1]))
@@ -0,0 +1,109 @@
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Union
+
+from my_eval import evaluation
+
+def evaluate_line(expression: str, variables: Optional[Dict[str, Union[int, float]]] = None) -> str:
+    """
+    Returns the result of evaluation of <expression> with <variables>, "Math error" where the math module raises
+    (e.g. math.pow overflows or a domain error), so one such expression does not stop the whole batch.
+    """
+    try:
+        return evaluation(expression, variables)
+    except (ArithmeticError, ValueError):
+        return "Math error"
+
+def evaluate_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yields the result of evaluation for every expression in <lines> (one expression per line), as soon as it is computed.
+    Lines are consumed lazily, so any number of them is evaluated in constant memory.
+    """
+    for line in lines:
+        yield evaluate_line(line.rstrip("\r\n"))
+
+# Number of lines sent to a worker at once and the number of chunks per worker that are read ahead,
+# which bounds the memory while the workers do not wait for the next chunk.
+CHUNK_SIZE = 1000
+CHUNKS_AHEAD = 4
+
+def chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(lines)
+    chunk = list(islice(iterator, size))
+
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+def evaluate_chunk(chunk: List[str]) -> List[str]:
+    return list(evaluate_lines(chunk))
+
+def evaluate_lines_parallel(lines: Iterable[str], workers: int, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Yields the same results as evaluate_lines in the same order, but the chunks of <chunk_size> lines are evaluated
+    by a pool of <workers> processes. At most CHUNKS_AHEAD chunks per worker are in progress, so the memory stays bounded.
+    """
+    with ProcessPoolExecutor(workers) as executor:
+        pending: Deque[Future] = deque()
+
+        for chunk in chunks(lines, chunk_size):
+            pending.append(executor.submit(evaluate_chunk, chunk))
+
+            if len(pending) >= workers * CHUNKS_AHEAD:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+def write_results(results: Iterable[str], output: TextIO, flush: bool) -> None:
+    for result in results:
+        output.write(result + "\n")
+
+        if flush:
+            output.flush()
+
+def parse_arguments(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluates expressions, one per line, and writes one result per line.")
+    parser.add_argument("input", nargs="?", default="-", help="file with expressions (standard input if omitted or -)")
+    parser.add_argument("-o", "--output", default="-", help="file for results (standard output if omitted or -)")
+    parser.add_argument("--flush", action="store_true", help="flush the output after every result")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="number of worker processes (0 for one per CPU)")
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.workers < 0:
+        parser.error("number of workers can not be negative")
+
+    return arguments
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arguments = parse_arguments(argv)
+
+    input_file = sys.stdin if arguments.input == "-" else open(arguments.input, encoding="utf-8")
+    output_file = sys.stdout if arguments.output == "-" else open(arguments.output, "w", encoding="utf-8")
+
+    workers = arguments.workers or os.cpu_count() or 1
+    results = evaluate_lines(input_file) if workers == 1 else evaluate_lines_parallel(input_file, workers)
+
+    try:
+        write_results(results, output_file, arguments.flush)
+    except BrokenPipeError:
+        # The reader (e.g. head) does not want more results, the rest of the output goes nowhere,
+        # so flushing it at exit does not fail again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
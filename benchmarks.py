@@ -0,0 +1,433 @@
+from timeit import repeat
+import os
+import tempfile
+import tracemalloc
+from time import perf_counter
+from sys import getsizeof
+from typing import Callable, List, Optional
+
+from my_eval import Type, Token, Ast_node, ONE_CHARACTER_TYPES, ALL_FUNCTIONS, lex_expr, parse_expr, optimize_ast, compile_ast, \
+    NodeFactory, NodeTable, evaluate_ast, result_value
+from eval_bytecode import Bytecode
+from batch_eval import evaluate_line, evaluate_lines, evaluate_lines_parallel
+from incremental_eval import IncrementalEvaluator
+from history import HistoryEntry, HistoryStore
+from replay import replay
+from notes_io import MappedNotes
+from numeric_backends import evaluate_backend_ast, evaluate_with_backend, decimal_backend, FRACTION_BACKEND, INTERVAL_BACKEND
+
+try:
+    from plotting import Plotter, View
+except ImportError:
+    # Plotting needs NumPy, benchmark_plot_pan is skipped without it
+    Plotter = None
+
+# Expressions from eval_tests.py
+BENCHMARK_EXPRESSIONS: List[str] = [
+    "( 75,2 - sroot ( pi - e * 0 ) ) ^ 3 ^ 2 - 3 log_base 5 * 9 yth_root 6 + ( 8 * arcsin 5 - ( 5 / tan ( pi / 2 ) ) )",
+    "3 + 4 * 2 * 5 ^ 6 ^ (6 + 1) * 8 * 9 + 10",
+    "4* sin (5) ^ 6^8*7",
+    "3 + 4 ^ 2 / (1 + 2 * sin (2 * 5^2^3 * 4 + 3 mod 2 mod 9 * 5 + 3) ^ (-2 - 1) * 3) * 5 ^ 3 - 1",
+    "sin 7 log_base (5 + 5 yth_root 6) yth_root 5",
+    "- (1 + 2,3) ^ 2,02 ^ (sin cos tan 456,45896 * 5,326)",
+    "(-sin pi - e) * tan (-e + pi / 2) ^ ((-pi + 1) / 3)",
+    "5 + cos (sin (9 / (3 * (2 - sin arcsin 5 / (42 + 3)) - 2) ^ 4) + 6)",
+    "1 - (2 + 3)",
+    "sin (pi / 2) + (5 log_base 25 + 3 mod 2)",
+    "5 - abs ( sroot ( 5 log_base 3 ) * arccos( -1 + ( 1 / ( 2,36 * e - 3 ) ) ) / ( arctan ( pi / 2 - 0,26 ) ) - 3)"]
+
+LONG_EXPRESSION = " + ".join(BENCHMARK_EXPRESSIONS * 100)
+
+def measure(function: Callable[[], object], number: int) -> float:
+    """
+    Returns the best time of one call of <function> in microseconds.
+    """
+    return min(repeat(function, number=number, repeat=5)) / number * 1e6
+
+def report(name: str, baseline: float, current: float) -> None:
+    print(f"{name:<40} {baseline:>12.1f} us {current:>12.1f} us {baseline / current:>8.2f}x")
+
+def char_loop_tokenize(expression: str) -> Optional[List[Token]]:
+    """
+    Tokenizer that walked the expression one character at a time, before it was replaced by lex_expr.
+    Kept only as the baseline of benchmark_lexer.
+    """
+    tokens: List[Token] = []
+
+    token_type: Optional[Type] = None
+    token_begin = 0
+    i = 0
+
+    while i < len(expression):
+        char = expression[i]
+
+        if token_type is None:
+            if char == ' ':
+                i += 1
+                continue
+
+            if char.isdigit():
+                token_type = Type.NUMBER
+                token_begin = i
+                decimal_point = False
+                i += 1
+                continue
+
+            if char in ONE_CHARACTER_TYPES:
+                tokens.append(Token(char, ONE_CHARACTER_TYPES[char]))
+                i += 1
+                continue
+
+            if char == ',':
+                return None
+
+            token_type = Type.FUNCTION
+            token_begin = i
+            i += 1
+            continue
+
+        if token_type == Type.NUMBER:
+            if char.isdigit() or (char == ',' and not decimal_point):
+                decimal_point = decimal_point or char == ','
+                i += 1
+                continue
+
+            if (char in ONE_CHARACTER_TYPES or char == ' ') and not expression[i - 1] == ',':
+                tokens.append(Token(expression[token_begin : i], Type.NUMBER))
+                token_type = None
+                continue
+
+            return None
+
+        value = expression[token_begin : i]
+
+        if (value == 'pi' or value == 'e'):
+            if char == '(':
+                return None
+
+            if char in ONE_CHARACTER_TYPES or char == ' ':
+                tokens.append(Token(value, Type.FUNCTION))
+                token_type = None
+                continue
+
+        if char == ' ' or char == '(':
+            if value not in ALL_FUNCTIONS:
+                return None
+
+            tokens.append(Token(value, Type.FUNCTION))
+            token_type = None
+            continue
+
+        if char.isdigit() or char in ONE_CHARACTER_TYPES or char == ',':
+            return None
+        i += 1
+
+    value = expression[token_begin : i]
+
+    if token_type == Type.NUMBER:
+        if expression[i - 1].isdigit():
+            tokens.append(Token(value, Type.NUMBER))
+            return tokens
+
+        return None
+
+    if token_type == Type.FUNCTION:
+        if value != 'pi' and value != 'e' and value not in ALL_FUNCTIONS:
+            return None
+
+        tokens.append(Token(value, Type.FUNCTION))
+
+    return tokens
+
+# lex_expr is about 2x faster than the character loop, not the 5x aimed for: LEXEME_REGEX.findall alone takes about
+# a fifth of the time of the loop on LONG_EXPRESSION and building the tokens with their offsets from the matches takes
+# about as long again, so lexing with one regular expression can not be more than about 4x faster.
+def benchmark_lexer() -> None:
+    print("Lexer (character loop -> lex_expr):")
+
+    baseline = sum(measure(lambda: char_loop_tokenize(expr), 2000) for expr in BENCHMARK_EXPRESSIONS)
+    current = sum(measure(lambda: lex_expr(expr), 2000) for expr in BENCHMARK_EXPRESSIONS)
+    report("eval_tests.py expressions", baseline, current)
+
+    baseline = measure(lambda: char_loop_tokenize(LONG_EXPRESSION), 10)
+    current = measure(lambda: lex_expr(LONG_EXPRESSION), 10)
+    report(f"one expression of {len(LONG_EXPRESSION)} characters", baseline, current)
+
+REPEATED_SUBTREES_EXPRESSION = "sin (x) ^ 2 + cos (x) ^ 2 + sin (x) * cos (x)"
+
+def benchmark_shared_subtrees() -> None:
+    print("Repeated subtrees (closures over the tree -> NodeTable):")
+
+    for expression in [REPEATED_SUBTREES_EXPRESSION, " * ".join(["(" + REPEATED_SUBTREES_EXPRESSION + ")"] * 20)]:
+        root = optimize_ast(parse_expr(expression, lex_expr(expression, ["x"]))[0])
+        tree = compile_ast(root)
+        dag = NodeTable(NodeFactory().share(root))
+        variables = {"x" : 0.5}
+
+        report(f"{len(expression)} characters", measure(lambda: tree(variables), 2000), measure(lambda: dag(variables), 2000))
+
+class DictToken():
+    """
+    Token as it was before it got __slots__, kept only as the baseline of benchmark_node_memory.
+    """
+    def __init__(self, value: str, type: Type) -> None:
+        self.type = type
+        self.value = value
+
+class DictAst_node():
+    """
+    Ast_node as it was before it got __slots__, kept only as the baseline of benchmark_node_memory.
+    """
+    def __init__(self, node: Ast_node) -> None:
+        self.token = DictToken(node.token.value, node.token.type)
+        self.number = node.number
+        self.decimal_number = node.decimal_number
+        self.children: List[DictAst_node] = []
+
+def tree_nodes(root: object) -> List[object]:
+    nodes = [root]
+
+    for node in nodes:
+        nodes.extend(node.children)
+
+    return nodes
+
+def tree_size(root: object) -> int:
+    """
+    Returns number of bytes held by the nodes of the tree with root node <root>, their tokens and children lists.
+    """
+    size = 0
+
+    for node in tree_nodes(root):
+        objects = [node, node.token, node.token.value, node.children, node.number, node.decimal_number]
+        objects += [vars(item) for item in (node, node.token) if hasattr(item, "__dict__")]
+        size += sum(getsizeof(item) for item in objects if item is not None)
+
+    return size
+
+def dict_tree(root: Ast_node) -> DictAst_node:
+    copies = {id(node) : DictAst_node(node) for node in tree_nodes(root)}
+
+    for node in tree_nodes(root):
+        copies[id(node)].children = [copies[id(child)] for child in node.children]
+
+    return copies[id(root)]
+
+def benchmark_node_memory() -> None:
+    print("Bytes per node (__dict__ classes -> __slots__ classes -> NodeTable):")
+
+    expression = " + ".join(["(" + expression + ")" for expression in BENCHMARK_EXPRESSIONS] * 400)
+    root = parse_expr(expression, lex_expr(expression))[0]
+    node_count = len(tree_nodes(root))
+
+    print(f"{node_count} nodes {tree_size(dict_tree(root)) / node_count:>12.1f} B {tree_size(root) / node_count:>12.1f} B "
+          f"{NodeTable(root).size() / node_count:>12.1f} B")
+
+def peak_allocation(function: Callable[[], object]) -> int:
+    """
+    Returns the peak number of bytes allocated during one call of <function>.
+    """
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak
+
+def benchmark_bytecode() -> None:
+    print("Evaluation (evaluate_ast -> Bytecode):")
+
+    baseline = current = 0.0
+    baseline_peak = current_peak = 0
+    evaluated: List[str] = []
+
+    for expression in BENCHMARK_EXPRESSIONS:
+        root = parse_expr(expression, lex_expr(expression))[0]
+        bytecode = Bytecode.from_ast(root)
+
+        try:
+            error = evaluate_ast(root)[1]
+        except ArithmeticError:
+            # math.pow overflows, the same in both evaluators
+            continue
+
+        if error == "":
+            evaluated.append("(" + expression + ")")
+
+        baseline += measure(lambda: evaluate_ast(root), 2000)
+        current += measure(lambda: bytecode({}), 2000)
+        baseline_peak += peak_allocation(lambda: evaluate_ast(root))
+        current_peak += peak_allocation(lambda: bytecode({}))
+
+    report("eval_tests.py expressions", baseline, current)
+    print(f"{'peak allocation':<40} {baseline_peak:>12} B  {current_peak:>12} B {baseline_peak / current_peak:>8.2f}x")
+
+    # Only expressions without errors, so the whole expression is evaluated
+    expression = " + ".join(evaluated * 200)
+    root = parse_expr(expression, lex_expr(expression))[0]
+    bytecode = Bytecode.from_ast(root)
+    report(f"one expression of {len(expression)} characters", measure(lambda: evaluate_ast(root), 10), measure(lambda: bytecode({}), 10))
+
+def benchmark_parallel_batch() -> None:
+    print("Batch evaluation (evaluate_lines -> evaluate_lines_parallel):")
+
+    # Every expression is different, so the evaluation cache does not help
+    corpus = [BENCHMARK_EXPRESSIONS[i % len(BENCHMARK_EXPRESSIONS)] + " + " + str(i) for i in range(20000)]
+
+    start = perf_counter()
+    expected = list(evaluate_lines(corpus))
+    baseline = perf_counter() - start
+
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        start = perf_counter()
+        results = list(evaluate_lines_parallel(corpus, workers))
+        current = perf_counter() - start
+
+        assert results == expected
+        report(f"{workers} workers, {len(corpus) / current:.0f} expressions/s", baseline * 1e6, current * 1e6)
+
+def benchmark_backends() -> None:
+    print("Numeric backends (evaluate_ast -> evaluate_backend_ast):")
+
+    roots = [parse_expr(expression, lex_expr(expression))[0] for expression in BENCHMARK_EXPRESSIONS]
+    baseline = 0.0
+
+    for root in roots:
+        try:
+            evaluate_ast(root)
+        except ArithmeticError:
+            continue
+
+        baseline += measure(lambda: evaluate_ast(root), 200)
+
+    backends = [("decimal, 28 digits", decimal_backend(28)), ("decimal, 100 digits", decimal_backend(100)),
+                ("fraction (ends at irrational results)", FRACTION_BACKEND), ("interval", INTERVAL_BACKEND)]
+
+    for name, backend in backends:
+        current = sum(measure(lambda: evaluate_backend_ast(root, backend, {}), 200) for root in roots)
+        report(name, baseline, current)
+
+    # A history of different expressions, so the evaluation cache and the parse cache of backends do not help
+    history = [BENCHMARK_EXPRESSIONS[i % len(BENCHMARK_EXPRESSIONS)] + " + " + str(i) for i in range(5000)]
+    start = perf_counter()
+    list(evaluate_lines(history))
+    baseline = perf_counter() - start
+
+    start = perf_counter()
+    for expression in history:
+        evaluate_with_backend(expression, "interval")
+    current = perf_counter() - start
+
+    report(f"interval history, {len(history) / current:.0f} expressions/s", baseline * 1e6, current * 1e6)
+
+def benchmark_incremental_preview() -> None:
+    print("Preview of typing (lex, parse and evaluate_ast -> IncrementalEvaluator):")
+
+    pieces = ["sin ", "( ", "1", "2", ",", "5", " )", " + "]
+
+    # Keystrokes ending with " )", so the expression is valid
+    for keystrokes in [103, 999, 9999]:
+        typed = "".join(pieces[i % len(pieces)] for i in range(keystrokes - 1))
+        expression = typed + pieces[(keystrokes - 1) % len(pieces)]
+        times: List[float] = []
+
+        for _ in range(20):
+            # The previous valid expression was previewed before, typed ends inside a bracket
+            incremental = IncrementalEvaluator()
+            incremental.evaluate(expression[:-len("".join(pieces))])
+            incremental.evaluate(typed)
+
+            start = perf_counter()
+            incremental.evaluate(expression)
+            times.append(perf_counter() - start)
+
+        full = measure(lambda: evaluate_ast(parse_expr(expression, lex_expr(expression))[0]), 5)
+        report(f"keystroke {keystrokes}, {len(expression)} characters", full, min(times) * 1e6)
+
+def benchmark_plot_pan() -> None:
+    print("Redrawing a plot while dragging it (sampling every view -> cached tiles):")
+
+    if Plotter is None:
+        print("NumPy is not installed, skipped.")
+        return
+
+    view = View.centered(-10, 10, 800, 600)
+    # Dragging by 5 pixels per mouse move
+    views = [view.pan(-5 * i, 0) for i in range(200)]
+
+    for expression in ["sin x * x", "tan x + ln abs x"]:
+        uncached = measure(lambda: [Plotter(expression).polylines(v) for v in views], 1) / len(views)
+        cached = measure(lambda: [plotter.polylines(v) for plotter in [Plotter(expression)] for v in views], 1) / len(views)
+        report(expression, uncached, cached)
+
+def benchmark_history_search() -> None:
+    print("Searching saved history of 100000 entries (LIKE -> full-text index):")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(os.path.join(directory, "history.sqlite3"))
+
+        for i in range(100000):
+            expression = BENCHMARK_EXPRESSIONS[i % len(BENCHMARK_EXPRESSIONS)] + " + " + str(i)
+            store.add(HistoryEntry(expression, str(i), i))
+
+        store.flush()
+
+        for text in ["log_base", "arcsin 5 9999", "cos 5,326 123"]:
+            full_text = measure(lambda: store.search(text), 5)
+            store.full_text = False
+            like = measure(lambda: store.search(text), 5)
+            store.full_text = True
+            report(text, like, full_text)
+
+        store.close()
+
+def benchmark_replay() -> None:
+    print("Replaying 20000 entries of history (every entry -> distinct expressions with their ans):")
+
+    # Session where the benchmark expressions are repeated and some expressions use the previous result
+    entries: List[HistoryEntry] = []
+    ans = None
+
+    for i in range(20000):
+        expression = BENCHMARK_EXPRESSIONS[i % len(BENCHMARK_EXPRESSIONS)] if i % 3 else "ans * 2 + " + str(i % 50)
+        result = evaluate_line(expression, {} if ans is None else {"ans" : ans})
+        ans = result_value(result) if result_value(result) is not None else ans
+        entries.append(HistoryEntry(expression, result, i))
+
+    every_entry = measure(lambda: [evaluate_line(entry.expression, {"ans" : 1}) for entry in entries], 1)
+    report("replay", every_entry, measure(lambda: replay(entries), 1))
+
+def benchmark_mapped_notes() -> None:
+    print("Opening 50 MB of notes and reading the last line (reading the text -> mapped and indexed):")
+
+    def read_text(path: str) -> str:
+        with open(path, encoding="utf-8") as file:
+            return file.read().splitlines()[-1]
+
+    def read_mapped(path: str) -> str:
+        notes = MappedNotes(path)
+        notes.indexer.join()
+        line = notes.line(notes.line_count - 1)
+        notes.close()
+
+        return line
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "notes.txt")
+
+        with open(path, "w", encoding="utf-8") as file:
+            for i in range(50 * 1024 * 1024 // 1024):
+                file.write("".join(expression[:80] + " =\n" + str(i) + "\n" for expression in BENCHMARK_EXPRESSIONS[:11]))
+
+        report("open", measure(lambda: read_text(path), 1), measure(lambda: read_mapped(path), 1))
+        print(f"peak allocation {peak_allocation(lambda: read_text(path)) / 2 ** 20:>12.1f} MB "
+              f"{peak_allocation(lambda: read_mapped(path)) / 2 ** 20:>12.1f} MB")
+
+BENCHMARKS = [benchmark_lexer, benchmark_shared_subtrees, benchmark_node_memory, benchmark_bytecode, benchmark_parallel_batch,
+              benchmark_backends, benchmark_incremental_preview, benchmark_plot_pan,
+              benchmark_history_search, benchmark_replay, benchmark_mapped_notes]
+
+if __name__ == "__main__":
+    for benchmark in BENCHMARKS:
+        benchmark()
+        print()
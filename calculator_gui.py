@@ -2,7 +2,7 @@
 
 # Form implementation generated from reading ui file '.\calculator.ui'
 #
-# Created by: PyQt5 UI code generator 5.15.9
+# Created by: PyQt5 UI code generator 5.15.11
 #
 # WARNING: Any manual changes made to this file will be lost when pyuic5 is
 # run again.  Do not edit this file unless you know what you are doing.
@@ -511,8 +511,15 @@ class Ui_MainWindow(object):
         self.gridLayout_9.setContentsMargins(0, -1, -1, -1)
         self.gridLayout_9.setSpacing(0)
         self.gridLayout_9.setObjectName("gridLayout_9")
-        self.history = QtWidgets.QTextBrowser(self.history_page)
+        self.history = QtWidgets.QTableView(self.history_page)
+        self.history.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.history.setAlternatingRowColors(True)
+        self.history.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.history.setShowGrid(False)
         self.history.setObjectName("history")
+        self.history.horizontalHeader().setVisible(False)
+        self.history.horizontalHeader().setStretchLastSection(True)
+        self.history.verticalHeader().setVisible(False)
         self.gridLayout_9.addWidget(self.history, 2, 0, 1, 1)
         self.horizontalWidget = QtWidgets.QWidget(self.history_page)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Minimum)
@@ -530,6 +537,11 @@ class Ui_MainWindow(object):
         self.textBrowser_2.setMaximumSize(QtCore.QSize(16777215, 32))
         self.textBrowser_2.setObjectName("textBrowser_2")
         self.horizontalLayout_8.addWidget(self.textBrowser_2)
+        self.history_search = QtWidgets.QLineEdit(self.horizontalWidget)
+        self.history_search.setMinimumSize(QtCore.QSize(0, 30))
+        self.history_search.setClearButtonEnabled(True)
+        self.history_search.setObjectName("history_search")
+        self.horizontalLayout_8.addWidget(self.history_search)
         self.clear_history_button = QtWidgets.QPushButton(self.horizontalWidget)
         self.clear_history_button.setMinimumSize(QtCore.QSize(0, 30))
         self.clear_history_button.setObjectName("clear_history_button")
@@ -597,14 +609,6 @@ class Ui_MainWindow(object):
         self.equal_button.setText(_translate("MainWindow", "="))
         self.more_button.setText(_translate("MainWindow", "2ⁿᵈ"))
         self.invert_button.setText(_translate("MainWindow", "1/x"))
-        self.history.setHtml(_translate("MainWindow", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
-"<html><head><meta name=\"qrichtext\" content=\"1\" /><meta charset=\"utf-8\" /><style type=\"text/css\">\n"
-"p, li { white-space: pre-wrap; }\n"
-"hr { height: 1px; border-width: 0; }\n"
-"li.unchecked::marker { content: \"\\2610\"; }\n"
-"li.checked::marker { content: \"\\2612\"; }\n"
-"</style></head><body style=\" font-family:\'Segoe UI\'; font-size:9pt; font-weight:400; font-style:normal;\">\n"
-"<p style=\"-qt-paragraph-type:empty; margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><br /></p></body></html>"))
         self.textBrowser_2.setHtml(_translate("MainWindow", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
 "<html><head><meta name=\"qrichtext\" content=\"1\" /><meta charset=\"utf-8\" /><style type=\"text/css\">\n"
 "p, li { white-space: pre-wrap; }\n"
@@ -613,4 +617,5 @@ class Ui_MainWindow(object):
 "li.checked::marker { content: \"\\2612\"; }\n"
 "</style></head><body style=\" font-family:\'Segoe UI\'; font-size:9pt; font-weight:400; font-style:normal;\">\n"
 "<p style=\" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-size:12pt; font-weight:700; color:#288ba6;\">Result history:</span></p></body></html>"))
+        self.history_search.setPlaceholderText(_translate("MainWindow", "Search history"))
         self.clear_history_button.setText(_translate("MainWindow", "Clear history"))
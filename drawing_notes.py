@@ -2,8 +2,18 @@ import sys
 from PyQt5 import QtCore, QtGui, QtWidgets, uic
 from PyQt5.QtCore import Qt
 
+try:
+    from plotting import Plotter, View
+except ImportError:
+    # Plotting needs NumPy, the plot button is disabled without it
+    Plotter = None
+
 MAX_TEXT_LENGTH = 50
 
+# Range of x shown when a plot starts and zoom factor of one step of the mouse wheel
+PLOT_X_RANGE = (-10, 10)
+PLOT_ZOOM_STEP = 1.25
+
 class TextInputDialog(QtWidgets.QDialog):
     def __init__(self, max_length):
         super().__init__()
@@ -26,6 +36,9 @@ class TextInputDialog(QtWidgets.QDialog):
         self.ok_button.clicked.connect(self.accept)
 
 class Canvas(QtWidgets.QLabel):
+    # Message of an error of the plotted expression, its graph is not drawn
+    plot_failed = QtCore.pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setMinimumSize(700, 100)
@@ -38,6 +51,11 @@ class Canvas(QtWidgets.QLabel):
 
         self.drawing_mode = True
 
+        # Plot mode, the plot is drawn over a copy of the notes made when it started
+        self.plotter = None
+        self.plot_view = None
+        self.plot_background = None
+
         self.last_x, self.last_y = None, None
         self.pen_color = QtGui.QColor('#000000')
         self.current_width = 2
@@ -75,7 +93,89 @@ class Canvas(QtWidgets.QLabel):
         painter.drawEllipse(QtCore.QPoint(x1 - radius,y1), radius, radius)
         painter.drawEllipse(QtCore.QPoint(x2 + radius,y2), radius, radius)
 
+    def start_plot(self, plotter):
+        """
+        Starts plot mode with graph of <plotter>, dragging pans it and the mouse wheel zooms it.
+        """
+        self.plotter = plotter
+        self.plot_background = self.pixmap.copy()
+        self.plot_view = View.centered(*PLOT_X_RANGE, self.pixmap.width(), self.pixmap.height())
+        self.setCursor(QtGui.QCursor(QtCore.Qt.OpenHandCursor))
+        self.redraw_plot()
+
+    def end_plot(self):
+        """
+        Ends plot mode, the plot stays in the notes.
+        """
+        self.plotter = None
+        self.plot_view = None
+        self.plot_background = None
+
+        if self.drawing_mode:
+            self.set_drawing_cursor()
+        else:
+            self.set_writing_cursor()
+
+    def resize_plot(self, background):
+        """
+        Draws the plot again over <background> of a new size with the same scale.
+        """
+        self.plot_background = background
+        self.plot_view = self.plot_view.resized(background.width(), background.height())
+        self.redraw_plot()
+
+    def redraw_plot(self):
+        """
+        Draws the axes and the graph of the current view over the notes. Only the parts of the graph
+        that were not visible before are evaluated.
+        """
+        view = self.plot_view
+        self.pixmap = self.plot_background.copy()
+        painter = QtGui.QPainter(self.pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+
+        origin_x, origin_y = view.to_pixel(0, 0)
+        painter.setPen(QtGui.QPen(QtGui.QColor('#bcb0c2'), 1))
+        painter.drawLine(QtCore.QPointF(0, origin_y), QtCore.QPointF(view.width, origin_y))
+        painter.drawLine(QtCore.QPointF(origin_x, 0), QtCore.QPointF(origin_x, view.height))
+
+        pen = QtGui.QPen(self.pen_color, self.current_width)
+        pen.setCapStyle(Qt.RoundCap)
+        pen.setJoinStyle(Qt.RoundJoin)
+        painter.setPen(pen)
+
+        try:
+            lines = self.plotter.polylines(view)
+        except Exception as e:
+            # An exception in a slot would end the whole application
+            lines = []
+            self.plot_failed.emit("Can not plot y = " + self.plotter.expression + ": " + (str(e) or type(e).__name__))
+
+        for line in lines:
+            painter.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in line]))
+
+        painter.end()
+        self.setPixmap(self.pixmap)
+        self.update()
+
+    def wheelEvent(self, e):
+        if self.plotter is None:
+            return
+
+        factor = PLOT_ZOOM_STEP ** (e.angleDelta().y() / 120)
+        self.plot_view = self.plot_view.zoom(factor, e.x(), e.y())
+        self.redraw_plot()
+
     def mouseMoveEvent(self, e):
+        if self.plotter is not None:
+            if self.last_x is not None:
+                self.plot_view = self.plot_view.pan(e.x() - self.last_x, e.y() - self.last_y)
+                self.redraw_plot()
+
+            self.last_x = e.x()
+            self.last_y = e.y()
+            return
+
         if not self.drawing_mode:
             return
 
@@ -108,7 +208,7 @@ class Canvas(QtWidgets.QLabel):
         painter.drawText(x, y, text)
 
     def mouseDoubleClickEvent(self, e):
-        if self.drawing_mode:
+        if self.drawing_mode or self.plotter is not None:
             return
 
         text_input_dialog = TextInputDialog(MAX_TEXT_LENGTH)
@@ -160,6 +260,19 @@ class MainWindow(QtWidgets.QMainWindow):
 
         palette.addWidget(self.switch_text_drawing)
 
+        self.switch_plot = QtWidgets.QToolButton()
+        self.switch_plot.setFixedSize(QtCore.QSize(32,24))
+        self.switch_plot.setCheckable(True)
+        self.switch_plot.setText("f(x)")
+
+        if Plotter is None:
+            self.switch_plot.setEnabled(False)
+            self.switch_plot.setToolTip("Plotting needs NumPy")
+
+        self.switch_plot.clicked.connect(self.change_plot_mode)
+
+        palette.addWidget(self.switch_plot)
+
         self.add_palette_buttons(palette)
 
         self.add_size_buttons(palette)
@@ -172,6 +285,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setWindowTitle("Drawing notes")
 
         self.create_menu_bar()
+        self.canvas.plot_failed.connect(self.statusBar().showMessage)
 
     def closeEvent(self, event):
         """
@@ -257,6 +371,32 @@ Do you really want to close the window without saving?",
             self.canvas.drawing_mode = True
             self.canvas.set_drawing_cursor()
 
+    def change_plot_mode(self, checked):
+        """
+        Asks for an expression in x and starts plotting it or ends plot mode.
+        """
+        if not checked:
+            self.canvas.end_plot()
+            self.statusBar().clearMessage()
+            return
+
+        expression, ok = QtWidgets.QInputDialog.getText(self, "Plot", "Expression in x:")
+
+        if not ok or expression.strip() == "":
+            self.switch_plot.setChecked(False)
+            return
+
+        try:
+            plotter = Plotter(expression)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Invalid expression", str(e))
+            self.switch_plot.setChecked(False)
+            return
+
+        # The message is shown first, so an error of the first drawing replaces it
+        self.statusBar().showMessage("y = " + expression + " (drag to move, wheel to zoom)")
+        self.canvas.start_plot(plotter)
+
     def add_palette_buttons(self, layout):
         for c in COLORS:
             b = QPaletteButton(c)
@@ -280,7 +420,8 @@ Do you really want to close the window without saving?",
         """
         super().resizeEvent(event)
 
-        current_pixmap = self.canvas.pixmap
+        # The plot is drawn again in the new size instead of scaling it
+        current_pixmap = self.canvas.pixmap if self.canvas.plotter is None else self.canvas.plot_background
 
         new_size = self.canvas.size()
         new_pixmap = QtGui.QPixmap(new_size)
@@ -292,7 +433,11 @@ Do you really want to close the window without saving?",
             current_pixmap.scaled(new_size, Qt.KeepAspectRatio, Qt.FastTransformation)
         )
 
+        painter.end()
+
+        if self.canvas.plotter is not None:
+            self.canvas.resize_plot(new_pixmap)
+            return
+
         self.canvas.pixmap = new_pixmap
         self.canvas.setPixmap(new_pixmap)
-
-        painter.end()
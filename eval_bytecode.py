@@ -0,0 +1,187 @@
+import json
+import struct
+import sys
+from array import array
+from typing import Collection, Dict, List, Tuple, Union
+
+from my_eval import Ast_node, Type, lex_expr, parse_expr, optimize_ast, invalid_at, lexing_error_position, constant_value, \
+    OPCODES, OPCODE_NAMES, OPCODE_FUNCTIONS, CONSTANT_OPCODE, VARIABLE_OPCODE, FIRST_UNARY_OPCODE, FIRST_BINARY_OPCODE
+
+# Header of serialized bytecode: magic, version, number of instructions and length of the JSON with constants and names.
+HEADER = struct.Struct("<4sBII")
+MAGIC = b"MEBC"
+VERSION = 2
+
+class Bytecode():
+    """
+    Expression compiled to postfix code of a stack machine. Instruction i has opcode opcodes[i] (the opcodes of NodeTable)
+    and argument arguments[i], which is index to constants for CONSTANT_OPCODE, index to names for VARIABLE_OPCODE
+    and 0 for the functions, which take their operands from the top of the stack and push the result there.
+    """
+    __slots__ = ("opcodes", "arguments", "constants", "names")
+
+    def __init__(self, opcodes: array, arguments: array, constants: List[Union[int, float]], names: List[str]) -> None:
+        self.opcodes = opcodes
+        self.arguments = arguments
+        self.constants = constants
+        self.names = names
+
+    @classmethod
+    def from_ast(cls, root: Ast_node) -> 'Bytecode':
+        """
+        Returns bytecode evaluating AST with root node equal to <root>.
+        """
+        bytecode = cls(array("B"), array("l"), [], [])
+        constants: Dict[Tuple[type, Union[int, float]], int] = {}
+        names: Dict[str, int] = {}
+        stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+        while stack:
+            node, children_emitted = stack.pop()
+
+            if not children_emitted and node.children:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            if node.children:
+                bytecode.opcodes.append(OPCODES[node.token.value])
+                bytecode.arguments.append(0)
+            elif node.token.type == Type.VARIABLE:
+                bytecode.opcodes.append(VARIABLE_OPCODE)
+                bytecode.arguments.append(names.setdefault(node.token.value, len(names)))
+            else:
+                value = constant_value(node)
+                bytecode.opcodes.append(CONSTANT_OPCODE)
+                bytecode.arguments.append(constants.setdefault((type(value), value), len(constants)))
+
+        bytecode.constants = [value for _, value in constants]
+        bytecode.names = list(names)
+
+        return bytecode
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __call__(self, variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        """
+        Returns the result and the error (empty string if no error occured) like evaluate_ast.
+        """
+        constants = self.constants
+        names = self.names
+        functions = OPCODE_FUNCTIONS
+        stack: List[Union[int, float]] = []
+        push = stack.append
+        pop = stack.pop
+
+        for opcode, argument in zip(self.opcodes, self.arguments):
+            if opcode == CONSTANT_OPCODE:
+                push(constants[argument])
+            elif opcode == VARIABLE_OPCODE:
+                push(variables[names[argument]])
+            elif opcode < FIRST_UNARY_OPCODE:
+                y = pop()
+                stack[-1] = functions[opcode](stack[-1], y)
+            else:
+                if opcode < FIRST_BINARY_OPCODE:
+                    result, error = functions[opcode](stack[-1])
+                else:
+                    y = pop()
+                    result, error = functions[opcode](stack[-1], y)
+
+                if error != "":
+                    return result, error
+
+                stack[-1] = result
+
+        return stack[-1], ""
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the bytecode serialized, Bytecode.from_bytes loads it without parsing the expression again.
+        """
+        pool = json.dumps([self.constants, self.names]).encode()
+        arguments = array("i", self.arguments)
+
+        if sys.byteorder == "big":
+            arguments.byteswap()
+
+        return HEADER.pack(MAGIC, VERSION, len(self.opcodes), len(pool)) + self.opcodes.tobytes() + arguments.tobytes() + pool
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Bytecode':
+        """
+        Returns bytecode serialized by to_bytes. Raises ValueError if <data> is not valid bytecode.
+        """
+        if len(data) < HEADER.size:
+            raise ValueError("Truncated bytecode")
+
+        magic, version, length, pool_length = HEADER.unpack_from(data)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not bytecode of version " + str(VERSION))
+
+        if len(data) != HEADER.size + 5 * length + pool_length:
+            raise ValueError("Truncated bytecode")
+
+        opcodes = array("B", data[HEADER.size : HEADER.size + length])
+        arguments = array("i", data[HEADER.size + length : HEADER.size + 5 * length])
+        pool = json.loads(data[HEADER.size + 5 * length:].decode())
+
+        if sys.byteorder == "big":
+            arguments.byteswap()
+
+        if not isinstance(pool, list) or len(pool) != 2 or not isinstance(pool[0], list) or not isinstance(pool[1], list):
+            raise ValueError("Wrong pool of constants and names")
+
+        bytecode = cls(opcodes, array("l", arguments), pool[0], pool[1])
+        bytecode.check()
+
+        return bytecode
+
+    def check(self) -> None:
+        """
+        Raises ValueError if some instruction refers to something that does not exist or takes operands from an empty stack.
+        """
+        if any(type(constant) not in (int, float) for constant in self.constants) or any(type(name) != str for name in self.names):
+            raise ValueError("Wrong type of a constant or a name")
+
+        depth = 0
+
+        for opcode, argument in zip(self.opcodes, self.arguments):
+            if opcode >= len(OPCODE_NAMES):
+                raise ValueError("Unknown opcode " + str(opcode))
+
+            if opcode == CONSTANT_OPCODE and not 0 <= argument < len(self.constants) \
+                    or opcode == VARIABLE_OPCODE and not 0 <= argument < len(self.names):
+                raise ValueError("Argument out of range")
+
+            operands = 0 if opcode <= VARIABLE_OPCODE else 1 if FIRST_UNARY_OPCODE <= opcode < FIRST_BINARY_OPCODE else 2
+
+            if depth < operands:
+                raise ValueError("Stack underflow")
+
+            depth += 1 - operands
+
+        if depth != 1:
+            raise ValueError("Bytecode leaves " + str(depth) + " values on the stack")
+
+def compile_bytecode(expression: str, variables: Collection[str] = ()) -> Bytecode:
+    """
+    Returns optimized bytecode of <expression> with <variables>, which are bound when the bytecode is called
+    (e.g. compile_bytecode("x ^ 2 + 1", ["x"])({"x" : 3})). Raises ValueError if the expression is not valid.
+    """
+    lexemes = lex_expr(expression, variables)
+
+    if lexemes is None:
+        raise ValueError(invalid_at(expression, lexing_error_position(expression, variables)))
+
+    root, error = parse_expr(expression, lexemes)
+
+    if error != "":
+        raise ValueError(error)
+
+    if root is None:
+        return Bytecode(array("B", [CONSTANT_OPCODE]), array("l", [0]), [0], [])
+
+    return Bytecode.from_ast(optimize_ast(root))
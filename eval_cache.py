@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+class LRUCache():
+    """
+    Cache that holds at most <max_entries> values with the total approximate size at most <max_bytes>.
+    When one of the limits is exceeded the least recently used values are evicted.
+    """
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries: 'OrderedDict[Hashable, Tuple[Any, int]]' = OrderedDict()
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the value stored under <key> and marks it as the most recently used or returns None if it is not cached.
+        """
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """
+        Stores <value> of approximate size <size> bytes under <key>. Values bigger than the whole cache are not stored.
+        """
+        if key in self.entries:
+            self.current_bytes -= self.entries.pop(key)[1]
+
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        self.entries[key] = (value, size)
+        self.current_bytes += size
+        self.evict()
+
+    def evict(self) -> None:
+        while len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries" : len(self.entries),
+                "bytes" : self.current_bytes,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions}
@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from batch_eval import evaluate_line
+from my_eval import valid_variable_name
+
+# Requests waiting for a worker are sent to it together, at most BATCH_SIZE of them. At most BATCHES_PER_WORKER
+# batches per worker are in progress, the requests coming meanwhile wait and form bigger batches.
+BATCH_SIZE = 256
+BATCHES_PER_WORKER = 2
+
+# Number of responses a connection may have in progress before the server stops reading its next requests.
+MAX_PIPELINED = 1024
+
+# Longest request line in bytes
+MAX_LINE = 16 * 1024 * 1024
+
+# Number of the last requests from which the latency percentiles are computed.
+LATENCY_WINDOW = 10000
+
+Variables = Optional[Dict[str, Union[int, float]]]
+Address = Union[Tuple[str, int], str]
+
+def warm_up() -> None:
+    """
+    Runs in every worker when it starts, so the first request does not pay for imports and compiling regexes.
+    """
+    evaluate_line("sin (pi / 2) + 1 log_base 10")
+
+def evaluate_one(expression: str, variables: Variables) -> str:
+    """
+    Returns the result of <expression>, or the error it raised, so it does not fail the other requests of its batch.
+    """
+    try:
+        return evaluate_line(expression, variables)
+    except Exception:
+        return "Evaluation failed"
+
+def evaluate_batch(batch: List[Tuple[str, Variables]]) -> List[str]:
+    return [evaluate_one(expression, variables) for expression, variables in batch]
+
+def parse_request(request: Any) -> Tuple[Any, List[Tuple[str, Variables]], Optional[str]]:
+    """
+    Returns id of decoded JSON <request>, expressions with their variables to evaluate and the error, if it is not valid.
+    Request is an object with "expression" (string) or "expressions" (list of strings) and optionally "variables"
+    (object with numbers) and "id", which is copied to the response.
+    """
+    if not isinstance(request, dict):
+        return None, [], "Request is not a JSON object"
+
+    request_id = request.get("id")
+    variables = request.get("variables")
+
+    if variables is not None and (not isinstance(variables, dict) or
+                                  any(type(value) not in (int, float) for value in variables.values())):
+        return request_id, [], "Variables are not an object with numbers"
+
+    if variables is not None and not all(valid_variable_name(name) for name in variables):
+        return request_id, [], "Variable names must be identifiers other than names of functions and constants"
+
+    if isinstance(request.get("expression"), str):
+        return request_id, [(request["expression"], variables)], None
+
+    expressions = request.get("expressions")
+
+    if isinstance(expressions, list) and all(isinstance(expression, str) for expression in expressions):
+        return request_id, [(expression, variables) for expression in expressions], None
+
+    return request_id, [], "Request has no expression"
+
+class ServerStats():
+    """
+    Counters of EvalServer, latency is measured from reading a request to having its result.
+    """
+    def __init__(self) -> None:
+        self.start = perf_counter()
+        self.connections = 0
+        self.requests = 0
+        self.expressions = 0
+        self.batches = 0
+        self.invalid_requests = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        uptime = perf_counter() - self.start
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> float:
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {"uptime_s" : uptime,
+                "connections" : self.connections,
+                "requests" : self.requests,
+                "invalid_requests" : self.invalid_requests,
+                "expressions" : self.expressions,
+                "batches" : self.batches,
+                "mean_batch_size" : self.expressions / self.batches if self.batches else 0.0,
+                "expressions_per_s" : self.expressions / uptime if uptime > 0 else 0.0,
+                "latency_p50_ms" : percentile(0.5),
+                "latency_p99_ms" : percentile(0.99)}
+
+class EvalServer():
+    """
+    Local server evaluating expressions sent as JSON lines (see parse_request) by a pool of warm worker processes.
+    Clients may send any number of requests without waiting for the responses (pipelining), responses come in the order
+    of the requests. Request {"stats": true} returns ServerStats.snapshot instead of evaluating.
+    Listens on <unix_path> if given, otherwise on <host>:<port> (port 0 chooses a free one, see address).
+    """
+    def __init__(self, workers: int = 1, host: str = "127.0.0.1", port: int = 0, unix_path: Optional[str] = None) -> None:
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.address: Optional[Address] = None
+        self.stats = ServerStats()
+
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.waiting: Optional[asyncio.Queue] = None
+        self.batcher: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stopped: Optional[asyncio.Event] = None
+        self.connections: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.executor = self.new_executor()
+
+        # Start all the workers now, not on the first requests
+        await asyncio.gather(*(self.loop.run_in_executor(self.executor, warm_up) for _ in range(self.workers)))
+
+        self.waiting = asyncio.Queue()
+        self.batcher = asyncio.create_task(self.send_batches())
+
+        if self.unix_path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, self.unix_path, limit=MAX_LINE)
+            self.address = self.unix_path
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, limit=MAX_LINE)
+            self.address = self.server.sockets[0].getsockname()[:2]
+
+    def new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, initializer=warm_up)
+
+    def restart_executor(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Replaces the executor <broken> after one of its workers died (e.g. it was killed for its memory), which breaks
+        the whole pool, unless it was already replaced. The new workers start now, not on the next requests.
+        """
+        if broken is not self.executor:
+            return
+
+        broken.shutdown(wait=False)
+        self.executor = self.new_executor()
+
+        for _ in range(self.workers):
+            self.executor.submit(warm_up)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        await self.stopped.wait()
+        await self.close()
+
+    async def close(self) -> None:
+        self.server.close()
+
+        for connection in list(self.connections):
+            connection.cancel()
+
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        self.executor.shutdown()
+
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    def stop(self) -> None:
+        """
+        Stops serve_forever, can be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def start_in_thread(self) -> threading.Thread:
+        """
+        Runs serve_forever in a new daemon thread and returns it once the server listens.
+        """
+        listening = threading.Event()
+
+        async def serve() -> None:
+            try:
+                await self.start()
+            finally:
+                listening.set()
+
+            await self.stopped.wait()
+            await self.close()
+
+        thread = threading.Thread(target=asyncio.run, args=(serve(),), daemon=True)
+        thread.start()
+        listening.wait()
+
+        return thread
+
+    async def send_batches(self) -> None:
+        """
+        Takes the waiting expressions and sends them to the workers in batches.
+        """
+        running = asyncio.Semaphore(self.workers * BATCHES_PER_WORKER)
+
+        while True:
+            batch = [await self.waiting.get()]
+
+            while len(batch) < BATCH_SIZE and not self.waiting.empty():
+                batch.append(self.waiting.get_nowait())
+
+            await running.acquire()
+            self.stats.batches += 1
+            self.stats.expressions += len(batch)
+
+            expressions = [(expression, variables) for expression, variables, _ in batch]
+            executor = self.executor
+
+            try:
+                future = self.loop.run_in_executor(executor, evaluate_batch, expressions)
+            except BrokenProcessPool:
+                # The pool broke before the batch that found it broken finished
+                self.restart_executor(executor)
+                executor = self.executor
+                future = self.loop.run_in_executor(executor, evaluate_batch, expressions)
+
+            future.add_done_callback(lambda done, batch=batch, executor=executor: self.finish_batch(done, batch, running, executor))
+
+    def finish_batch(self, done: asyncio.Future, batch: List[Tuple[str, Variables, asyncio.Future]], running: asyncio.Semaphore,
+                     executor: ProcessPoolExecutor) -> None:
+        running.release()
+
+        if isinstance(done.exception(), BrokenProcessPool):
+            self.restart_executor(executor)
+
+        if done.exception() is not None:
+            for _, _, result in batch:
+                result.set_exception(done.exception())
+            return
+
+        for (_, _, result), value in zip(batch, done.result()):
+            result.set_result(value)
+
+    async def respond(self, line: bytes) -> Dict[str, Any]:
+        received = perf_counter()
+        self.stats.requests += 1
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self.stats.invalid_requests += 1
+            return {"id" : None, "error" : "Request is not valid JSON"}
+
+        if isinstance(request, dict) and request.get("stats") is True:
+            return {"id" : request.get("id"), "stats" : self.stats.snapshot()}
+
+        request_id, expressions, error = parse_request(request)
+
+        if error is not None:
+            self.stats.invalid_requests += 1
+            return {"id" : request_id, "error" : error}
+
+        results = []
+
+        for expression, variables in expressions:
+            result = self.loop.create_future()
+            self.waiting.put_nowait((expression, variables, result))
+            results.append(result)
+
+        try:
+            values = await asyncio.gather(*results)
+        except Exception:
+            # The worker failed (e.g. it was killed)
+            return {"id" : request_id, "error" : "Evaluation failed"}
+
+        self.stats.latencies.append(perf_counter() - received)
+
+        if "expression" in request:
+            return {"id" : request_id, "result" : values[0]}
+
+        return {"id" : request_id, "results" : values}
+
+    @staticmethod
+    async def reject(error: str) -> Dict[str, Any]:
+        return {"id" : None, "error" : error}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.connections += 1
+        self.connections.add(asyncio.current_task())
+        responses: asyncio.Queue = asyncio.Queue(MAX_PIPELINED)
+
+        async def write_responses() -> None:
+            while True:
+                response = await responses.get()
+
+                if response is None:
+                    return
+
+                writer.write(json.dumps(await response).encode() + b"\n")
+                await writer.drain()
+
+        writing = asyncio.create_task(write_responses())
+
+        try:
+            try:
+                async for line in reader:
+                    if line.strip():
+                        await responses.put(asyncio.ensure_future(self.respond(line)))
+            except ValueError:
+                # The line is longer than MAX_LINE, the rest of the stream can not be split into requests
+                self.stats.requests += 1
+                self.stats.invalid_requests += 1
+                await responses.put(asyncio.ensure_future(self.reject("Request is longer than " + str(MAX_LINE) + " bytes")))
+
+            await responses.put(None)
+            await writing
+        except (ConnectionError, asyncio.CancelledError):
+            # The client went away or the server is closing, the connection just ends
+            writing.cancel()
+        finally:
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+class EvalClient():
+    """
+    Blocking client of EvalServer listening on <address> (path of a Unix socket or (host, port)).
+    """
+    def __init__(self, address: Address, timeout: Optional[float] = None) -> None:
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.file = self.socket.makefile("rb")
+
+    def send(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sends all <requests> before reading their responses (pipelining) and returns the responses in the same order.
+        """
+        responses: List[Dict[str, Any]] = []
+
+        # The server stops reading when MAX_PIPELINED responses are not read, so the requests are sent in windows.
+        for begin in range(0, len(requests), MAX_PIPELINED // 2):
+            window = requests[begin : begin + MAX_PIPELINED // 2]
+            self.socket.sendall(b"".join(json.dumps(request).encode() + b"\n" for request in window))
+            responses.extend(json.loads(self.file.readline()) for _ in window)
+
+        return responses
+
+    def evaluate(self, expression: str, variables: Variables = None) -> str:
+        response = self.send([{"expression" : expression, "variables" : variables}])[0]
+        return response.get("result", response.get("error"))
+
+    def evaluate_many(self, expressions: List[str], variables: Variables = None) -> List[str]:
+        return [response.get("result", response.get("error")) for response in
+                self.send([{"expression" : expression, "variables" : variables} for expression in expressions])]
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return self.send([{"stats" : True}])[0]["stats"]
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self) -> 'EvalClient':
+        return self
+
+    def __exit__(self, *exception: object) -> None:
+        self.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local server evaluating expressions sent as JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    arguments = parser.parse_args()
+
+    server = EvalServer(arguments.workers, arguments.host, arguments.port, arguments.unix)
+
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
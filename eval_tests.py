@@ -1,5 +1,20 @@
+import asyncio
+import os
+import signal
+import tempfile
 from typing import List, Optional, Dict
-from my_eval import tokenize_expr, Token, correct_tokenized_expression, build_ast, Prec, Ast_node, evaluation
+from math import pi
+from eval_bytecode import Bytecode, compile_bytecode
+from batch_eval import evaluate_lines, evaluate_lines_parallel
+from eval_server import EvalServer, EvalClient
+from async_eval import EvaluationWorker, evaluate_async, TIMED_OUT
+from numeric_backends import evaluate_with_backend
+from incremental_eval import IncrementalEvaluator
+from history import HistoryBuffer, HistoryEntry, HistoryStore
+from replay import replay, entries_from_notes
+from notes_io import read_chunks, save_text, MappedNotes, LINE_STEP
+from my_eval import tokenize_expr, lex_expr, parse_expr, optimize_ast, Type, Token, correct_tokenized_expression, build_ast, Prec, Ast_node, evaluation, compile_expression, \
+                    configure_cache, cache_stats, configure_number_limit, EVALUATION_CACHE, NodeFactory, NodeTable
 
 def print_tokens(tokens: Optional[List[Token]]) -> None:
     if tokens is None:
@@ -28,6 +43,20 @@ print_tokens(tokenize_expr("1,0 /pi + 0,121/           (e)+     6"))
 
 print_tokens(tokenize_expr("- (1 + 2) ^ 2 ^ (sin cos tan 4 * 5)"))
 
+print("Testing lex_expr:")
+
+if lex_expr("sin(5) + pi") == [(Type.FUNCTION, 0, 3), (Type.OPEN_PAR, 3, 4), (Type.NUMBER, 4, 5), (Type.CLOSE_PAR, 5, 6),
+                               (Type.PLUS, 7, 8), (Type.FUNCTION, 9, 11)]:
+    print("OK")
+else:
+    print("NOK")
+
+for expr in ["1,", "1,2,3", "5pi", "pi(1)", "sin+1", "cis 6", ",5", "asdlkj565", "2 x"]:
+    if lex_expr(expr) is None:
+        print("OK")
+    else:
+        print("NOK")
+
 print("Testing correct_tokenized_expression:")
 for expr in ["- 1", "1+ 2 - ( 3 + 4*5 * 6^(6+6)) - sin cos 565,4123 + ln (5,2 / 66,3)", "(3) + 4*(sin cos (e^((3)- 5 mod 6) + 3 log_base (pi)))", "sin (pi + cos e)",
              "-sin (-6 - 3-(-4^2)) - cos (-5)", "3 log_base sin 5"]:
@@ -291,3 +320,648 @@ for expr in EXPRESSIONS_ANSWERS.keys():
         print("OK")
     else:
         print("NOK")
+
+print("\n###############################\n")
+print("Testing compiled expressions:")
+
+for expr in list(EXPRESSIONS_ANSWERS.keys()) + [expr5, expr7, expr8, "", "1 +", "5 mod 0", "3 mod 2,5"]:
+    compiled = compile_expression(expr)
+
+    if compiled() == evaluation(expr) and compiled() == evaluation(expr):
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing evaluation cache:")
+
+EVALUATION_CACHE.clear()
+configure_cache(2, 1024 * 1024)
+hits, misses, evictions = cache_stats()["hits"], cache_stats()["misses"], cache_stats()["evictions"]
+
+for expr in ["1 - (2 + 3)", "  1 -  (2 + 3) ", "sin 0", "1 + 1", "1 - (2 + 3)"]:
+    evaluation(expr)
+
+stats = cache_stats()
+
+if (stats["hits"] - hits, stats["misses"] - misses, stats["evictions"] - evictions, stats["entries"]) == (1, 4, 2, 2):
+    print("OK")
+else:
+    print("NOK")
+
+configure_cache(10, 1)
+
+if cache_stats()["entries"] == 0 and evaluation("1 - (2 + 3)") == "-4" and cache_stats()["entries"] == 0:
+    print("OK")
+else:
+    print("NOK")
+
+configure_cache(1024, 4 * 1024 * 1024)
+
+print("\n###############################\n")
+print("Testing deeply nested expressions:")
+
+for expr, answer in [("(" * 5000 + "1" + ")" * 5000, "1"),
+                     (" ^ ".join(["1"] * 50000), "1,0"),
+                     (" + ".join(["1"] * 50000), "50000"),
+                     ("-" + "(" * 3000 + "2" + " * 1)" * 3000, "-2"),
+                     ("sin " * 5000 + "0", "0,0")]:
+    if evaluation(expr) == answer and compile_expression(expr)() == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing positions of errors:")
+
+for expr, answer in [("1 +", "invalid expression (unexpected end)"),
+                     ("2 * -3", "invalid expression at character 5"),
+                     ("(1)(2)", "invalid expression at character 4"),
+                     ("1 + (2 + (3)", "invalid expression at character 5"),
+                     ("1 + 2)", "invalid expression at character 6"),
+                     ("sin 2 + cis 6", "invalid expression at character 9"),
+                     # Positions count spaces as they were written, though the cache key has them normalized
+                     ("1      +      *", "invalid expression at character 15"),
+                     ("   1 ++ 2", "invalid expression at character 7"),
+                     ("1 ++ 2", "invalid expression at character 4")]:
+    if evaluation(expr) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing vectorized evaluation:")
+
+try:
+    import numpy as np
+    from vectorized_eval import evaluate_vectorized, ERROR_MESSAGES
+except ImportError:
+    print("NumPy is not installed, skipped.")
+else:
+    X_VALUES = [-2, -1, 0, 1, 3]
+
+    for expr in ["arcsin (X / 2)", "X yth_root 3 + ln X", "X ^ (1 / X) - 5 / X", "X mod 2 * sroot X",
+                 "X yth_root (0 - 3) + 2 log_base (X + 1)"]:
+        results, errors = evaluate_vectorized(expr, X=np.array(X_VALUES))
+        expected = [evaluation(expr.replace("X", "(" + str(x) + ")")) for x in X_VALUES]
+        computed = [ERROR_MESSAGES[error] if error else str(result) for result, error in zip(results, errors)]
+
+        if all(want == got if not want[-1].isdigit() else abs(float(want.replace(",", ".")) - float(got)) < 1e-12
+               for want, got in zip(expected, computed)):
+            print("OK")
+        else:
+            print("NOK")
+
+    # Integer literals out of int64 are floats, the products of 0, 1 and 2 with them are exact like in evaluation
+    for expr in ["sin (X * 99999999999999999999999)", "X ^ 99999999999999999999"]:
+        results, errors = evaluate_vectorized(expr, X=np.arange(3))
+        expected = [evaluation(expr.replace("X", str(x))) for x in range(3)]
+        computed = [ERROR_MESSAGES[error] if error else str(result).replace(".", ",") for result, error in zip(results, errors)]
+
+        if expected == computed:
+            print("OK")
+        else:
+            print("NOK")
+
+    # Integers out of int64 do not wrap around
+    results, errors = evaluate_vectorized("X * X - 1", X=np.array([2 ** 40, 3]))
+
+    if list(results) == [2.0 ** 80 - 1, 8.0] and not errors.any() and evaluate_vectorized("X + 2", X=np.array([2 ** 63 - 1]))[0][0] > 0:
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing variables:")
+
+compiled = compile_expression("x ^ 2 - ans * sin (y / 2)", ["x", "y", "ans"])
+
+for variables, answer in [({"x" : 3, "y" : 0, "ans" : 5}, "9,0"),
+                          ({"x" : 1, "y" : pi, "ans" : 2}, "-1,0"),
+                          ({"x" : 1, "y" : 0}, "Missing value of variable ans")]:
+    if compiled(**variables) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+if evaluation("x + 1") == "invalid expression at character 1" and evaluation("ans * 2", {"ans" : 4}) == "8" and evaluation("x + 1", {"x" : 2}) == "3" \
+        and evaluation("x + 1", {"x" : 2.5}) == "3,5":
+    print("OK")
+else:
+    print("NOK")
+
+print("\n###############################\n")
+print("Testing constant folding:")
+
+for expr, answer in [("pi / 2 + x * 1", "+\n        1,5707963267948966\n        x\n"),
+                     ("(- (- x)) + 2 ^ 10 - 0", "+\n        x\n        1024,0\n"),
+                     ("x / (1 - 1)", "/\n        x\n        0\n"),
+                     ("1 / 0 + x", "+\n        /\n                1\n                0\n        x\n")]:
+    result = []
+    ast_to_string(optimize_ast(parse_expr(expr, lex_expr(expr, ["x"]))[0]), "", result)
+
+    if "".join(result) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+if compile_expression("1 / 0 + x", ["x"])(x=1) == "Division by zero." and compile_expression("0 ^ 0 * x", ["x"])(x=2) == "Undefined":
+    print("OK")
+else:
+    print("NOK")
+
+print("\n###############################\n")
+print("Testing shared subtrees:")
+
+expr = "sin (x) ^ 2 + cos (x) ^ 2 + sin (x) * cos (x)"
+dag_root = NodeFactory().share(parse_expr(expr, lex_expr(expr, ["x"]))[0])
+
+if dag_root.children[0].children[0].children[0] is dag_root.children[1].children[0] and len(NodeTable(dag_root)) == 9:
+    print("OK")
+else:
+    print("NOK")
+
+for variables, answer in [({"x" : 0}, "1,0"), ({"x" : pi / 2}, "1,0")]:
+    if compile_expression(expr, ["x"])(**variables) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+if compile_expression("1 / x + 1 / x", ["x"])(x=0) == "Division by zero." and compile_expression("(x mod 2) * (x mod 2)", ["x"])(x=3) == "1":
+    print("OK")
+else:
+    print("NOK")
+
+expr = "(x + 1) * (x + 1) - 1,0 * 1"
+table = NodeTable(NodeFactory().share(parse_expr(expr, lex_expr(expr, ["x"]))[0]))
+
+if len(table) == 7 and table.constants == ["x", 1, 1.0] and table({"x" : 2}) == (8.0, ""):
+    print("OK")
+else:
+    print("NOK")
+
+print("\n###############################\n")
+print("Testing bytecode:")
+
+for expr, variables, answer in [("x ^ 2 - 3 mod 2 + 8 yth_root 3", {"x" : 3}, (10.0, "")),
+                                ("abs (x - 10) log_base 10 + sin (0 * x)", {"x" : 0}, (1.0, "")),
+                                ("5 / (x - 1)", {"x" : 1}, (0, "Division by zero."))]:
+    bytecode = compile_bytecode(expr, variables.keys())
+
+    if bytecode(variables) == answer and Bytecode.from_bytes(bytecode.to_bytes())(variables) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+data = compile_bytecode("x + 2", ["x"]).to_bytes()
+
+# Missing byte, unknown opcode and + without operands
+for data in [data[:-1], data[:15] + b"\xff" + data[16:], data[:13] + data[15:16] + data[13:15] + data[16:]]:
+    try:
+        Bytecode.from_bytes(data)
+        print("NOK")
+    except ValueError:
+        print("OK")
+
+print("\n###############################\n")
+print("Testing batch evaluation:")
+
+if list(evaluate_lines(["1 + 2\n", "1 / 0\r\n", "\n", "sin 1" + "0" * 400 + "\n", "5 log_base 0\n", "5 log_base 1\n"])) == \
+        ["3", "Division by zero.", "0", "Math error", "Math error", "Math error"]:
+    print("OK")
+else:
+    print("NOK")
+
+# Worker processes may import this file again (on Windows), they must not start their own pools
+if __name__ == "__main__":
+    lines = ["1 + 2", "sin 0", "1 / 0", "2 ^ 10", "abs (- 5)", "5 log_base (0 - 2)"] * 3
+
+    if list(evaluate_lines_parallel(lines, 2, chunk_size=2)) == list(evaluate_lines(lines)):
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing evaluation server:")
+
+if __name__ == "__main__":
+    server = EvalServer(workers=1)
+    server.start_in_thread()
+
+    with EvalClient(server.address, timeout=10) as client:
+        if client.evaluate("1 + 2") == "3" and client.evaluate("x * 3", {"x" : 3}) == "9" and client.evaluate("1 +") == "invalid expression (unexpected end)":
+            print("OK")
+        else:
+            print("NOK")
+
+        expressions = [str(i) + " * 2" for i in range(3000)]
+
+        if client.evaluate_many(expressions) == [str(i * 2) for i in range(3000)] and client.stats()["expressions"] == 3003:
+            print("OK")
+        else:
+            print("NOK")
+
+        if client.send([{"id" : 1, "expressions" : ["1", "2 + 2"]}, {"id" : 2}]) == [{"id" : 1, "results" : ["1", "4"]},
+                                                                               {"id" : 2, "error" : "Request has no expression"}]:
+            print("OK")
+        else:
+            print("NOK")
+
+        # An expression failing in a batch does not fail the other requests in it
+        responses = client.send([{"id" : 1, "expression" : "1 + 1"}, {"id" : 2, "expression" : "5 log_base 0"},
+                                 {"id" : 3, "expression" : "2 * 3"}, {"id" : 4, "expression" : "1", "variables" : {"sin" : 1}},
+                                 {"id" : 5, "expression" : "1", "variables" : {"1x" : 1}}])
+
+        if [response.get("result") for response in responses] == ["2", "Math error", "6", None, None] \
+                and "error" in responses[3] and "error" in responses[4]:
+            print("OK")
+        else:
+            print("NOK")
+
+        # A killed worker breaks the pool, which is replaced: at most the batch running in it fails
+        os.kill(next(iter(server.executor._processes)), signal.SIGKILL)
+        results = [client.evaluate("1 + 2") for _ in range(3)]
+
+        if results[1:] == ["3", "3"] and results[0] in ("3", "Evaluation failed"):
+            print("OK")
+        else:
+            print("NOK")
+
+    # A request longer than MAX_LINE gets an error and ends its connection, not the server
+    with EvalClient(server.address, timeout=10) as client:
+        response = client.send([{"expression" : "1" * (16 * 1024 * 1024)}])[0]
+
+        if response["id"] is None and response["error"].startswith("Request is longer than") and client.file.readline() == b"":
+            print("OK")
+        else:
+            print("NOK")
+
+    with EvalClient(server.address, timeout=10) as client:
+        if client.evaluate("2 * 3") == "6":
+            print("OK")
+        else:
+            print("NOK")
+
+    server.stop()
+
+print("\n###############################\n")
+print("Testing asynchronous evaluation:")
+
+async def evaluate_with_worker() -> List[str]:
+    worker = EvaluationWorker()
+    results = [await worker.evaluate("x * 2", {"x" : 4}), await worker.evaluate(" + ".join(["sin 1"] * 100000), timeout=0.05)]
+
+    slow = asyncio.ensure_future(worker.evaluate(" + ".join(["sin 1"] * 100000), timeout=None))
+    await asyncio.sleep(0.05)
+    slow.cancel()
+
+    results.append(await worker.evaluate("1 / 0"))
+
+    # An expression raising in the worker does not kill it
+    pid = worker.process.pid
+    results += [await worker.evaluate("x + 1", {"x" : "1"}), await worker.evaluate("5 log_base 0")]
+    results.append("same worker" if worker.process.pid == pid else "new worker")
+    await worker.close()
+
+    return results
+
+if __name__ == "__main__":
+    if asyncio.run(evaluate_async("2 ^ 3 + 1")) == "9,0" and asyncio.run(evaluate_with_worker()) == \
+            ["8", TIMED_OUT, "Division by zero.", "Math error", "Math error", "same worker"]:
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing limits of numbers:")
+
+for expr, answer in [("10 ^ 400", "Result too large"), ("9 ^ 9 ^ 9 ^ 9", "Result too large"), ("0,5 ^ (0 - 2000)", "Result too large"),
+                     ("100 yth_root 200", "Result too large"), ("10 ^ 300", "1e+300"), ("(0 - 2) ^ 3", "-8,0")]:
+    if evaluation(expr) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+configure_number_limit(100)
+
+if evaluation("1" + "0" * 20 + " * 1" + "0" * 20) == "Result too large" and evaluation("1" + "0" * 10 + " * 1" + "0" * 10) == "1" + "0" * 20:
+    print("OK")
+else:
+    print("NOK")
+
+configure_number_limit(10000)
+
+print("\n###############################\n")
+print("Testing numeric backends:")
+
+for expr, backend, answer in [("0,1 + 0,2", "float", "0,30000000000000004"), ("0,1 + 0,2", "decimal", "0,3"), ("0,1 + 0,2", "fraction", "3/10"),
+                              ("1 / 3 * 3", "fraction", "1"), ("27 ^ (2 / 3)", "fraction", "9"), ("5 log_base 25", "fraction", "1/2"),
+                              ("sroot 2", "fraction", "Result is not rational"), ("8 log_base 2", "decimal", "3"),
+                              ("sin (pi / 2)", "decimal", "1"), ("arcsin 2", "decimal", "asin value out of [-1, 1]"),
+                              ("7 mod 0,5", "fraction", "Modulus with non-integer arguments"), ("1 / 0", "decimal", "Division by zero."),
+                              ("10 ^ 1000000", "decimal", "Result too large"), ("10 ^ 20000", "fraction", "Result too large")]:
+    if evaluate_with_backend(expr, backend) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+if evaluate_with_backend("pi", "decimal", 50) == "3,1415926535897932384626433832795028841971693993751" and \
+   evaluate_with_backend("sin 1", "decimal", 40) == "0,8414709848078965066525023216302989996226" and \
+   evaluate_with_backend("x ^ 2", "fraction", variables={"x" : 0.5}) == "1/4":
+    print("OK")
+else:
+    print("NOK")
+
+# Results, which do not fit into floats in the backends or would take long to compute
+if all(evaluate_with_backend("0 yth_root (0 - 3)", backend) == "Division by zero" for backend in ["decimal", "fraction", "interval"]) and \
+   evaluate_with_backend("(10 ^ 400) log_base 10", "fraction") == "400" and evaluate_with_backend("1 ^ 1000000000", "fraction") == "1" and \
+   evaluate_with_backend("(0 - 1) ^ 1000000001", "fraction") == "-1" and evaluate_with_backend("sin (10 ^ 10000)", "decimal") == "Result too large":
+    print("OK")
+else:
+    print("NOK")
+
+# All operations keep the precision, zeros have no exponent and mod is exact within the precision
+for expr, precision, answer in [("abs (0 - pi)", 50, "3,1415926535897932384626433832795028841971693993751"),
+                                ("2 yth_root 3", 60, "1,25992104989487316476721060727822835057025146470150798008197"),
+                                ("(0 - 2) yth_root 3", 60, "-1,25992104989487316476721060727822835057025146470150798008197"),
+                                ("sin 0", 60, "0"), ("pi - pi", 50, "0"), ("(0 - 7) mod 3", 28, "2"), ("(2 ^ 5000) mod 3", 2000, "1"),
+                                ("(2 ^ 5000) mod 3", 28, "Operand of mod has more digits than the precision")]:
+    if evaluate_with_backend(expr, "decimal", precision) == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing interval backend:")
+
+for expr, answer in [("0,1 + 0,2", "[0,29999999999999993; 0,3000000000000001]"), ("0,5 + 0,5", "[1,0; 1,0]"), ("sroot 4", "[2,0; 2,0]"),
+                     ("arcsin (0,5 + 0,5) - pi / 2", "[-6,661338147750939e-16; 4,440892098500626e-16]"),
+                     ("ln (1 - 1)", "Non-positive number in ln."), ("1 / (0,1 * 3 - 0,3)", "Division by zero."),
+                     ("tan (pi / 2)", "Interval contains a pole"), ("(0 - 2) ^ 3", "[-8,0; -8,0]"), ("7 mod 3", "[1,0; 1,0]"),
+                     ("99999999999999999999 mod 7", "Interval is too wide"), ("7,5 mod 2", "Modulus with non-integer arguments")]:
+    if evaluate_with_backend(expr, "interval") == answer:
+        print("OK")
+    else:
+        print("NOK")
+
+# The bounds contain the exact value, here computed with 50 digits
+for expr in ["sin 1 + cos 1 log_base 2", "pi ^ e - e ^ pi", "(1,7 * 10) yth_root 3 - arctan 0,3"]:
+    lower, upper = evaluate_with_backend(expr, "interval")[1:-1].replace(",", ".").split("; ")
+
+    if float(lower) < float(evaluate_with_backend(expr, "decimal", 50).replace(",", ".")) < float(upper):
+        print("OK")
+    else:
+        print("NOK")
+
+print("\n###############################\n")
+print("Testing incremental evaluation:")
+
+incremental = IncrementalEvaluator({"ans" : 2})
+typed = ""
+all_same = True
+
+# Typing like the buttons do, then deleting and editing in the middle
+for piece in ["sin ", "( ", "1", "2", ",", "5", " )", " + ", "ans", " * ", "3"] * 50:
+    typed += piece
+    all_same = all_same and incremental.evaluate(typed) == compile_expression(typed, ["ans"])(ans=2)
+
+for edited in [typed[:-1], typed[:-5], typed[:10] + "7" + typed[11:], typed[:10] + "p" + typed[11:], ""]:
+    all_same = all_same and incremental.evaluate(edited) == (compile_expression(edited, ["ans"])(ans=2) if edited else "")
+
+if all_same:
+    print("OK")
+else:
+    print("NOK")
+
+incremental.set_variables({"ans" : 3})
+
+if incremental.evaluate("ans * 2") == "6" and incremental.evaluate("ans * 2 +") == "invalid expression (unexpected end)":
+    print("OK")
+else:
+    print("NOK")
+
+print("\n###############################\n")
+print("Testing history:")
+
+history = HistoryBuffer(3)
+
+for i in range(5):
+    history.append(str(i) + " + 0", str(i), timestamp=i)
+
+if len(history) == 3 and [history[i].expression for i in range(3)] == ["4 + 0", "3 + 0", "2 + 0"] and history[2].timestamp == 2:
+    print("OK")
+else:
+    print("NOK")
+
+try:
+    history[3]
+    print("NOK")
+except IndexError:
+    print("OK")
+
+history.clear()
+history.append("1 + 1", "2")
+
+if len(history) == 1 and history[0].result == "2" and not history.is_full():
+    print("OK")
+else:
+    print("NOK")
+
+with tempfile.TemporaryDirectory() as directory:
+    store = HistoryStore(os.path.join(directory, "history.sqlite3"))
+
+    for i in range(1000):
+        store.add(HistoryEntry("ln (x + " + str(i) + ")" if i % 2 else "5 log_base " + str(i), str(i), i))
+
+    store.flush()
+    page = store.page(1000, 2)
+
+    if [entry_id for entry_id, _ in page] == [999, 998] and page[1][1].expression == "ln (x + 997)" \
+            and [entry.result for entry in store.search("LN 99")] == ["999", "997", "995", "993", "991", "99"] \
+            and len(store.search("log_base", limit=10)) == 10 and store.search("( +") == []:
+        print("OK")
+    else:
+        print("NOK")
+
+    store.close()
+
+    # Saved history is there after opening the file again, until it is cleared
+    store = HistoryStore(os.path.join(directory, "history.sqlite3"))
+    saved = store.last_saved_id
+    store.clear()
+    store.flush()
+
+    if saved == 1000 and store.page(1001) == [] and store.search("ln") == []:
+        print("OK")
+    else:
+        print("NOK")
+
+    store.close()
+
+print("\n###############################\n")
+print("Testing replay of history:")
+
+recorded = [HistoryEntry("1 + 2", "3", 0), HistoryEntry("ans * 2", "6", 1), HistoryEntry("9 ^ 9 ^ 9", "timed out", 2),
+            HistoryEntry("ans * 2", "12", 3), HistoryEntry("1  + 2", "3", 4), HistoryEntry("sin 1", "0,8414709848", 5),
+            HistoryEntry("ans / 0", "5", 6)]
+report = replay(recorded)
+
+if report.entries == 7 and report.skipped == 1 and report.evaluated == 5 \
+        and [(difference.expression, difference.replayed) for difference in report.differences] == \
+            [("sin 1", evaluation("sin 1")), ("ans / 0", "Division by zero.")]:
+    print("OK")
+else:
+    print("NOK")
+
+if [difference.expression for difference in replay(recorded, tolerance=1e-9).differences] == ["ans / 0"]:
+    print("OK")
+else:
+    print("NOK")
+
+notes = "_" * 48 + "\n2 ^ 10 =\n1024\npowers\n" + "_" * 48 + "\nans - 24 =\n1000\n"
+
+if entries_from_notes(notes) == [HistoryEntry("2 ^ 10", "1024", 0), HistoryEntry("ans - 24", "1000", 0)] \
+        and replay(entries_from_notes(notes)).differences == []:
+    print("OK")
+else:
+    print("NOK")
+
+print("\n###############################\n")
+print("Testing reading and saving notes:")
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "notes.txt")
+
+    # Chunks of 3 bytes split two-byte characters and "\r\n"
+    with open(path, "wb") as file:
+        file.write("ľš 1 + 2 =\r\n3\r\n\r\nčo\r".encode() + b"\xff")
+
+    chunks = list(read_chunks(path, 3))
+
+    if "".join(text for text, _, _ in chunks) == "ľš 1 + 2 =\n3\n\nčo\n\ufffd" and chunks[-1][1:] == (24, 24):
+        print("OK")
+    else:
+        print("NOK")
+
+    def failing_chunks():
+        yield "new text"
+        raise OSError("disk full")
+
+    # The file is replaced only when all of it is written
+    save_text(path, ["12,5 =\n", "12,5\n"])
+
+    try:
+        save_text(path, failing_chunks())
+        print("NOK")
+    except OSError:
+        with open(path, encoding="utf-8") as file:
+            if file.read() == "12,5 =\n12,5\n" and os.listdir(directory) == ["notes.txt"]:
+                print("OK")
+            else:
+                print("NOK")
+
+    # Text which can not be encoded or permissions which can not be copied leave no temporary file either
+    chmod, open_descriptor = os.chmod, os.open
+    descriptors = []
+
+    def failing_chmod(*arguments: object) -> None:
+        raise PermissionError("not the owner")
+
+    def recording_open(*arguments: object) -> int:
+        descriptors.append(open_descriptor(*arguments))
+        return descriptors[-1]
+
+    os.chmod, os.open = failing_chmod, recording_open
+    results = []
+
+    for chunks in (["1"], ["\ud800"]):
+        try:
+            save_text(path, chunks)
+            results.append("saved")
+        except (OSError, ValueError) as e:
+            results.append(type(e).__name__)
+
+        os.chmod = chmod
+
+    os.open = open_descriptor
+
+    def is_closed(descriptor: int) -> bool:
+        try:
+            os.fstat(descriptor)
+            return False
+        except OSError:
+            return True
+
+    if results == ["PermissionError", "UnicodeEncodeError"] and os.listdir(directory) == ["notes.txt"] and all(map(is_closed, descriptors)):
+        print("OK")
+    else:
+        print("NOK")
+
+    # Lines of a mapped file span several blocks of the index, the last one has no line end
+    lines = [str(i) + " * ľ =\r" if i % 7 else "" for i in range(3 * LINE_STEP + 5)]
+
+    with open(path, "wb") as file:
+        file.write("\n".join(lines).encode())
+
+    notes = MappedNotes(path)
+    notes.indexer.join()
+
+    if notes.is_indexed() and notes.line_count == len(lines) \
+            and [notes.line(i) for i in range(notes.line_count)] == [line.rstrip("\r") for line in lines]:
+        print("OK")
+    else:
+        print("NOK")
+
+    # Searching continues from the start after the last line
+    if notes.find("701 * ľ") == 701 and notes.find("1 * ľ", 702) == 711 and notes.find("1 * ľ", 772) == 1 \
+            and notes.find("2 * 2") is None:
+        print("OK")
+    else:
+        print("NOK")
+
+    notes.close()
+
+print("\n###############################\n")
+print("Testing plotting:")
+
+try:
+    from plotting import Plotter, View
+except ImportError:
+    print("NumPy is not installed, skipped.")
+else:
+    view = View.centered(-5, 5, 800, 600)
+
+    # Moving the view by less than a tile evaluates nothing, moving it further only the new tiles
+    plotter = Plotter("x ^ 3 - 2 * x")
+    plotter.polylines(view)
+    before_pan = plotter.evaluated_points
+    plotter.polylines(view.pan(20, 0))
+    after_small_pan = plotter.evaluated_points
+    plotter.polylines(view.pan(-400, 0))
+
+    if after_small_pan == before_pan and 0 < plotter.evaluated_points - after_small_pan < before_pan:
+        print("OK")
+    else:
+        print("NOK")
+
+    # ln x is sampled more densely near 0, where it has no values on one side
+    xs, ys = Plotter("ln x").samples(view)
+    near_zero = np.count_nonzero((xs > 0) & (xs < 0.5))
+    further = np.count_nonzero((xs > 3) & (xs < 3.5))
+
+    if near_zero > 2 * further and np.all(np.isnan(ys[xs <= 0])) and not np.any(np.isnan(ys[xs > 0])):
+        print("OK")
+    else:
+        print("NOK")
+
+    # tan x is broken at its 4 poles in [-5, 5] instead of joining them with vertical lines
+    if len(Plotter("tan x").polylines(view)) == 5 and len(Plotter("sin x").polylines(view)) == 1:
+        print("OK")
+    else:
+        print("NOK")
+
+    try:
+        Plotter("sin (")
+        print("NOK")
+    except ValueError:
+        print("OK")
@@ -0,0 +1,230 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from time import monotonic, time
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# Number of entries kept by default, older ones are overwritten
+HISTORY_CAPACITY = 10000
+
+HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".calculator_history.sqlite3")
+
+# The writer of HistoryStore waits up to BATCH_DELAY seconds for more entries and writes at most BATCH_SIZE of them
+# in one transaction
+BATCH_DELAY = 0.5
+BATCH_SIZE = 1000
+
+# Rows read at once when older history is shown and the most results of one search
+PAGE_SIZE = 200
+SEARCH_LIMIT = 500
+
+class HistoryEntry(NamedTuple):
+    expression: str
+    result: str
+    # Seconds since the epoch when the result was shown
+    timestamp: float
+
+class HistoryBuffer():
+    """
+    Ring buffer of at most <capacity> entries of history. Adding an entry and reading one by its index take constant
+    time however long the history is, index 0 is the newest entry.
+    """
+    def __init__(self, capacity: int = HISTORY_CAPACITY) -> None:
+        if capacity < 1:
+            raise ValueError("capacity has to be positive")
+
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self) -> None:
+        self.entries: List[Optional[HistoryEntry]] = [None] * self.capacity
+        # Index of the slot for the next entry
+        self.next = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> HistoryEntry:
+        if not 0 <= index < self.count:
+            raise IndexError("history index out of range")
+
+        return self.entries[(self.next - 1 - index) % self.capacity]
+
+    def is_full(self) -> bool:
+        return self.count == self.capacity
+
+    def append_older(self, entry: HistoryEntry) -> None:
+        """
+        Adds <entry> as the oldest one (e.g. loaded from HistoryStore), the buffer must not be full.
+        """
+        if self.is_full():
+            raise ValueError("history is full")
+
+        self.entries[(self.next - 1 - self.count) % self.capacity] = entry
+        self.count += 1
+
+    def drop_oldest(self) -> None:
+        if self.count > 0:
+            self.count -= 1
+
+    def append(self, expression: str, result: str, timestamp: Optional[float] = None) -> HistoryEntry:
+        """
+        Adds the newest entry, the oldest one is dropped when the buffer is full.
+        """
+        entry = HistoryEntry(expression, result, time() if timestamp is None else timestamp)
+        self.entries[self.next] = entry
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+        return entry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, expression TEXT NOT NULL, result TEXT NOT NULL, timestamp REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+"""
+
+# Words of expressions may contain _ (log_base) and decimal commas, the index is updated by a trigger
+FULL_TEXT_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_search USING fts5(expression, result, content='history', content_rowid='id',
+                                                            tokenize="unicode61 tokenchars '_,'");
+CREATE TRIGGER IF NOT EXISTS history_search_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_search (rowid, expression, result) VALUES (new.id, new.expression, new.result);
+END;
+"""
+
+def search_words(text: str) -> List[str]:
+    """
+    Returns words of <text> as the full-text index splits it, other characters (brackets, operators, quotes) are skipped.
+    """
+    return re.findall(r"[\w,]+", text)
+
+def full_text_query(words: List[str]) -> str:
+    """
+    Returns FTS5 query matching rows with words starting with every one of <words>.
+    """
+    return " ".join('"' + word + '"*' for word in words)
+
+class HistoryStore():
+    """
+    History saved in SQLite database <path>. Entries are added to a queue and written by a background thread in
+    batches, so adding never waits for the disk. Reading (pages of older entries and searching) uses its own connection
+    of the thread that created the store. Uses full-text search of FTS5, or LIKE where SQLite is built without it.
+    """
+    def __init__(self, path: str = HISTORY_FILE) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+        try:
+            self.connection.executescript(FULL_TEXT_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+
+        # Entries written by previous sessions have ids up to this one
+        self.last_saved_id = self.connection.execute("SELECT coalesce(max(id), 0) FROM history").fetchone()[0]
+        # The last error of the writer, if writing failed
+        self.error: Optional[str] = None
+
+        # Items of the queue are ("add", entry), ("clear", None), ("flush", None), which makes the writer write
+        # without waiting for more, and ("stop", None)
+        self.queue: 'queue.Queue[Tuple[str, Optional[HistoryEntry]]]' = queue.Queue()
+        self.writer = threading.Thread(target=self.write_batches, daemon=True)
+        self.writer.start()
+
+    def add(self, entry: HistoryEntry) -> None:
+        self.queue.put(("add", entry))
+
+    def clear(self) -> None:
+        """
+        Deletes all saved history, after the entries added before are written.
+        """
+        self.queue.put(("clear", None))
+
+    def flush(self) -> None:
+        """
+        Waits until everything added before is written (e.g. before searching, so new entries are found too).
+        """
+        self.queue.put(("flush", None))
+        self.queue.join()
+
+    def close(self) -> None:
+        self.queue.put(("stop", None))
+        self.writer.join()
+        self.connection.close()
+
+    def write_batches(self) -> None:
+        connection = sqlite3.connect(self.path)
+        running = True
+
+        while running:
+            batch = [self.queue.get()]
+            deadline = monotonic() + BATCH_DELAY
+
+            while batch[-1][0] not in ("flush", "stop") and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            try:
+                with connection:
+                    for command, entry in batch:
+                        if command == "stop":
+                            running = False
+                        elif command == "add":
+                            connection.execute("INSERT INTO history (expression, result, timestamp) VALUES (?, ?, ?)", entry)
+                        elif command == "clear":
+                            connection.execute("DELETE FROM history")
+
+                            if self.full_text:
+                                connection.execute("INSERT INTO history_search (history_search) VALUES ('delete-all')")
+            except sqlite3.Error as e:
+                self.error = str(e)
+
+            for _ in batch:
+                self.queue.task_done()
+
+        connection.close()
+
+    def page(self, before_id: int, limit: int = PAGE_SIZE) -> List[Tuple[int, HistoryEntry]]:
+        """
+        Returns at most <limit> newest saved entries with ids lower than <before_id> and their ids, newest first.
+        """
+        rows = self.connection.execute("SELECT id, expression, result, timestamp FROM history WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                       (before_id, limit))
+
+        return [(row[0], HistoryEntry(*row[1:])) for row in rows]
+
+    def all_entries(self) -> Iterator[HistoryEntry]:
+        """
+        Yields all saved entries, oldest first, rows are read while they are consumed.
+        """
+        for row in self.connection.execute("SELECT expression, result, timestamp FROM history ORDER BY id"):
+            yield HistoryEntry(*row)
+
+    def search(self, text: str, limit: int = SEARCH_LIMIT) -> List[HistoryEntry]:
+        """
+        Returns at most <limit> newest saved entries, whose expression or result contains words starting with all
+        words of <text> (e.g. "ln 2" finds "ln (x + 2)", ...), newest first. Other characters of <text> are ignored.
+        """
+        words = search_words(text)
+
+        if not words:
+            return []
+
+        if self.full_text:
+            rows = self.connection.execute("SELECT expression, result, timestamp FROM history WHERE id IN "
+                                           "(SELECT rowid FROM history_search WHERE history_search MATCH ? ORDER BY rowid DESC LIMIT ?) "
+                                           "ORDER BY id DESC", (full_text_query(words), limit))
+        else:
+            conditions = " AND ".join(["(expression || ' ' || result) LIKE ? ESCAPE '\\'"] * len(words))
+            patterns = ["%" + word.replace("_", "\\_") + "%" for word in words]
+            rows = self.connection.execute("SELECT expression, result, timestamp FROM history WHERE " + conditions +
+                                           " ORDER BY id DESC LIMIT ?", (*patterns, limit))
+
+        return [HistoryEntry(*row) for row in rows]
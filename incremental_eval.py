@@ -0,0 +1,179 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+from my_eval import Ast_node, Lexeme, ParserState, lex_expr, parse_lexemes, finish_parsing, invalid_at, lexing_error_position, \
+    eval_node, TOO_LARGE
+
+# A copy of the parser state is kept after every CHECKPOINT_INTERVAL lexemes (or more, when its stacks are deeper,
+# so copying them takes constant time per lexeme). An edit is parsed again from the last copy before it.
+CHECKPOINT_INTERVAL = 32
+
+# Values of subtrees are forgotten, when there are more of them than this times the number of lexemes
+# (most of them belong to old versions of the expression then).
+MAX_VALUES_PER_LEXEME = 4
+
+def common_prefix_length(first: str, second: str) -> int:
+    if second.startswith(first):
+        return len(first)
+
+    if first.startswith(second):
+        return len(second)
+
+    # Binary search with startswith, which compares in C instead of a loop over the characters
+    low, high = 0, min(len(first), len(second))
+
+    while low < high:
+        middle = (low + high + 1) // 2
+
+        if second.startswith(first[:middle]):
+            low = middle
+        else:
+            high = middle - 1
+
+    return low
+
+class IncrementalEvaluator():
+    """
+    Evaluates versions of one expression while it is edited (e.g. typed), every version by evaluate.
+    Lexemes in front of the first changed character are kept, parsing continues from the last copy of ParserState
+    before them and values of the subtrees that did not change are reused. So appending to the end of the expression
+    or deleting from it takes time independent of its length.
+    """
+    def __init__(self, variables: Optional[Dict[str, Union[int, float]]] = None) -> None:
+        self.reset(variables or {})
+
+    def reset(self, variables: Dict[str, Union[int, float]]) -> None:
+        self.variables = dict(variables)
+        self.expression = ""
+        self.lexemes: List[Lexeme] = []
+        self.checkpoints: List[Tuple[int, ParserState]] = [(0, ParserState())]
+        # Values of inner nodes by their id, the node is kept with its value, so its id is not reused
+        self.values: Dict[int, Tuple[Ast_node, Union[int, float], str]] = {}
+
+    def set_variables(self, variables: Dict[str, Union[int, float]]) -> None:
+        """
+        Sets values of variables for the next versions, a change of them starts from scratch.
+        """
+        if variables != self.variables:
+            self.reset(variables)
+
+    def update(self, expression: str) -> Tuple[Optional[Ast_node], str]:
+        """
+        Returns the root of AST of <expression> and the error like parse_expr.
+        """
+        common = common_prefix_length(self.expression, expression)
+        self.expression = expression
+        lexemes = self.lexemes
+
+        # The lookahead of a lexeme checks the character after it, which has to be unchanged too
+        kept = len(lexemes)
+
+        while kept > 0 and lexemes[kept - 1][2] >= common:
+            kept -= 1
+
+        del lexemes[kept:]
+
+        position = lexemes[-1][2] if lexemes else 0
+        new_lexemes = lex_expr(expression[position:], self.variables)
+
+        if new_lexemes is None:
+            return None, invalid_at(expression, position + lexing_error_position(expression[position:], self.variables))
+
+        lexemes.extend((lexeme_type, start + position, end + position) for lexeme_type, start, end in new_lexemes)
+
+        while self.checkpoints[-1][0] > kept:
+            self.checkpoints.pop()
+
+        parsed, state = self.checkpoints[-1]
+        state = state.copy()
+
+        while parsed < len(lexemes):
+            interval = max(CHECKPOINT_INTERVAL, len(state.operators) + len(state.operands))
+            end = min(len(lexemes), self.checkpoints[-1][0] + interval)
+            error = parse_lexemes(state, expression, lexemes[parsed : end])
+
+            if error != "":
+                return None, error
+
+            parsed = end
+
+            if parsed == self.checkpoints[-1][0] + interval:
+                self.checkpoints.append((parsed, state.copy()))
+
+        return finish_parsing(state, expression)
+
+    def evaluate_tree(self, root: Ast_node) -> Tuple[Union[int, float], str]:
+        """
+        Evaluates AST with root node equal to <root> like evaluate_ast, but takes the values of the subtrees evaluated
+        for the previous versions and stops at the first error in the same way.
+        """
+        values = self.values
+
+        if len(values) > MAX_VALUES_PER_LEXEME * len(self.lexemes) + 1024:
+            values.clear()
+
+        results: List[Union[int, float]] = []
+        stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+        while stack:
+            node, children_evaluated = stack.pop()
+
+            if not node.children:
+                if node.number is not None:
+                    results.append(node.number)
+                elif node.decimal_number is not None:
+                    results.append(node.decimal_number)
+                else:
+                    results.append(self.variables[node.token.value])
+                continue
+
+            known = values.get(id(node))
+
+            if known is not None and known[0] is node:
+                if known[2] != "":
+                    return known[1], known[2]
+
+                results.append(known[1])
+                continue
+
+            if not children_evaluated:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            result, error = eval_node(node, results)
+            values[id(node)] = (node, result, error)
+
+            if error != "":
+                return result, error
+
+            results.append(result)
+
+        return results[0], ""
+
+    def evaluate(self, expression: str) -> str:
+        """
+        Returns the same result as evaluation(<expression>, variables), but computed incrementally from the previous
+        version of the expression. Positions in errors count the spaces of <expression> as they are, like in evaluation.
+        Returns an empty string for an empty expression and "Math error" where the math module raises.
+        """
+        root, error = self.update(expression)
+
+        if error != "":
+            return error
+
+        if root is None:
+            return ""
+
+        try:
+            result, error = self.evaluate_tree(root)
+        except (ArithmeticError, ValueError):
+            return "Math error"
+
+        if error != "":
+            return error
+
+        try:
+            return str(result).replace(".", ",")
+        except ValueError:
+            # Integer has more digits than Python converts to a string (sys.get_int_max_str_digits)
+            return TOO_LARGE
@@ -1,7 +1,12 @@
-from typing import Optional
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from time import localtime, strftime
+from typing import Dict, List, Optional, Union
 
 from PyQt5.QtWidgets import (QApplication, 
                              QMainWindow,
+                             QHeaderView,
                              QToolButton, 
                              QMenu,
                              QInputDialog,
@@ -9,16 +14,143 @@ from PyQt5.QtWidgets import (QApplication,
                              QDesktopWidget
                              )
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QAbstractListModel, QModelIndex
 
 import pyperclip
 
 from calculator_gui import Ui_MainWindow
-from my_eval import evaluation
+from my_eval import result_value
+from async_eval import BackgroundEvaluator, TIMED_OUT
+from incremental_eval import IncrementalEvaluator
+from history import HistoryBuffer, HistoryEntry, HistoryStore, HISTORY_CAPACITY, PAGE_SIZE, SEARCH_LIMIT, search_words
 from notes import NotesWindow
 from drawing_notes import MainWindow as Drawings
 
+# Milliseconds after which the result label says that the evaluation is still computing
+COMPUTING_DELAY = 150
+
+# Milliseconds without typing after which the result of <input_line> is previewed in the status bar
+PREVIEW_DELAY = 30
+
+# Milliseconds without typing after which history is searched
+SEARCH_DELAY = 150
+
+class HistoryModel(QAbstractListModel):
+    """
+    Newest first list of the entries of <buffer> for the history view, which asks only for the rows it shows.
+    Entries are saved to <store>, older entries saved by it are read a page at a time when the view is scrolled
+    to the end (until the buffer is full). While there is a search, the model shows its results instead.
+    """
+    def __init__(self, buffer: HistoryBuffer, store: Optional[HistoryStore] = None) -> None:
+        super().__init__()
+        self.buffer = buffer
+        self.store = store
+        # Saved entries with lower ids are not read yet, entries of this session get higher ids than all saved ones
+        self.unread_before = 0 if store is None else store.last_saved_id + 1
+        self.search_results: Optional[List[HistoryEntry]] = None
+
+    def entries(self) -> Union[HistoryBuffer, List[HistoryEntry]]:
+        return self.buffer if self.search_results is None else self.search_results
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries())
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.entries()):
+            return None
+
+        entry = self.entries()[index.row()]
+
+        if role == Qt.DisplayRole:
+            return entry.expression + " =\n" + entry.result
+        if role == Qt.ToolTipRole:
+            return strftime("%Y-%m-%d %H:%M:%S", localtime(entry.timestamp))
+        if role == Qt.UserRole:
+            return entry
+
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.search_results is None and self.unread_before > 1 and not self.buffer.is_full()
+
+    def fetchMore(self, parent=QModelIndex()):
+        page = self.store.page(self.unread_before, min(PAGE_SIZE, self.buffer.capacity - len(self.buffer)))
+
+        if not page:
+            self.unread_before = 0
+            return
+
+        first = len(self.buffer)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+
+        for _, entry in page:
+            self.buffer.append_older(entry)
+
+        self.endInsertRows()
+        self.unread_before = page[-1][0]
+
+    def add(self, expression: str, result: str) -> None:
+        """
+        Adds the entry at the top and saves it, the oldest one is removed when the history is full.
+        """
+        if self.search_results is not None:
+            # The rows show results of the search, only the buffer changes
+            entry = self.buffer.append(expression, result)
+        else:
+            if self.buffer.is_full():
+                last = len(self.buffer) - 1
+                self.beginRemoveRows(QModelIndex(), last, last)
+                self.buffer.drop_oldest()
+                self.endRemoveRows()
+
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            entry = self.buffer.append(expression, result)
+            self.endInsertRows()
+
+        if self.store is not None:
+            self.store.add(entry)
+
+    def search(self, text: str) -> None:
+        """
+        Shows the newest saved entries matching <text> (see HistoryStore.search), or the history again for empty <text>.
+        Without the store only the entries in the buffer are searched.
+        """
+        self.beginResetModel()
+
+        if search_words(text) == []:
+            self.search_results = None
+        elif self.store is not None:
+            self.store.flush()
+            self.search_results = self.store.search(text)
+        else:
+            words = [word.lower() for word in search_words(text)]
+            self.search_results = [entry for entry in (self.buffer[i] for i in range(len(self.buffer)))
+                                   if all(word in (entry.expression + " " + entry.result).lower() for word in words)][:SEARCH_LIMIT]
+
+        self.endResetModel()
+
+    def clear(self) -> None:
+        """
+        Deletes all history, including the saved one.
+        """
+        self.beginResetModel()
+        self.buffer.clear()
+        self.unread_before = 0
+
+        if self.search_results is not None:
+            self.search_results = []
+
+        if self.store is not None:
+            self.store.clear()
+
+        self.endResetModel()
+
 class MainWindow(QMainWindow):
+    # Number of the evaluation, the expression and its result, emitted from the thread of the evaluator
+    evaluation_finished = pyqtSignal(int, str, str)
+    # Number of the preview and its result, emitted from the thread of the preview
+    preview_finished = pyqtSignal(int, str)
+
     def __init__(self):
         super().__init__()
         self.ui = Ui_MainWindow()
@@ -98,17 +230,59 @@ class MainWindow(QMainWindow):
         self.ui.history_button.setCheckable(True)
         self.ui.history_button.clicked.connect(self.show_history)
 
-        self.ui.history.setCursor(Qt.IBeamCursor)
+        # Only the visible rows of the history are drawn and all of them have the same height, so the view does not
+        # measure them and its length does not slow down evaluations
+        try:
+            self.history_store: Optional[HistoryStore] = HistoryStore()
+        except sqlite3.Error:
+            # History is kept only until the window closes
+            self.history_store = None
+
+        self.history = HistoryModel(HistoryBuffer(HISTORY_CAPACITY), self.history_store)
+        self.ui.history.setModel(self.history)
+
+        if self.history.canFetchMore():
+            self.history.fetchMore()
+        self.ui.history.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.ui.history.verticalHeader().setDefaultSectionSize(2 * self.ui.history.fontMetrics().lineSpacing() + 8)
+        self.ui.history.doubleClicked.connect(self.use_history_entry)
 
         self.ui.clear_history_button.clicked.connect(self.history_clear)
 
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(lambda: self.history.search(self.ui.history_search.text()))
+        self.ui.history_search.textChanged.connect(lambda: self.search_timer.start())
+
         self.ui.notes_button.clicked.connect(self.open_notes)
 
         self.last_epxression = ""
+        # Value of the last result, which can be used in expressions as variable ans
+        self.last_value = None
         self.ui.save_notes_button.clicked.connect(self.save_to_notes)
 
         self.ui.hand_notes_button.clicked.connect(self.open_drawings)
 
+        # Expressions are evaluated in a worker process, so a slow one does not freeze the window
+        self.evaluator = BackgroundEvaluator()
+        self.pending_evaluation: Optional[Future] = None
+        self.evaluation_number = 0
+        self.evaluation_finished.connect(self.show_result)
+
+        # Every edit restarts the timer, so fast typing is previewed only once it stops. The preview is evaluated
+        # in a thread of its own, where the incremental evaluator keeps its state, so a long expression does not freeze the window.
+        self.preview = IncrementalEvaluator()
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_preview: Optional[Future] = None
+        self.preview_number = 0
+        self.preview_finished.connect(self.show_preview_result)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY)
+        self.preview_timer.timeout.connect(self.show_preview)
+        self.ui.input_line.textChanged.connect(lambda: self.preview_timer.start())
+
     def writing_buttons(self):
         """
         This method determins which button made the signal and then writes the coresponding character to input_line.
@@ -251,8 +425,8 @@ class MainWindow(QMainWindow):
 
     def evaluate(self):
         """
-        Evaluates what is written in <input_line>, updates history and writes the result to
-        <input_line> and <last_result_label>.
+        Starts evaluation of what is written in <input_line>, show_result then updates history and writes the result to
+        <input_line> and <last_result_label>. Evaluation which did not finish yet is cancelled.
         """
         expression = self.ui.input_line.text()
         if expression == "":
@@ -260,12 +434,98 @@ class MainWindow(QMainWindow):
 
         self.last_epxression = expression
 
-        result = evaluation(expression)
+        if self.pending_evaluation is not None:
+            self.pending_evaluation.cancel()
+
+        variables = {} if self.last_value is None else {"ans" : self.last_value}
+
+        self.evaluation_number += 1
+        self.pending_evaluation = self.evaluator.submit(expression, variables)
+        self.pending_evaluation.add_done_callback(partial(self.evaluation_done, self.evaluation_number, expression))
+
+        QTimer.singleShot(COMPUTING_DELAY, partial(self.show_computing, self.evaluation_number))
+
+    def evaluation_done(self, number: int, expression: str, future: Future) -> None:
+        """
+        Called in the thread of the evaluator, passes the result to the GUI thread.
+        """
+        if future.cancelled():
+            return
+
+        # The future holds an exception if the evaluator failed (e.g. it was closed), the result label must not wait for it
+        if future.exception() is not None:
+            self.evaluation_finished.emit(number, expression, "Evaluation failed")
+        else:
+            self.evaluation_finished.emit(number, expression, future.result())
+
+    def show_computing(self, number: int) -> None:
+        if number == self.evaluation_number and self.pending_evaluation is not None:
+            self.ui.last_result_label.setText("computing…")
+
+    def show_result(self, number: int, expression: str, result: str) -> None:
+        """
+        Writes the result to <input_line> and <last_result_label> and updates history, unless newer evaluation started.
+        Expression which timed out is left in <input_line>, so it can be edited.
+        """
+        if number != self.evaluation_number:
+            return
+
+        self.pending_evaluation = None
+
+        if result == TIMED_OUT:
+            result = "timed out"
+        else:
+            value = result_value(result)
+            if value is not None:
+                self.last_value = value
+
+            self.ui.input_line.setText(result)
+
         self.ui.last_result_label.setText(result)
-        self.ui.input_line.setText(result)
 
-        old_history = self.ui.history.toPlainText()
-        self.ui.history.setText(expression + " =\n" + result + "\n" + "_" * 48 + "\n" + old_history)
+        self.history.add(expression, result)
+
+    def show_preview(self) -> None:
+        """
+        Starts the preview of <input_line>, show_preview_result then shows it. A preview that did not start yet
+        is replaced by the newer one.
+        """
+        if self.pending_preview is not None:
+            self.pending_preview.cancel()
+
+        variables = {} if self.last_value is None else {"ans" : self.last_value}
+
+        self.preview_number += 1
+        self.pending_preview = self.preview_executor.submit(self.evaluate_preview, self.ui.input_line.text(), variables)
+        self.pending_preview.add_done_callback(partial(self.preview_done, self.preview_number))
+
+    def evaluate_preview(self, expression: str, variables: Dict[str, Union[int, float]]) -> str:
+        """
+        Called in the thread of the preview, evaluates only what changed since the previous preview.
+        """
+        self.preview.set_variables(variables)
+        return self.preview.evaluate(expression)
+
+    def preview_done(self, number: int, future: Future) -> None:
+        """
+        Called in the thread of the preview, passes the result to the GUI thread (an empty one if the preview failed).
+        """
+        if not future.cancelled():
+            self.preview_finished.emit(number, future.result() if future.exception() is None else "")
+
+    def show_preview_result(self, number: int, result: str) -> None:
+        """
+        Shows <result> in the status bar while it is a value, unless a newer preview started.
+        """
+        if number != self.preview_number:
+            return
+
+        self.pending_preview = None
+
+        if result_value(result) is None:
+            self.ui.statusbar.clearMessage()
+        else:
+            self.ui.statusbar.showMessage("= " + result)
 
     def show_history(self, checked):
         site_index = 1 if checked else 0
@@ -273,7 +533,13 @@ class MainWindow(QMainWindow):
         self.ui.history_panel.setCurrentIndex(site_index)
 
     def history_clear(self):
-        self.ui.history.setText("")
+        self.history.clear()
+
+    def use_history_entry(self, index: QModelIndex) -> None:
+        """
+        Writes the expression of the double clicked entry of history to <input_line>.
+        """
+        self.ui.input_line.setText(self.history.data(index, Qt.UserRole).expression)
 
     def open_notes(self):
         """
@@ -294,9 +560,16 @@ class MainWindow(QMainWindow):
 
     def write_note_to_current_tab(self, text: str) -> None:
         """
-        Note_window has to be opened. writes <text> to the curent tab.
+        Note_window has to be opened. writes <text> to the curent tab (or to a new one, if the current tab
+        is a read-only large file).
         """
         current_index = self.note_window.ui.tabWidget.currentIndex()
+
+        if self.note_window.ui.tabWidget.tabText(current_index) not in self.note_window.text_edits_on_tabs:
+            self.note_window.add_new()
+            current_index = self.note_window.ui.tabWidget.count() - 1
+            self.note_window.ui.tabWidget.setCurrentIndex(current_index)
+
         text_edit: QTextEdit = self.note_window.text_edits_on_tabs[self.note_window.ui.tabWidget.tabText(current_index)]
 
         previous_text = text_edit.toPlainText()
@@ -349,3 +622,8 @@ if __name__ == "__main__":
     window.show()
 
     app.exec()
+    window.evaluator.close()
+    window.preview_executor.shutdown(cancel_futures=True)
+
+    if window.history_store is not None:
+        window.history_store.close()
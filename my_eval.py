@@ -1,6 +1,14 @@
+import re
+from array import array
 from enum import Enum
-from typing import Dict, List, Optional, Set, Tuple, Union
-from math import sin, cos, tan, asin, acos, atan, log, pow, pi, e, sqrt
+from typing import Callable, Collection, Dict, FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple, Union
+from math import sin, cos, tan, asin, acos, atan, log, log2, pow, pi, e, sqrt
+from itertools import accumulate, chain
+from functools import lru_cache, partial
+from operator import add, sub, itemgetter
+from sys import getsizeof
+
+from eval_cache import LRUCache
 
 class Type(Enum):
     NUMBER = 0
@@ -12,6 +20,7 @@ class Type(Enum):
     OPEN_PAR = 6
     CLOSE_PAR = 7
     FUNCTION = 8
+    VARIABLE = 9
 
 class Prec(Enum):
     MIN = 0
@@ -34,181 +43,121 @@ PRECEDENCE: Dict[int, int] = {Type.NUMBER : Prec.MIN,
                               Type.EXPONENT : Prec.POWER,
                               Type.OPEN_PAR : Prec.PARS,
                               Type.CLOSE_PAR : Prec.MIN,
-                              Type.FUNCTION : Prec.FUNC}
+                              Type.FUNCTION : Prec.FUNC,
+                              Type.VARIABLE : Prec.MIN}
 
 ALL_FUNCTIONS = {"sin", "cos", "tan", "arcsin", "arccos", "arctan", "mod", "sroot", "yth_root", "ln", "log_base", "abs"}
 
 class Token():
+    __slots__ = ("type", "value")
+
     def __init__(self, value: str, type: Type) -> None:
         self.type = type
         self.value = value
 
+OPERATOR_TYPES: Set[Type] = set(ONE_CHARACTER_TYPES.values())
 
-def tokenize_expr(expression: str) -> Optional[List[Token]]:
-    """
-    Makes list of tokens that represents given expression.
-    Also checks if the tokens are correct numbers, functions, operators or constants (like pi and e).
-    
-    Returns the list if no error was found or returns None otherwise.
-    """
-    tokens: List[Token] = []
-
-    token_type: Optional[Type] = None
-    token_begin = 0
-    i = 0
-
-    while i < len(expression):
-        char = expression[i]
 
-        if token_type is None:
-            if char == ' ':
-                i += 1
-                continue
-
-            if char.isdigit():
-                token_type = Type.NUMBER
-                token_begin = i
-                decimal_point = False
-                i += 1
-                continue
+# Alternatives of one lexeme. The lookaheads reject numbers and names glued to something they can not
+# be followed by (e.g. "5pi", "1,", "pi(", "sin+"). Function names are listed, so unknown names are not matched at all.
+LEXEME_ALTERNATIVES: List[str] = [r"[0-9]+(?:,[0-9]+)?(?=[ +\-*/^()]|\Z)",
+                                  r"[+\-*/^()]",
+                                  r"(?:pi|e)(?=[ +\-*/^)]|\Z)",
+                                  r"(?:" + "|".join(sorted(ALL_FUNCTIONS, key=len, reverse=True)) + r")(?=[ (]|\Z)"]
 
-            if char in ONE_CHARACTER_TYPES:
-                new_token = Token(char, ONE_CHARACTER_TYPES[char])
-                tokens.append(new_token)
-                i += 1
-                continue
+def lexeme_regex(alternatives: List[str]) -> Pattern[str]:
+    """
+    Returns regex matching one lexeme with the spaces in front of it.
+    """
+    return re.compile(r"( *)(" + "|".join(alternatives) + ")")
 
-            if char == ',':
-                return None
+LEXEME_REGEX = lexeme_regex(LEXEME_ALTERNATIVES)
 
-            token_type = Type.FUNCTION
-            token_begin = i
-            i += 1
-            continue
+VARIABLE_NAME_REGEX = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 
-        if token_type == Type.NUMBER:
-            if char.isdigit() or (char == ',' and not decimal_point):
-                decimal_point = decimal_point or char == ','
-                i += 1
-                continue
-
-            if (char in ONE_CHARACTER_TYPES or char == ' ') and not expression[i - 1] == ',':
-                new_token = Token(expression[token_begin : i], Type.NUMBER)
-                tokens.append(new_token)
-                token_type = None
-                continue
+def valid_variable_name(name: str) -> bool:
+    """
+    Returns whether <name> can be a name of a variable, it must not be a name of a function or a constant.
+    """
+    return bool(VARIABLE_NAME_REGEX.fullmatch(name)) and name not in ALL_FUNCTIONS and name not in ("pi", "e")
 
-            return None
+@lru_cache(maxsize=64)
+def variables_lexeme_regex(variables: FrozenSet[str]) -> Pattern[str]:
+    """
+    Returns LEXEME_REGEX that also matches names of <variables>, which are used like constants.
+    Raises ValueError if some of the names is not a valid name of a variable.
+    """
+    for name in variables:
+        if not valid_variable_name(name):
+            raise ValueError("Invalid variable name: " + name)
 
-        value = expression[token_begin : i]
+    names = "|".join(sorted(variables, key=len, reverse=True))
 
-        if (value == 'pi' or value == 'e'):
-            if char == '(':
-                return None
+    return lexeme_regex(LEXEME_ALTERNATIVES + [r"(?:" + names + r")(?=[ +\-*/^)]|\Z)"])
 
-            if char in ONE_CHARACTER_TYPES or char == ' ':
-                new_token = Token(value, Type.FUNCTION)
-                tokens.append(new_token)
-                token_type = None
-                continue
+# Type of a lexeme is determined by its first character.
+FIRST_CHAR_TYPES: Dict[str, Type] = {**{digit : Type.NUMBER for digit in "0123456789"},
+                                     **{name[0] : Type.FUNCTION for name in ALL_FUNCTIONS | {"pi", "e"}},
+                                     **ONE_CHARACTER_TYPES}
 
-        if char == ' ' or char == '(':
-            if value not in ALL_FUNCTIONS:
-                return None
+Lexeme = Tuple[Type, int, int]
 
-            new_token = Token(value, Type.FUNCTION)
-            tokens.append(new_token)
-            token_type = None
-            continue
+def lex_expr(expression: str, variables: Collection[str] = ()) -> Optional[List[Lexeme]]:
+    """
+    Splits <expression> into lexemes (type, start, end), where expression[start : end] is the text of the lexeme.
+    Constants pi and e have type FUNCTION, like in tokenize_expr. Names from <variables> have type VARIABLE.
 
-        if char.isdigit() or char in ONE_CHARACTER_TYPES or char == ',':
-            return None
-        i += 1
+    Returns None if the expression contains an incorrect number, unknown function name or character.
 
-    value = expression[token_begin : i]
+    All the work is done by one regex search and builtin functions without a Python loop over
+    the characters or lexemes. findall skips parts of the expression that are not lexemes, which is detected
+    by comparing the total length of the found lexemes and spaces with the length of the expression.
+    """
+    if variables:
+        variables = frozenset(variables)
+        pairs = variables_lexeme_regex(variables).findall(expression)
+    else:
+        pairs = LEXEME_REGEX.findall(expression)
 
-    if token_type == Type.NUMBER:
-        if expression[i - 1].isdigit():
-            new_token = Token(value, Type.NUMBER)
-            tokens.append(new_token)
-            return tokens
+    offsets = list(accumulate(map(len, chain.from_iterable(pairs))))
 
+    if (offsets[-1] if offsets else 0) != len(expression.rstrip(" ")):
         return None
 
-    if token_type == Type.FUNCTION:
-        if value != 'pi' and value != 'e' and value not in ALL_FUNCTIONS:
-            return None
-
-        new_token = Token(value, Type.FUNCTION)
-        tokens.append(new_token)
-
-    return tokens
+    if variables:
+        types = [Type.VARIABLE if text in variables else FIRST_CHAR_TYPES[text[0]] for _, text in pairs]
+    else:
+        types = map(FIRST_CHAR_TYPES.__getitem__, map(itemgetter(0), map(itemgetter(1), pairs)))
 
-def correct_number_neighbors(tokens: List[Token], i: int) -> bool:
-    return (i - 1 < 0 or (tokens[i - 1].value != 'pi' and tokens[i - 1].value != 'e'
-                          and tokens[i - 1].type != Type.NUMBER and tokens[i - 1].type != Type.CLOSE_PAR)) and \
-           (i + 1 >= len(tokens) or (tokens[i + 1].value != 'pi' and tokens[i + 1].value != 'e'
-                          and tokens[i + 1].type != Type.NUMBER and tokens[i + 1].type != Type.OPEN_PAR))
+    return list(zip(types, offsets[::2], offsets[1::2]))
 
-def correct_infix_neighbors(tokens: List[Token], i: int) -> bool:
-    return (i - 1 >= 0 and (tokens[i - 1].value == 'pi' or tokens[i - 1].value == 'e'
-                          or tokens[i - 1].type == Type.NUMBER or tokens[i - 1].type == Type.CLOSE_PAR)) and \
-           (i + 1 < len(tokens) and (tokens[i + 1].type == Type.FUNCTION and tokens[i + 1].value not in INFIX_FUNCTIONS
-                          or tokens[i + 1].type == Type.NUMBER or tokens[i + 1].type == Type.OPEN_PAR))
+# Operators always have the same value, so all their occurences share one Token.
+OPERATOR_TOKENS: Dict[str, Token] = {char : Token(char, token_type) for char, token_type in ONE_CHARACTER_TYPES.items()}
 
-def correct_minus(tokens: List[Token], i: int) -> bool:
-    return (i - 1 < 0 or (tokens[i - 1].value == 'pi' or tokens[i - 1].value == 'e' or tokens[i - 1].type == Type.OPEN_PAR
-                          or tokens[i - 1].type == Type.NUMBER or tokens[i - 1].type == Type.CLOSE_PAR)) and \
-           (i + 1 < len(tokens) and (tokens[i + 1].type == Type.FUNCTION and tokens[i + 1].value not in INFIX_FUNCTIONS
-                          or tokens[i + 1].type == Type.NUMBER or tokens[i + 1].type == Type.OPEN_PAR))
-
-def correct_function_neighbors(tokens: List[Token], i: int) -> bool:
-    return (i - 1 < 0 or (tokens[i - 1].value != 'pi' and tokens[i - 1].value != 'e'
-                          and tokens[i - 1].type != Type.NUMBER and tokens[i - 1].type != Type.CLOSE_PAR)) and \
-           (i + 1 < len(tokens) and (tokens[i + 1].type == Type.FUNCTION and tokens[i + 1].value not in INFIX_FUNCTIONS
-                          or tokens[i + 1].type == Type.NUMBER or tokens[i + 1].type == Type.OPEN_PAR))
-
-def correct_tokenized_expression(tokens: List[Token]) -> bool:
+def tokenize_expr(expression: str) -> Optional[List[Token]]:
     """
-    Returns true if tokenized expression, created in tokenize_expr function, is a valid expression\n
-    (but does not check division by zero and things like this - this will be checked while calculating)
+    Makes list of tokens that represents given expression.
+    Also checks if the tokens are correct numbers, functions, operators or constants (like pi and e).
+    
+    Returns the list if no error was found or returns None otherwise.
     """
-    open_brackets = 0
-
-    for i in range(len(tokens)):
-        value = tokens[i].value
-        token_type = tokens[i].type
-
-        if token_type == Type.OPEN_PAR:
-            open_brackets += 1
-            continue
-
-        if token_type == Type.CLOSE_PAR:
-            if open_brackets == 0 or tokens[i - 1].type == Type.OPEN_PAR:
-                return False
-
-            open_brackets -= 1
-            continue
+    lexemes = lex_expr(expression)
 
-        if token_type == Type.MINUS:
-            if not correct_minus(tokens, i):
-                return False
-            continue
+    if lexemes is None:
+        return None
 
-        if token_type == Type.NUMBER or value == 'pi' or value == 'e':
-            if not correct_number_neighbors(tokens, i):
-                return False
-            continue
+    return [OPERATOR_TOKENS[expression[start]] if token_type in OPERATOR_TYPES
+            else Token(expression[start : end], token_type)
+            for token_type, start, end in lexemes]
 
-        if value in ONE_CHARACTER_TYPES or value in INFIX_FUNCTIONS:
-            if not correct_infix_neighbors(tokens, i):
-                return False
-            continue
+# Largest number of bits of an integer result (see configure_number_limit). Integer products are checked
+# before they are computed, so one expression can not take unbounded time and memory.
+MAX_INTEGER_BITS = 10000
 
-        if not correct_function_neighbors(tokens, i):
-            return False
+# Powers with larger binary exponent of the result do not fit into a float.
+FLOAT_MAX_EXPONENT = 1024
 
-    return open_brackets == 0
+TOO_LARGE = "Result too large"
 
 def get_num_value(value: str) -> Tuple[Optional[int], Optional[float]]:
     if value == 'pi':
@@ -218,12 +167,18 @@ def get_num_value(value: str) -> Tuple[Optional[int], Optional[float]]:
         return None, e
 
     if value.find(',') == -1:
+        # Integer with more bits than the limit is used as a float
+        if len(value) * log2(10) > MAX_INTEGER_BITS:
+            return None, float(value)
+
         return int(value), None
 
     return None, float(value.replace(',', '.'))
 
 
 class Ast_node():
+    __slots__ = ("token", "number", "decimal_number", "children")
+
     def __init__(self, token: Token) -> None:
         self.token = token
         self.number: Optional[int] = None
@@ -234,85 +189,255 @@ class Ast_node():
 
         self.children: List['Ast_node'] = []
 
-def build_ast(tokens: List[Token], begin: int, start_prec: int) -> Tuple[Optional[Ast_node], int]:
+def binding_power(operator: Ast_node) -> int:
     """
-    Creates an AST from a tokenized valid expression (as evaluated by correct_tokenized_expression) and\n
-    returns a tuple, where first coordinate is the root Ast_node of the expression and the second is index in tokens list.
+    Returns the precedence of binary <operator> node (infix functions have the precedence Prec.FUNC).
     """
-    root: Optional[Ast_node] = None
-    i = begin
+    return PRECEDENCE[operator.token.type].value
 
-    while i < len(tokens):
-        if tokens[i].type == Type.OPEN_PAR:
-            root, i = build_ast(tokens, i + 1, Prec.PARS)
-            i += 1
+def reduce_operator(operators: List[Optional[Ast_node]], operands: List[Ast_node]) -> None:
+    """
+    Pops the binary operator from the top of <operators> and its two operands from <operands>
+    and pushes the operator node with these operands as children.
+    """
+    operator = operators.pop()
+    right = operands.pop()
+    operator.children = [operands.pop(), right]
+    operands.append(operator)
 
-            if start_prec == PRECEDENCE[Type.FUNCTION] or i == len(tokens)\
-                    or start_prec != Prec.PARS and (PRECEDENCE[tokens[i].type].value < start_prec.value
-                    or (start_prec != Prec.POWER and PRECEDENCE[tokens[i].type].value == start_prec.value)):
-                return root, i
+def apply_prefix_functions(operators: List[Optional[Ast_node]], operands: List[Ast_node]) -> None:
+    """
+    Applies functions like sin, ln, ... waiting on the top of <operators> to the operand that was just completed.
+    """
+    while operators and operators[-1] is not None and operators[-1].token.type == Type.FUNCTION and operators[-1].token.value not in INFIX_FUNCTIONS:
+        function = operators.pop()
+        function.children = [operands.pop()]
+        operands.append(function)
 
-            continue
+INVALID_EXPRESSION = "invalid expression"
 
-        if tokens[i].type == Type.CLOSE_PAR:
-            return root, i
+def invalid_at(expression: str, position: int) -> str:
+    """
+    Returns the error message for invalid <expression> that went wrong at index <position>.
+    """
+    if position >= len(expression):
+        return INVALID_EXPRESSION + " (unexpected end)"
 
-        if tokens[i].type == Type.NUMBER or tokens[i].value == 'pi' or tokens[i].value == 'e':
-            if i == 0 or tokens[i - 1].type == Type.OPEN_PAR:
-                root = Ast_node(tokens[i])
-                i += 1
-                continue
+    return INVALID_EXPRESSION + " at character " + str(position + 1)
+
+def lexing_error_position(expression: str, variables: Collection[str] = ()) -> int:
+    """
+    Returns index of the first character of <expression> that is not a part of any lexeme (for which lex_expr returned None).
+    """
+    position = 0
+    regex = variables_lexeme_regex(frozenset(variables)) if variables else LEXEME_REGEX
+
+    for match in regex.finditer(expression):
+        if match.start() != position:
+            break
+
+        position = match.end()
 
-            if tokens[i - 1].type == Type.FUNCTION or i + 1 == len(tokens) or tokens[i + 1].type == Type.CLOSE_PAR \
-                    or PRECEDENCE[tokens[i + 1].type].value < start_prec.value \
-                    or (start_prec != Prec.POWER and PRECEDENCE[tokens[i + 1].type].value == start_prec.value):
-                return  Ast_node(tokens[i]), i + 1
+    while position < len(expression) and expression[position] == ' ':
+        position += 1
 
-            root = Ast_node(tokens[i])
-            i += 1
+    return position
+
+class ParserState():
+    """
+    Stacks of the parser of parse_expr after some lexemes. Parsing can continue from a copy of the state,
+    so an expression that differs only at its end does not have to be parsed from the beginning (see incremental_eval).
+    None on the stack of operators marks an open bracket.
+    """
+    __slots__ = ("operands", "operators", "open_brackets", "expecting_operand", "previous_type")
+
+    def __init__(self) -> None:
+        self.operands: List[Ast_node] = []
+        self.operators: List[Optional[Ast_node]] = []
+        self.open_brackets: List[int] = []
+        self.expecting_operand = True
+        self.previous_type: Optional[Type] = None
+
+    def copy(self) -> 'ParserState':
+        """
+        Returns copy of the state, which does not change when parsing continues from the original one. Operands are
+        finished subtrees and are shared, operators get their children only when they are reduced, so they are copied.
+        """
+        state = ParserState()
+        state.operands = self.operands[:]
+        state.operators = [None if operator is None else Ast_node(operator.token) for operator in self.operators]
+        state.open_brackets = self.open_brackets[:]
+        state.expecting_operand = self.expecting_operand
+        state.previous_type = self.previous_type
+
+        return state
+
+def parse_lexemes(state: ParserState, expression: str, lexemes: Iterable[Lexeme]) -> str:
+    """
+    Continues parsing of <expression> from <state> with <lexemes> and returns an empty string or the error
+    with the position of the first lexeme that can not be at its place.
+    """
+    operands = state.operands
+    operators = state.operators
+    open_brackets = state.open_brackets
+    expecting_operand = state.expecting_operand
+    previous_type = state.previous_type
+
+    for token_type, start, end in lexemes:
+        # Minus without left operand is allowed only at the beginning of the expression or brackets
+        leading = previous_type is None or previous_type == Type.OPEN_PAR
+        previous_type = token_type
+
+        if token_type == Type.OPEN_PAR:
+            if not expecting_operand:
+                return invalid_at(expression, start)
+
+            operators.append(None)
+            open_brackets.append(start)
             continue
 
-        if tokens[i].type == Type.FUNCTION and tokens[i].value not in INFIX_FUNCTIONS:
-            root = Ast_node(tokens[i])
-            argument, i = build_ast(tokens, i + 1, Prec.FUNC)
-            root.children.append(argument)
-            if start_prec == Prec.FUNC or (start_prec != Prec.PARS and i < len(tokens) and start_prec.value >= PRECEDENCE[tokens[i].type].value):
-                return root, i
+        if token_type == Type.CLOSE_PAR:
+            if expecting_operand or not open_brackets:
+                return invalid_at(expression, start)
+
+            while operators[-1] is not None:
+                reduce_operator(operators, operands)
+
+            operators.pop()
+            open_brackets.pop()
+            apply_prefix_functions(operators, operands)
             continue
 
-        # Now are infix functions and operators +, -, *, /, ^ left
+        value = expression[start : end]
+        operand = token_type == Type.NUMBER or token_type == Type.VARIABLE or value == 'pi' or value == 'e'
+
+        if expecting_operand:
+            if token_type == Type.MINUS and leading:
+                # Leading minus is parsed as 0 - <operand>
+                operands.append(Ast_node(Token('0', Type.NUMBER)))
+            elif operand:
+                operands.append(Ast_node(Token(value, token_type)))
+                expecting_operand = False
+                apply_prefix_functions(operators, operands)
+                continue
+            elif token_type == Type.FUNCTION and value not in INFIX_FUNCTIONS:
+                operators.append(Ast_node(Token(value, token_type)))
+                continue
+            else:
+                return invalid_at(expression, start)
+        elif operand or token_type == Type.FUNCTION and value not in INFIX_FUNCTIONS:
+            return invalid_at(expression, start)
 
-        token_prec = PRECEDENCE[tokens[i].type]
-        operator = Ast_node(tokens[i])
+        operator = Ast_node(OPERATOR_TOKENS[value] if token_type in OPERATOR_TYPES else Token(value, token_type))
+        power = binding_power(operator)
 
-        if tokens[i].type == Type.MINUS and (i == 0 or tokens[i - 1].type == Type.OPEN_PAR):
-            operator.children.append(Ast_node(Token('0', Type.NUMBER)))
-        else:
-            operator.children.append(root)
+        while operators and operators[-1] is not None and (binding_power(operators[-1]) > power
+                or binding_power(operators[-1]) == power and token_type != Type.EXPONENT):
+            reduce_operator(operators, operands)
+
+        operators.append(operator)
+        expecting_operand = True
 
-        right, i = build_ast(tokens, i + 1, token_prec)
-        operator.children.append(right)
+    state.expecting_operand = expecting_operand
+    state.previous_type = previous_type
 
-        if start_prec == token_prec or start_prec != Prec.MIN and start_prec != Prec.PARS \
-                and (i >= len(tokens) or start_prec.value >= PRECEDENCE[tokens[i].type].value):
-            return operator, i
+    return ""
 
-        root = operator
+def finish_parsing(state: ParserState, expression: str) -> Tuple[Optional[Ast_node], str]:
+    """
+    Returns the root of AST parsed from all lexemes of <expression> (None if there are none) and the error, if
+    the expression ends too early. Reduces the operators of <state>, so it can not be continued anymore.
+    """
+    if state.expecting_operand and state.previous_type is not None:
+        return None, invalid_at(expression, len(expression))
 
-    return root, i
+    if state.open_brackets:
+        return None, invalid_at(expression, state.open_brackets[-1])
+
+    while state.operators:
+        reduce_operator(state.operators, state.operands)
+
+    return state.operands[0] if state.operands else None, ""
+
+def parse_expr(expression: str, lexemes: List[Lexeme]) -> Tuple[Optional[Ast_node], str]:
+    """
+    Creates an AST from lexemes (as returned by lex_expr) of <expression> and checks that it is a valid
+    expression at the same time (but does not check division by zero and things like this - this will be checked while calculating).
+
+    Returns the root (None if there are no lexemes) and an empty string or None and the error
+    with the position of the first lexeme that can not be at its place.
+
+    It is a shunting-yard parser with explicit stacks of operands and operators instead of recursion (see ParserState),
+    so it takes linear time and the depth of brackets or length of ^ chains is not limited by the recursion limit.
+    """
+    state = ParserState()
+    error = parse_lexemes(state, expression, lexemes)
+
+    if error != "":
+        return None, error
+
+    return finish_parsing(state, expression)
+
+def tokens_to_lexemes(tokens: List[Token]) -> Tuple[str, List[Lexeme]]:
+    """
+    Returns an expression made of <tokens> separated by spaces and its lexemes.
+    """
+    lexemes: List[Lexeme] = []
+    start = 0
+
+    for token in tokens:
+        lexemes.append((token.type, start, start + len(token.value)))
+        start += len(token.value) + 1
+
+    return " ".join(token.value for token in tokens), lexemes
+
+def correct_tokenized_expression(tokens: List[Token]) -> bool:
+    """
+    Returns true if tokenized expression, created in tokenize_expr function, is a valid expression\n
+    (but does not check division by zero and things like this - this will be checked while calculating)
+    """
+    return parse_expr(*tokens_to_lexemes(tokens))[1] == ""
+
+def build_ast(tokens: List[Token], begin: int = 0, start_prec: Prec = Prec.MIN) -> Tuple[Optional[Ast_node], int]:
+    """
+    Creates an AST from a tokenized valid expression (as evaluated by correct_tokenized_expression) and\n
+    returns a tuple, where first coordinate is the root Ast_node of the expression and the second is index in tokens list.
+
+    The whole rest of <tokens> from index <begin> is parsed by parse_expr, <start_prec> is kept only for compatibility.
+    """
+    return parse_expr(*tokens_to_lexemes(tokens[begin:]))[0], len(tokens)
+
+def power(x: Union[int, float], y: Union[int, float]) -> Tuple[float, str]:
+    """
+    Returns math.pow(<x>, <y>) or TOO_LARGE error if it does not fit into a float. The binary exponent
+    of the result is estimated first, so too large powers are not computed at all.
+    """
+    if x != 0 and y * log2(abs(x)) >= FLOAT_MAX_EXPONENT:
+        return 0, TOO_LARGE
+
+    try:
+        return pow(x, y), ""
+    except OverflowError:
+        # The estimate is just below the limit, or x itself is an integer too large for a float
+        return 0, TOO_LARGE
 
 def root(x: float, yth_root: Union[float, int]) -> Tuple[float, str]:
+    # Negative power of 0, math.pow fails for it
+    if x == 0 and yth_root < 0:
+        return 0, "Division by zero"
+
     if isinstance(yth_root, int) and yth_root % 2 == 1:
         if x < 0:
-            return - pow(-x, 1 / yth_root), ""
+            result, error = power(-x, 1 / yth_root)
+            return -result, error
 
-        return pow(x, 1 / yth_root), ""
+        return power(x, 1 / yth_root)
 
     if x >= 0:
         if yth_root == 2:
             return sqrt(x), ""
 
-        return pow(x, yth_root), ""
+        return power(x, yth_root)
 
     return 0, "Negative number in a root."
 
@@ -329,6 +454,10 @@ def eval_log(x: float, base: float) -> Tuple[float, str]:
     if x <= 0:
         return 0, "Non-positive number in log."
 
+    # math.log fails for these bases
+    if base <= 0 or base == 1:
+        return 0, "Math error"
+
     return log(x, base), ""
 
 def eval_asin(x: float) -> Tuple[float, str]:
@@ -367,22 +496,38 @@ def eval_div(x: float, y: float) -> Tuple[float, str]:
 
     return x / y, ""
 
+def eval_mod(x: Union[int, float], y: Union[int, float]) -> Tuple[int, str]:
+    if y == 0:
+        return 0, "Right operand of mod is 0."
+
+    if not isinstance(x, int) or not isinstance(y, int):
+        return 0, "Modulus with non-integer arguments"
+
+    return x % y, ""
+
 def eval_pow(x: Union[int, float], y: Union[int, float]) -> Tuple[float, str]:
     if x == 0 and y == 0:
         return 0, "Undefined"
 
     if isinstance(y, int):
         if y >= 0:
-            return pow(x, y), ""
+            return power(x, y)
         if x == 0:
             return 0, "Division by zero"
         
-        return pow(x, y), ""
+        return power(x, y)
 
     if x <= 0:
         return 0, "non_integer power of negative number"
 
-    return pow(x, y), ""
+    return power(x, y)
+
+def eval_mul(x: Union[int, float], y: Union[int, float]) -> Tuple[Union[int, float], str]:
+    # The product of integers has at most as many bits as both of them together
+    if type(x) is int and type(y) is int and x.bit_length() + y.bit_length() > MAX_INTEGER_BITS:
+        return 0, TOO_LARGE
+
+    return x * y, ""
 
 UNARY_FUNCTIONS = {"sroot" : eval_sroot,
                    "ln" : ln,
@@ -394,85 +539,591 @@ UNARY_FUNCTIONS = {"sroot" : eval_sroot,
                    "arccos" : eval_acos,
                    "arctan" : eval_atan}
 
-def eval_unary_function(root: Ast_node) -> Tuple[Union[int, float], str]:
-    x, error = evaluate_ast(root.children[0])
-
-    if error != "":
-        return x, error
-
-    return UNARY_FUNCTIONS[root.token.value](x)
-
-BINARY_FUNCTIONS = {"log_base" : eval_log,
+BINARY_FUNCTIONS = {"*" : eval_mul,
+                    "mod" : eval_mod,
+                    "log_base" : eval_log,
                     "yth_root" : root,
                     "/" : eval_div,
                     "^" : eval_pow}
 
-def eval_binary_function(root: Ast_node) -> Tuple[Union[int, float], str]:
-    x, error = evaluate_ast(root.children[0])
+# Operators that can not fail, so they are applied directly without the (result, error) convention.
+# Sum of integers has at most one bit more than the larger of them, so it is not checked against MAX_INTEGER_BITS.
+ARITHMETIC_OPERATORS: Dict[str, Callable[[Union[int, float], Union[int, float]], Union[int, float]]] = {"+" : add,
+                                                                                                      "-" : sub}
 
-    if error != "":
-        return x, error
+def eval_node(node: Ast_node, values: List[Union[int, float]]) -> Tuple[Union[int, float], str]:
+    """
+    Applies the function of inner <node> to the values of its children, which are popped from the top of <values>.
+    """
+    if len(node.children) == 1:
+        return UNARY_FUNCTIONS[node.token.value](values.pop())
 
-    y, error = evaluate_ast(root.children[1])
+    y = values.pop()
+    x = values.pop()
 
-    if error != "":
-        return y, error
+    if node.token.value in ARITHMETIC_OPERATORS:
+        return ARITHMETIC_OPERATORS[node.token.value](x, y), ""
+
+    return BINARY_FUNCTIONS[node.token.value](x, y)
+
+def evaluate_ast(root: Ast_node, variables: Optional[Dict[str, Union[int, float]]] = None) -> Tuple[Union[int, float], str]:
+    """
+    Evaluates expression represented by AST with root node equal to <root> and
+    tries to return int if possible or if not then returns float. And the second
+    coordinate of the tuple is the error that occured or empty string if no error.
+    Values of variables are taken from <variables>.
+
+    Nodes are evaluated in post-order using an explicit stack, so deep trees do not reach the recursion limit.
+    Every error is propagated to the root unchanged, so the evaluation stops at the first one.
+    """
+    values: List[Union[int, float]] = []
+    stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+    while stack:
+        node, children_evaluated = stack.pop()
+
+        if node.number is not None:
+            values.append(node.number)
+            continue
 
-    if root.token.value == "mod":
-        if y == 0:
-            return 0, "Right operand of mod is 0."
+        if node.decimal_number is not None:
+            values.append(node.decimal_number)
+            continue
 
-        if not isinstance(x, int) or not isinstance(y, int):
-            return 0, "Modulus with non-integer arguments"
+        if node.token.type == Type.VARIABLE:
+            values.append(variables[node.token.value])
+            continue
 
-        return x % y, ""
+        if not children_evaluated:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+            continue
 
-    if root.token.value == "+":
-        return x + y, ""
+        result, error = eval_node(node, values)
 
-    if root.token.value == "-":
-        return x - y, ""
+        if error != "":
+            return result, error
 
-    if root.token.value == "*":
-        return x * y, ""
+        values.append(result)
 
-    return BINARY_FUNCTIONS[root.token.value](x, y)
+    return values[0], ""
 
-def evaluate_ast(root: Ast_node) -> Tuple[Union[int, float], str]:
+def constant_node(value: Union[int, float]) -> Ast_node:
     """
-    Evaluates expression represented by AST with root node equal to <root> and
-    tries to return int if possible or if not then returns float. And the second
-    coordinate of the tuple is the error that occured or empty string if no error.
+    Returns a leaf node with the number <value> (for example result of a folded subtree).
+    """
+    node = Ast_node(Token("0", Type.NUMBER))
+    node.token = Token(str(value).replace(".", ","), Type.NUMBER)
+
+    if isinstance(value, int):
+        node.number = value
+    else:
+        node.number, node.decimal_number = None, value
+
+    return node
+
+def constant_value(node: Ast_node) -> Optional[Union[int, float]]:
+    return node.number if node.number is not None else node.decimal_number
+
+def is_integer(node: Ast_node, value: int) -> bool:
+    """
+    Returns True if <node> is the integer constant <value> (not a decimal number, which would change the type of the result).
+    """
+    return node.number is not None and node.number == value
+
+def simplify_node(node: Ast_node) -> Ast_node:
+    """
+    Applies identities x * 1 = x, x + 0 = x, x - 0 = x and 0 - (0 - x) = x to <node> and returns the simplified node.
+    """
+    if len(node.children) != 2:
+        return node
+
+    left, right = node.children
+    operator = node.token.value
+
+    if operator == "*":
+        if is_integer(right, 1):
+            return left
+
+        if is_integer(left, 1):
+            return right
+
+    if operator == "+":
+        if is_integer(right, 0):
+            return left
+
+        if is_integer(left, 0):
+            return right
+
+    if operator == "-":
+        if is_integer(right, 0):
+            return left
+
+        # Double negation made of two leading minuses
+        if is_integer(left, 0) and right.token.value == "-" and is_integer(right.children[0], 0):
+            return right.children[1]
+
+    return node
+
+def optimize_ast(root: Ast_node) -> Ast_node:
+    """
+    Returns AST equivalent to the one with root node equal to <root>, in which constant subtrees (e.g. pi / 2 or 2 ^ 10)
+    are replaced by their values and identities from simplify_node are applied. The original tree is not modified.
+
+    Subtrees whose evaluation ends with an error (or an exception) are kept, so the optimized tree gives
+    exactly the same errors when it is evaluated. The identities can only change the sign of a zero result.
+    """
+    optimized: List[Ast_node] = []
+    stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+    while stack:
+        node, children_optimized = stack.pop()
+
+        if not node.children:
+            optimized.append(node)
+            continue
+
+        if not children_optimized:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+            continue
+
+        new_node = Ast_node(node.token)
+        new_node.children = optimized[len(optimized) - len(node.children):]
+        del optimized[len(optimized) - len(node.children):]
+
+        values = [constant_value(child) for child in new_node.children]
+
+        if all(value is not None for value in values):
+            try:
+                result, error = eval_node(new_node, values)
+            except (ArithmeticError, ValueError):
+                error = "exception"
+
+            if error == "":
+                optimized.append(constant_node(result))
+                continue
+
+        optimized.append(simplify_node(new_node))
+
+    return optimized[0]
+
+class NodeFactory():
+    """
+    Creates Ast_nodes so that structurally equal subtrees are one shared object (hash-consing),
+    which turns a tree with repeated subtrees into a DAG (evaluated by NodeTable).
     """
-    if root.number is not None:
-        return root.number, ""
+    def __init__(self) -> None:
+        # Children in the key are already shared, so their identity means structural equality.
+        self.nodes: Dict[Tuple[object, ...], Ast_node] = {}
+        self.reused_inner_nodes = 0
+
+    def node(self, original: Ast_node, children: List[Ast_node]) -> Ast_node:
+        """
+        Returns the shared node with the token of <original> and shared <children>.
+        """
+        key = (original.token.type, original.token.value, *children)
+        shared = self.nodes.get(key)
+
+        if shared is not None:
+            self.reused_inner_nodes += len(children) > 0
+            return shared
+
+        if children:
+            shared = Ast_node(original.token)
+            shared.children = children
+        else:
+            shared = original
+
+        self.nodes[key] = shared
+        return shared
 
-    if root.decimal_number is not None:
-        return root.decimal_number, ""
+    def share(self, root: Ast_node) -> Ast_node:
+        """
+        Returns DAG equivalent to AST with root node equal to <root>, in which equal subtrees are shared.
+        The original tree is not modified.
+        """
+        shared: List[Ast_node] = []
+        stack: List[Tuple[Ast_node, bool]] = [(root, False)]
 
-    if len(root.children) == 1:
-        return eval_unary_function(root)
+        while stack:
+            node, children_shared = stack.pop()
 
-    return eval_binary_function(root)
+            if not children_shared and node.children:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            children = shared[len(shared) - len(node.children):]
+            del shared[len(shared) - len(node.children):]
+            shared.append(self.node(node, children))
+
+        return shared[0]
+
+# Opcodes of NodeTable. Constants and variables are followed by the functions, arithmetic operators first,
+# so the kind of a node is given by the range its opcode falls into.
+CONSTANT_OPCODE = 0
+VARIABLE_OPCODE = 1
+OPCODE_NAMES: List[str] = ["constant", "variable", *ARITHMETIC_OPERATORS, *UNARY_FUNCTIONS, *BINARY_FUNCTIONS]
+OPCODES: Dict[str, int] = {name : opcode for opcode, name in enumerate(OPCODE_NAMES)}
+FIRST_UNARY_OPCODE = OPCODES[next(iter(UNARY_FUNCTIONS))]
+FIRST_BINARY_OPCODE = OPCODES[next(iter(BINARY_FUNCTIONS))]
+OPCODE_FUNCTIONS: List[Optional[Callable[..., object]]] = [None, None, *ARITHMETIC_OPERATORS.values(),
+                                                           *UNARY_FUNCTIONS.values(), *BINARY_FUNCTIONS.values()]
+
+class NodeTable():
+    """
+    Compact struct-of-arrays form of an AST (or of a DAG created by NodeFactory, shared nodes are stored once).
+    Node i has opcode opcodes[i] and operands left[i] and right[i], which are indices of its children,
+    or for a constant and a variable index of its value and name in the pool constants.
+    The nodes are ordered so that children come before their parents and the last one is the root,
+    so the table is evaluated by one pass over the arrays, which computes every node once.
+    """
+    __slots__ = ("opcodes", "left", "right", "constants")
+
+    def __init__(self, root: Ast_node) -> None:
+        self.opcodes = array("B")
+        self.left = array("l")
+        self.right = array("l")
+        self.constants: List[Union[int, float, str]] = []
+
+        indices: Dict[int, int] = {}
+        pool: Dict[Tuple[type, Union[int, float, str]], int] = {}
+        stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+        while stack:
+            node, children_added = stack.pop()
+
+            if id(node) in indices:
+                continue
+
+            if not children_added and node.children:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            indices[id(node)] = len(self.opcodes)
+
+            if node.children:
+                self.opcodes.append(OPCODES[node.token.value])
+                self.left.append(indices[id(node.children[0])])
+                self.right.append(indices[id(node.children[-1])])
+                continue
 
-def evaluation(expression: str) -> str:
+            if node.token.type == Type.VARIABLE:
+                self.opcodes.append(VARIABLE_OPCODE)
+                value: Union[int, float, str] = node.token.value
+            else:
+                self.opcodes.append(CONSTANT_OPCODE)
+                value = constant_value(node)
+
+            # 1 and 1.0 are equal, but they are different constants
+            key = (type(value), value)
+
+            if key not in pool:
+                pool[key] = len(self.constants)
+                self.constants.append(value)
+
+            self.left.append(pool[key])
+            self.right.append(0)
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def size(self) -> int:
+        """
+        Returns number of bytes held by the table.
+        """
+        return getsizeof(self) + sum(getsizeof(array) for array in (self.opcodes, self.left, self.right, self.constants)) \
+            + sum(getsizeof(constant) for constant in self.constants)
+
+    def __call__(self, variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        constants = self.constants
+        functions = OPCODE_FUNCTIONS
+        values: List[Union[int, float]] = []
+        append = values.append
+
+        for opcode, left, right in zip(self.opcodes, self.left, self.right):
+            if opcode == CONSTANT_OPCODE:
+                append(constants[left])
+            elif opcode == VARIABLE_OPCODE:
+                append(variables[constants[left]])
+            elif opcode < FIRST_UNARY_OPCODE:
+                append(functions[opcode](values[left], values[right]))
+            else:
+                if opcode < FIRST_BINARY_OPCODE:
+                    result, error = functions[opcode](values[left])
+                else:
+                    result, error = functions[opcode](values[left], values[right])
+
+                if error != "":
+                    return result, error
+
+                append(result)
+
+        return values[-1], ""
+
+def result_value(result: str) -> Optional[Union[int, float]]:
+    """
+    Returns the number written in <result> returned by evaluation or None if the result is an error.
+    """
+    try:
+        return int(result)
+    except ValueError:
+        pass
+
+    try:
+        return float(result.replace(",", "."))
+    except ValueError:
+        return None
+
+def normalize_expression(expression: str) -> str:
+    """
+    Returns <expression> without leading, trailing and repeated spaces. Spaces only separate tokens,
+    so the normalized expression is evaluated the same way.
+    """
+    return " ".join(part for part in expression.split(" ") if part != "")
+
+def evaluation(expression: str, variables: Optional[Dict[str, Union[int, float]]] = None) -> str:
     """
     Evaluates a given math expression and returns the result, if it is not a valid expression returns string
-    containing the error.
+    containing the error. Names from <variables> can be used in the expression and have the given values.
+
+    Compiled expressions and results of pure expressions are kept in EVALUATION_CACHE,
+    so evaluating the same expression again does not parse it again.
     """
-    if expression == "":
-        return "0"
+    variables = variables or {}
+    key = (normalize_expression(expression), frozenset(variables))
+    compiled = EVALUATION_CACHE.get(key)
 
-    tokenized = tokenize_expr(expression)
+    if compiled is None:
+        compiled = compile_expression(key[0], key[1])
+        EVALUATION_CACHE.put(key, compiled, compiled.approximate_size())
 
-    if tokenized is None or not correct_tokenized_expression(tokenized):
-        return "invalid expression"
+    if compiled.evaluator is None and expression != key[0]:
+        # Positions of errors are of the normalized expression, the user needs them in what they wrote
+        return compile_expression(expression, key[1]).error
 
-    ast_root, _ = build_ast(tokenized, 0, Prec.MIN)
+    if not compiled.pure:
+        return compiled(**variables)
 
-    result, error = evaluate_ast(ast_root)
+    if compiled.result is None:
+        compiled.result = compiled()
 
-    if error != "":
-        return error
+    return compiled.result
+
+
+# Compiled node, takes values of variables.
+Evaluator = Callable[[Dict[str, Union[int, float]]], Tuple[Union[int, float], str]]
+
+def compile_constant(value: Union[int, float]) -> Evaluator:
+    result = (value, "")
+
+    def node(variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        return result
+
+    return node
+
+def compile_variable(name: str) -> Evaluator:
+    def node(variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        return variables[name], ""
+
+    return node
+
+def compile_unary(function: Callable[[Union[int, float]], Tuple[Union[int, float], str]],
+                  argument: Evaluator) -> Evaluator:
+    def node(variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        x, error = argument(variables)
+
+        if error != "":
+            return x, error
+
+        return function(x)
+
+    return node
+
+def compile_arithmetic(operation: Callable[[Union[int, float], Union[int, float]], Union[int, float]],
+                       left: Evaluator, right: Evaluator) -> Evaluator:
+    def node(variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        x, error = left(variables)
+
+        if error != "":
+            return x, error
+
+        y, error = right(variables)
+
+        if error != "":
+            return y, error
+
+        return operation(x, y), ""
+
+    return node
+
+def compile_binary(function: Callable[[Union[int, float], Union[int, float]], Tuple[Union[int, float], str]],
+                   left: Evaluator, right: Evaluator) -> Evaluator:
+    def node(variables: Dict[str, Union[int, float]]) -> Tuple[Union[int, float], str]:
+        x, error = left(variables)
+
+        if error != "":
+            return x, error
+
+        y, error = right(variables)
+
+        if error != "":
+            return y, error
+
+        return function(x, y)
+
+    return node
+
+def compile_node(node: Ast_node, children: List[Evaluator]) -> Evaluator:
+    if node.number is not None:
+        return compile_constant(node.number)
+
+    if node.decimal_number is not None:
+        return compile_constant(node.decimal_number)
+
+    if node.token.type == Type.VARIABLE:
+        return compile_variable(node.token.value)
+
+    if len(children) == 1:
+        return compile_unary(UNARY_FUNCTIONS[node.token.value], children[0])
+
+    if node.token.value in ARITHMETIC_OPERATORS:
+        return compile_arithmetic(ARITHMETIC_OPERATORS[node.token.value], children[0], children[1])
+
+    return compile_binary(BINARY_FUNCTIONS[node.token.value], children[0], children[1])
+
+# Calling nested closures uses the Python stack, so deeper trees are evaluated by evaluate_ast instead.
+MAX_CLOSURE_DEPTH = 200
+
+def compile_ast(root: Ast_node) -> Evaluator:
+    """
+    Lowers AST with root node equal to <root> to a tree of closures. Every closure already holds
+    the function of its node and its children, so calling the result does no lookups by the token value.
+    The closure returns the same tuple as evaluate_ast would.
+
+    If the tree is deeper than MAX_CLOSURE_DEPTH, returns a function that calls evaluate_ast instead.
+    """
+    compiled: List[Evaluator] = []
+    stack: List[Tuple[Ast_node, bool, int]] = [(root, False, 1)]
+
+    while stack:
+        node, children_compiled, depth = stack.pop()
+
+        if depth > MAX_CLOSURE_DEPTH:
+            return partial(evaluate_ast, root)
+
+        if not children_compiled and node.children:
+            stack.append((node, True, depth))
+            stack.extend((child, False, depth + 1) for child in reversed(node.children))
+            continue
+
+        children = compiled[len(compiled) - len(node.children):]
+        del compiled[len(compiled) - len(node.children):]
+        compiled.append(compile_node(node, children))
+
+    return compiled[0]
+
+class CompiledExpr():
+    """
+    Expression compiled by compile_expression. It can be called any number of times with values
+    of its variables as keyword arguments and every call returns the same string as evaluation would.
+    """
+    def __init__(self, expression: str, evaluator: Optional[Evaluator], error: str = "",
+                 ast_root: Optional[Ast_node] = None, node_count: int = 0, variables: FrozenSet[str] = frozenset()) -> None:
+        self.expression = expression
+        self.evaluator = evaluator
+        self.error = error
+        self.ast_root = ast_root
+        self.node_count = node_count
+
+        # Names of variables used in the expression
+        self.variables = variables
+
+        # Pure expression gives the same result every time, so evaluation can remember it.
+        self.pure = not variables
+        self.result: Optional[str] = None
+
+    def approximate_size(self) -> int:
+        """
+        Returns approximate number of bytes held by this object (used to bound EVALUATION_CACHE).
+        """
+        return getsizeof(self.expression) + COMPILED_EXPR_BYTES + self.node_count * COMPILED_NODE_BYTES
+
+    def evaluate(self, **variables: Union[int, float]) -> Tuple[Union[int, float], str]:
+        """
+        Returns the result and the error (empty string if no error occured) like evaluate_ast.
+        """
+        if self.evaluator is None:
+            return 0, self.error
+
+        for name in self.variables:
+            if name not in variables:
+                return 0, "Missing value of variable " + name
+
+        return self.evaluator(variables)
+
+    def __call__(self, **variables: Union[int, float]) -> str:
+        result, error = self.evaluate(**variables)
+
+        if error != "":
+            return error
+
+        try:
+            return str(result).replace(".", ",")
+        except ValueError:
+            # Integer has more digits than Python converts to a string (sys.get_int_max_str_digits)
+            return TOO_LARGE
+
+def compile_expression(expression: str, variables: Collection[str] = ()) -> CompiledExpr:
+    """
+    Tokenizes, checks, parses and optimizes <expression> only once and returns CompiledExpr, which can be then
+    evaluated many times without repeating this work, e.g. for different values of <variables>.
+    Invalid expression is compiled as well, calling it returns "invalid expression" with the position where it went wrong.
+    """
+    lexemes = lex_expr(expression, variables)
+
+    if lexemes == []:
+        return CompiledExpr(expression, compile_constant(0))
+
+    if lexemes is None:
+        return CompiledExpr(expression, None, invalid_at(expression, lexing_error_position(expression, variables)))
+
+    ast_root, error = parse_expr(expression, lexemes)
+
+    if ast_root is None:
+        return CompiledExpr(expression, None, error)
+
+    used_variables = frozenset(expression[start : end] for token_type, start, end in lexemes if token_type == Type.VARIABLE)
+    factory = NodeFactory()
+    ast_root = factory.share(optimize_ast(ast_root))
+
+    # Closures are faster, unless some subtrees are repeated and NodeTable computes them only once.
+    evaluator = NodeTable(ast_root) if factory.reused_inner_nodes else compile_ast(ast_root)
+
+    return CompiledExpr(expression, evaluator, ast_root=ast_root, node_count=len(lexemes), variables=used_variables)
+
+# Approximate sizes in bytes of a CompiledExpr and of one AST node together with its token and closure.
+COMPILED_EXPR_BYTES = 400
+COMPILED_NODE_BYTES = 480
+
+EVALUATION_CACHE = LRUCache()
+
+def configure_cache(max_entries: int, max_bytes: int) -> None:
+    """
+    Sets limits of EVALUATION_CACHE, zero <max_entries> turns caching off.
+    """
+    EVALUATION_CACHE.resize(max_entries, max_bytes)
+
+def configure_number_limit(max_integer_bits: int) -> None:
+    """
+    Sets MAX_INTEGER_BITS, products of integers with more bits end with TOO_LARGE error. Cached results
+    were computed with the old limit, so the cache is cleared.
+    """
+    global MAX_INTEGER_BITS
+    MAX_INTEGER_BITS = max_integer_bits
+    EVALUATION_CACHE.clear()
 
-    return str(result).replace(".", ",")
+def cache_stats() -> Dict[str, int]:
+    return EVALUATION_CACHE.stats()
@@ -1,5 +1,10 @@
-from typing import Dict
+import os
+import queue
+import threading
+from typing import Callable, Dict, Optional, Tuple
 
+from PyQt5.QtCore import Qt, QTimer, QRect, pyqtSignal
+from PyQt5.QtGui import QTextCursor, QIntValidator, QPainter
 from PyQt5.QtWidgets import (QMainWindow,
                              QStatusBar, 
                              QTabWidget, 
@@ -8,20 +13,203 @@ from PyQt5.QtWidgets import (QMainWindow,
                              QPushButton,
                              QTextEdit,
                              QVBoxLayout,
+                             QHBoxLayout,
+                             QLineEdit,
+                             QAbstractScrollArea,
                              QFileDialog,
                              QMessageBox)
 
 from notes_gui import Ui_MainWindow as Notes_window
+from notes_io import MappedNotes, read_chunks, save_text
+
+# Chunks the reader may read before the window inserts them, so a big file is not read into memory faster
+# than it is shown
+CHUNKS_AHEAD = 4
+
+# Items of the queue of a reader are (text, bytes read, size of the file, "") and (None, 0, 0, error) at the end
+# (the error is empty if the whole file was read)
+Chunk = Tuple[Optional[str], int, int, str]
+
+# Milliseconds between updates of lines of large files while they are indexed
+INDEXING_INTERVAL = 100
+# Pixels around line numbers of large files and the most characters of a line drawn
+# (a whole line of a log may have megabytes)
+LINE_NUMBER_MARGIN = 4
+DRAWN_CHARACTERS = 1000
+
+class MappedNotesView(QAbstractScrollArea):
+    """
+    Lines of large file <notes> with their numbers. Only the visible lines are read and drawn, item views of Qt would
+    keep data for every line (a table view keeps a header section for each of them), so the memory would grow
+    with the file. The scroll bar counts lines, <current_line> is highlighted.
+    """
+    def __init__(self, notes: MappedNotes, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self.notes = notes
+        self.current_line: Optional[int] = None
+        # Width of the widest line drawn so far, for the horizontal scroll bar
+        self.widest = 0
+        self.setFocusPolicy(Qt.StrongFocus)
+
+    def visible_lines(self) -> int:
+        return max(self.viewport().height() // self.fontMetrics().lineSpacing(), 1)
+
+    def update_lines(self) -> None:
+        """
+        Updates the scroll bar to the number of lines indexed so far.
+        """
+        self.verticalScrollBar().setRange(0, max(self.notes.line_count - self.visible_lines(), 0))
+        self.verticalScrollBar().setPageStep(self.visible_lines())
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_lines()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        metrics = self.fontMetrics()
+        height = metrics.lineSpacing()
+        first = self.verticalScrollBar().value()
+        count = max(min(self.visible_lines() + 1, self.notes.line_count - first), 0)
+        gutter = metrics.horizontalAdvance(str(max(self.notes.line_count, 1))) + 2 * LINE_NUMBER_MARGIN
+        x = gutter - self.horizontalScrollBar().value()
+
+        painter.fillRect(0, 0, gutter - LINE_NUMBER_MARGIN, self.viewport().height(), self.palette().window())
+
+        for row in range(count):
+            number, y = first + row, row * height
+            painter.setPen(self.palette().text().color())
+            painter.drawText(QRect(0, y, gutter - 2 * LINE_NUMBER_MARGIN, height), Qt.AlignRight | Qt.AlignVCenter, str(number + 1))
+
+            if number == self.current_line:
+                painter.fillRect(gutter - LINE_NUMBER_MARGIN, y, self.viewport().width(), height, self.palette().highlight())
+                painter.setPen(self.palette().highlightedText().color())
+
+            painter.save()
+            painter.setClipRect(gutter, y, self.viewport().width() - gutter, height)
+            text = self.notes.line(number)[:DRAWN_CHARACTERS]
+            painter.drawText(x, y + metrics.ascent(), text)
+            painter.restore()
+
+            self.widest = max(self.widest, metrics.horizontalAdvance(text))
+
+        painter.end()
+        self.horizontalScrollBar().setRange(0, max(gutter + self.widest - self.viewport().width(), 0))
+        self.horizontalScrollBar().setPageStep(self.viewport().width())
+
+    def show_line(self, number: int) -> None:
+        """
+        Highlights line <number> and scrolls to it, if it is not visible.
+        """
+        self.update_lines()
+        number = min(max(number, 0), self.notes.line_count - 1)
+
+        if number < 0:
+            return
+
+        self.current_line = number
+        first = self.verticalScrollBar().value()
+
+        if not first <= number < first + self.visible_lines():
+            self.verticalScrollBar().setValue(number - self.visible_lines() // 2)
+
+        self.viewport().update()
+
+    def mousePressEvent(self, event):
+        number = self.verticalScrollBar().value() + event.y() // self.fontMetrics().lineSpacing()
+
+        if number < self.notes.line_count:
+            self.current_line = number
+            self.viewport().update()
+
+    def keyPressEvent(self, event):
+        steps = {Qt.Key_Up: -1, Qt.Key_Down: 1, Qt.Key_PageUp: -self.visible_lines(), Qt.Key_PageDown: self.visible_lines()}
+
+        if event.key() in steps:
+            current_line = self.verticalScrollBar().value() if self.current_line is None else self.current_line
+            self.show_line(current_line + steps[event.key()])
+        elif event.key() == Qt.Key_Home and event.modifiers() & Qt.ControlModifier:
+            self.show_line(0)
+        elif event.key() == Qt.Key_End and event.modifiers() & Qt.ControlModifier:
+            self.show_line(self.notes.line_count - 1)
+        else:
+            super().keyPressEvent(event)
+
+class MappedNotesTab(QWidget):
+    """
+    Read-only tab of large file <notes> with jumping to a line and searching. It is closed by <close_tab>.
+    """
+    def __init__(self, notes: MappedNotes, close_tab: Callable[[], None]) -> None:
+        super().__init__()
+        self.notes = notes
+
+        button = QPushButton("Close tab", self)
+        button.clicked.connect(close_tab)
+
+        self.line_edit = QLineEdit(self)
+        self.line_edit.setPlaceholderText("Go to line")
+        self.line_edit.setValidator(QIntValidator(1, 2 ** 31 - 1, self))
+        self.line_edit.returnPressed.connect(self.go_to_line)
+
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText("Search (Enter for the next one)")
+        self.search_edit.returnPressed.connect(self.find_next)
+
+        self.view = MappedNotesView(notes, self)
+
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.line_edit)
+        search_layout.addWidget(self.search_edit)
+
+        tab_layout = QVBoxLayout()
+        tab_layout.addWidget(button)
+        tab_layout.addLayout(search_layout)
+        tab_layout.addWidget(self.view)
+        self.setLayout(tab_layout)
+
+    def go_to_line(self) -> None:
+        if self.line_edit.text():
+            self.view.show_line(int(self.line_edit.text()) - 1)
+            self.view.setFocus()
 
-BYTES_TO_READ = 8 * 1024
+    def find_next(self) -> None:
+        """
+        Shows the next line after the highlighted one containing the searched text.
+        """
+        current_line = self.view.current_line
+        number = self.notes.find(self.search_edit.text(), 0 if current_line is None else current_line + 1)
+
+        if number is not None:
+            self.view.show_line(number)
+        elif self.notes.is_indexed():
+            self.window().statusBar().showMessage("Not found", 5000)
+        else:
+            self.window().statusBar().showMessage("Not found in the indexed part of the file", 5000)
 
 class NotesWindow(QMainWindow):
+    # Path of the file and the error (empty if it was saved)
+    saving_finished = pyqtSignal(str, str)
+
     def __init__(self):
         super().__init__()
         self.ui = Notes_window()
         self.ui.setupUi(self)
 
         self.text_edits_on_tabs: Dict[str, QTextEdit] = {}
+        # Tabs whose files are being read, with the event which stops the reader and the queue of its chunks
+        self.loading: Dict[str, Tuple[threading.Event, 'queue.Queue[Chunk]']] = {}
+        # Inserts one chunk per tab whenever the window has nothing else to do, so it still reacts to the user
+        self.loading_timer = QTimer(self)
+        self.loading_timer.timeout.connect(self.insert_chunks)
+
+        self.saving_finished.connect(self.finish_saving)
+
+        # Read-only tabs of large files
+        self.mapped_tabs: Dict[str, MappedNotesTab] = {}
+        self.indexing_timer = QTimer(self)
+        self.indexing_timer.setInterval(INDEXING_INTERVAL)
+        self.indexing_timer.timeout.connect(self.update_indexing)
 
         self.ui.tabWidget.setTabPosition(QTabWidget.South)
         self.tab_count = 0
@@ -34,6 +222,12 @@ class NotesWindow(QMainWindow):
         the user does not want to save anything.
         """
         if self.close_all_without_saving_dial():
+            for name in list(self.loading):
+                self.stop_loading(name)
+
+            for tab in self.mapped_tabs.values():
+                tab.notes.close()
+
             event.accept()
         else:
             event.ignore()
@@ -53,6 +247,11 @@ class NotesWindow(QMainWindow):
         open_action.triggered.connect(self.open_notes)
         file_menu.addAction(open_action)
 
+        open_large_action = QAction("Open large file (read-only)", self)
+        open_large_action.setShortcut("Ctrl+Shift+O")
+        open_large_action.triggered.connect(self.open_large_notes)
+        file_menu.addAction(open_large_action)
+
         save_action = QAction('Save notes', self)
         save_action.setShortcut("Ctrl+S")
         save_action.triggered.connect(self.save_notes)
@@ -84,36 +283,188 @@ class NotesWindow(QMainWindow):
 
     def open_notes(self):
         """
-        Asks which text file the user wants to open and creates new tab with its contents (But no more than <BYTES_TO_READ> bytes).
+        Asks which text file the user wants to open and creates new tab with its contents. The file is read by
+        a background thread and its chunks are added to the tab as they come, so even big files do not block the window.
         """
         options = QFileDialog.Options()
         file_name, _ = QFileDialog.getOpenFileName(self, "Open File", "", "Text Files (*.txt)", options=options)
 
         if file_name and file_name.endswith(".txt"):
-            with open(file_name, 'r') as file:
-                text = file.read(BYTES_TO_READ)
-                self.add_new()
-                name = "Notes " + str(self.tab_count)
-                self.text_edits_on_tabs[name].setPlainText(text)
+            self.load_notes(file_name)
+
+    def load_notes(self, file_name: str) -> None:
+        """
+        Creates new tab and starts reading <file_name> into it. The tab is read-only until the file is read.
+        """
+        self.add_new()
+        name = "Notes " + str(self.tab_count)
+        text_edit = self.text_edits_on_tabs[name]
+        text_edit.setReadOnly(True)
+        # Undoing the loading chunk by chunk makes no sense and would keep a copy of the whole file
+        text_edit.setUndoRedoEnabled(False)
+
+        stop, chunks = threading.Event(), queue.Queue(CHUNKS_AHEAD)
+        self.loading[name] = (stop, chunks)
+        self.statusBar().showMessage("Loading " + os.path.basename(file_name) + "...")
+
+        threading.Thread(target=self.read_file, args=(file_name, stop, chunks), daemon=True).start()
+        self.loading_timer.start()
+
+    def read_file(self, file_name: str, stop: threading.Event, chunks: 'queue.Queue[Chunk]') -> None:
+        """
+        Runs in the thread of the reader, puts chunks of <file_name> to <chunks> until it is read or <stop> is set.
+        """
+        try:
+            for text, done, total in read_chunks(file_name):
+                if stop.is_set():
+                    return
+
+                chunks.put((text, done, total, ""))
+        except OSError as e:
+            chunks.put((None, 0, 0, str(e)))
+        else:
+            chunks.put((None, 0, 0, ""))
+
+    def insert_chunks(self) -> None:
+        """
+        Adds the next read chunk of every loading tab to its text.
+        """
+        for name, (_, chunks) in list(self.loading.items()):
+            try:
+                text, done, total, error = chunks.get_nowait()
+            except queue.Empty:
+                continue
+
+            if text is None:
+                self.finish_loading(name, error)
+            else:
+                cursor = QTextCursor(self.text_edits_on_tabs[name].document())
+                cursor.movePosition(QTextCursor.End)
+                cursor.insertText(text)
+
+                self.statusBar().showMessage(f"Loading {name}: {done * 100 // total}%")
+
+        if not self.loading:
+            self.loading_timer.stop()
+
+    def finish_loading(self, name: str, error: str) -> None:
+        self.loading.pop(name)
+        text_edit = self.text_edits_on_tabs[name]
+        text_edit.setReadOnly(False)
+        text_edit.setUndoRedoEnabled(True)
+
+        if error:
+            self.statusBar().showMessage("Loading " + name + " failed")
+            QMessageBox.warning(self, "Open File", "The file could not be read completely:\n" + error)
+        else:
+            self.statusBar().showMessage("Loaded " + name, 5000)
+
+    def open_large_notes(self):
+        """
+        Asks which file the user wants to view and opens it in a read-only tab, which keeps the file mapped to memory
+        instead of loading it, so even files of hundreds of MB open at once.
+        """
+        file_name, _ = QFileDialog.getOpenFileName(self, "Open Large File", "", "Text Files (*.txt);;All Files (*)")
+
+        if file_name:
+            self.view_large_notes(file_name)
+
+    def view_large_notes(self, file_name: str) -> None:
+        try:
+            notes = MappedNotes(file_name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Open Large File", "The file could not be opened:\n" + str(e))
+            return
+
+        self.tab_count += 1
+        name = "Notes " + str(self.tab_count)
+        tab = MappedNotesTab(notes, self.close_tab)
+        self.ui.tabWidget.addTab(tab, name)
+        self.ui.tabWidget.setCurrentWidget(tab)
+
+        self.mapped_tabs[name] = tab
+        self.indexing_timer.start()
+        self.update_indexing()
+
+    def update_indexing(self) -> None:
+        """
+        Shows lines of large files indexed so far.
+        """
+        indexing = False
+
+        for name, tab in self.mapped_tabs.items():
+            tab.view.update_lines()
+
+            if not tab.notes.is_indexed():
+                indexing = True
+                self.statusBar().showMessage(f"Indexing {name}: {tab.notes.indexed_bytes * 100 // tab.notes.size}%")
+
+        if not indexing:
+            self.indexing_timer.stop()
+            current_tab = self.ui.tabWidget.currentWidget()
+
+            if isinstance(current_tab, MappedNotesTab):
+                self.statusBar().showMessage(f"{current_tab.notes.line_count} lines indexed", 5000)
+
+    def stop_loading(self, name: str) -> None:
+        stop, chunks = self.loading.pop(name)
+        stop.set()
+
+        # The reader may be waiting for a free place in the full queue
+        while not chunks.empty():
+            chunks.get_nowait()
+
+        if not self.loading:
+            self.loading_timer.stop()
 
     def save_notes(self):
         """
-        Asks a user where they want to save it and saves the current tab to a text file.
+        Asks a user where they want to save it and saves the current tab to a text file. The file is written by
+        a background thread and replaced only when all of it is written.
         """
         if self.ui.tabWidget.count() == 0:
             return
 
+        name = self.ui.tabWidget.tabText(self.ui.tabWidget.currentIndex())
+
+        if name in self.loading:
+            # Saving now would save only a part of the file
+            QMessageBox.information(self, "Save File", "The tab can be saved when its file is loaded.")
+            return
+
+        if name in self.mapped_tabs:
+            QMessageBox.information(self, "Save File", "Large files are opened read-only, the file is already saved.")
+            return
+
         options = QFileDialog.Options()
         options |= QFileDialog.AcceptSave
 
         file_name, _ = QFileDialog.getSaveFileName(self, "Save File", "", "Text Files (*.txt);;All Files (*)", options=options)
 
         if file_name:
-            with open(file_name, 'w') as file:
-                index = self.ui.tabWidget.currentIndex()
-                text_edit: QTextEdit = self.text_edits_on_tabs[self.ui.tabWidget.tabText(index)]
-                text = text_edit.toPlainText()
-                file.write(text)
+            text = self.text_edits_on_tabs[name].toPlainText()
+            self.statusBar().showMessage("Saving " + os.path.basename(file_name) + "...")
+
+            threading.Thread(target=self.write_file, args=(file_name, text), daemon=True).start()
+
+    def write_file(self, file_name: str, text: str) -> None:
+        """
+        Runs in a background thread, saves <text> to <file_name>.
+        """
+        try:
+            save_text(file_name, [text])
+        except (OSError, ValueError) as e:
+            # ValueError when the text can not be encoded (e.g. a lone surrogate)
+            self.saving_finished.emit(file_name, str(e))
+        else:
+            self.saving_finished.emit(file_name, "")
+
+    def finish_saving(self, file_name: str, error: str) -> None:
+        if error:
+            self.statusBar().showMessage("Saving " + os.path.basename(file_name) + " failed")
+            QMessageBox.warning(self, "Save File", "The notes could not be saved, the file was not changed:\n" + error)
+        else:
+            self.statusBar().showMessage("Saved to " + file_name, 5000)
 
     def close_without_saving_dial(self):
         """
@@ -144,10 +495,21 @@ Do you really want to close the window without saving?",
         Closes tab, but calls close_without_saving_dial
         """
         current_tab = self.ui.tabWidget.currentIndex()
+        name = self.ui.tabWidget.tabText(current_tab)
+
+        if name in self.mapped_tabs:
+            # Read-only, there is nothing to save
+            tab = self.mapped_tabs.pop(name)
+            self.ui.tabWidget.removeTab(current_tab)
+            tab.notes.close()
+            tab.deleteLater()
+            return
 
         self.close_without_saving_dial()
 
-        name = self.ui.tabWidget.tabText(current_tab)
         self.text_edits_on_tabs.pop(name)
 
+        if name in self.loading:
+            self.stop_loading(name)
+
         self.ui.tabWidget.removeTab(current_tab)
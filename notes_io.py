@@ -0,0 +1,209 @@
+import codecs
+import io
+import mmap
+import os
+import stat
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from uuid import uuid4
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# Bytes read at once when notes are loaded, every chunk is inserted into the document separately,
+# so the window stays responsive between them
+READ_CHUNK_SIZE = 64 * 1024
+
+# Start of every LINE_STEP-th line is kept in the index of a mapped file, lines between them are found when they are
+# read, so the index of 10 million lines takes 320 KB
+LINE_STEP = 256
+# Bytes of a mapped file indexed at once and the most blocks of LINE_STEP lines kept decoded
+INDEX_CHUNK_SIZE = 1024 * 1024
+CACHED_BLOCKS = 16
+
+def read_chunks(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[str, int, int]]:
+    """
+    Yields the text of UTF-8 file <path> in chunks with the number of bytes read so far and the size of the file.
+    Line ends are converted to "\\n" (also "\\r\\n" split between chunks) and invalid bytes are replaced.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(errors="replace"), translate=True)
+
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        done = 0
+
+        while True:
+            data = file.read(chunk_size)
+            done += len(data)
+            text = decoder.decode(data, final=not data)
+
+            if text:
+                yield text, done, max(size, done)
+
+            if not data:
+                return
+
+def save_text(path: str, chunks: Iterable[str]) -> None:
+    """
+    Writes <chunks> of text to <path> in UTF-8 with the line ends of the system. They are written to a temporary file
+    in the same directory first, which then replaces <path>, so the file is never left half written (e.g. when the disk
+    is full). The file keeps its permissions.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    temporary_path = os.path.join(directory, "." + name + "." + uuid4().hex + ".tmp")
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+
+    try:
+        with open(descriptor, "w", encoding="utf-8") as file:
+            if os.path.exists(path):
+                os.chmod(temporary_path, stat.S_IMODE(os.stat(path).st_mode))
+
+            for chunk in chunks:
+                file.write(chunk)
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+class MappedNotes():
+    """
+    Read-only view of UTF-8 file <path> mapped to memory, only pages of the lines that are read are loaded (and
+    the system can drop them again), so the memory does not grow with the size of the file. A background thread indexes
+    the lines, the ones indexed so far can be read and searched at once.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # Empty files can not be mapped
+        self.buffer: Union[mmap.mmap, bytes] = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+        # Offsets of lines 0, LINE_STEP, 2 * LINE_STEP, ...
+        self.block_offsets = array("q", [0])
+        self.line_count = 0
+        # Offset after the last indexed line
+        self.indexed_bytes = 0
+        self.blocks: 'OrderedDict[int, List[str]]' = OrderedDict()
+
+        self.stop = threading.Event()
+        self.indexer = threading.Thread(target=self.index_lines, daemon=True)
+        self.indexer.start()
+
+    def close(self) -> None:
+        self.stop.set()
+        self.indexer.join()
+
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+        self.file.close()
+
+    def is_indexed(self) -> bool:
+        return self.indexed_bytes == self.size
+
+    def index_lines(self) -> None:
+        """
+        Runs in the thread of the indexer. Offsets of blocks are added before the lines are counted,
+        so every counted line can be read.
+        """
+        position = 0
+
+        while position < self.size and not self.stop.is_set():
+            chunk = self.buffer[position:position + INDEX_CHUNK_SIZE]
+            lengths = list(accumulate(map(len, chunk.split(b"\n")[:-1])))
+
+            if position + len(chunk) == self.size and not chunk.endswith(b"\n"):
+                # The last line without a line end
+                lengths.append(len(chunk) - len(lengths))
+            elif not lengths:
+                # A line longer than the chunk
+                line_end = self.buffer.find(b"\n", position + len(chunk))
+                lengths.append((self.size if line_end == -1 else line_end + 1) - position - 1)
+
+            # Line i of the chunk ends after its i + 1 line ends, lines starting blocks are after the ends of lines
+            # LINE_STEP - 1, 2 * LINE_STEP - 1, ... of the file
+            first = LINE_STEP - 1 - self.line_count % LINE_STEP
+            self.block_offsets.extend(position + lengths[i] + i + 1 for i in range(first, len(lengths), LINE_STEP))
+
+            position = min(position + lengths[-1] + len(lengths), self.size)
+            self.indexed_bytes = position
+            self.line_count += len(lengths)
+
+    def block(self, number: int) -> List[str]:
+        """
+        Returns lines of block <number> without line ends, only complete blocks are kept decoded.
+        """
+        if number in self.blocks:
+            self.blocks.move_to_end(number)
+            return self.blocks[number]
+
+        complete = number + 1 < len(self.block_offsets)
+        end = self.block_offsets[number + 1] if complete else self.indexed_bytes
+        text = self.buffer[self.block_offsets[number]:end].decode("utf-8", errors="replace").replace("\r\n", "\n")
+        lines = text.split("\n")
+
+        if text.endswith("\n"):
+            lines.pop()
+        elif text.endswith("\r"):
+            # "\r" of the last line of the file
+            lines[-1] = lines[-1][:-1]
+
+        # The indexer may have indexed more lines after the offsets were read
+        del lines[LINE_STEP:]
+
+        if complete or self.is_indexed():
+            self.blocks[number] = lines
+
+            if len(self.blocks) > CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+
+        return lines
+
+    def line(self, number: int) -> str:
+        """
+        Returns line <number> (from 0), which must be indexed.
+        """
+        if not 0 <= number < self.line_count:
+            raise IndexError("line is not indexed")
+
+        return self.block(number // LINE_STEP)[number % LINE_STEP]
+
+    def line_offset(self, number: int) -> int:
+        offset = self.block_offsets[number // LINE_STEP]
+
+        for _ in range(number % LINE_STEP):
+            offset = self.buffer.find(b"\n", offset) + 1
+
+        return offset
+
+    def line_at(self, offset: int) -> int:
+        """
+        Returns the number of the line containing byte <offset>, which must be indexed.
+        """
+        block = bisect_right(self.block_offsets, offset) - 1
+
+        return block * LINE_STEP + self.buffer[self.block_offsets[block]:offset].count(b"\n")
+
+    def find(self, text: str, start_line: int = 0) -> Optional[int]:
+        """
+        Returns the number of the first line from <start_line> containing <text>, continuing from the start after
+        the last indexed line, or None if no indexed line contains it. The mapped bytes are searched directly,
+        which takes a fraction of a second even for hundreds of MB.
+        """
+        if not text:
+            return None
+
+        needle = text.encode("utf-8")
+        end = self.indexed_bytes
+        start = self.line_offset(start_line) if start_line < self.line_count else end
+        offset = self.buffer.find(needle, start, end)
+
+        if offset == -1:
+            offset = self.buffer.find(needle, 0, min(start + len(needle) - 1, end))
+
+        return None if offset == -1 else self.line_at(offset)
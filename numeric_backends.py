@@ -0,0 +1,877 @@
+from abc import ABC, abstractmethod
+from decimal import Context, Decimal, DecimalException, Overflow, getcontext, localcontext
+from fractions import Fraction
+from functools import lru_cache
+from math import acos, asin, atan, ceil, cos, e, inf, isinf, log, nextafter, pi, sin, sqrt, tan
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import my_eval
+from my_eval import Ast_node, Type, lex_expr, parse_expr, invalid_at, lexing_error_position, evaluation, TOO_LARGE
+
+# Interval [lower bound, upper bound] containing the exact value
+Interval = Tuple[float, float]
+
+Number = Union[Decimal, Fraction, Interval]
+
+NOT_RATIONAL = "Result is not rational"
+UNBOUNDED = "Interval contains a pole"
+TOO_WIDE = "Interval is too wide"
+MOD_PRECISION_EXCEEDED = "Operand of mod has more digits than the precision"
+
+# Most digits of the integer part of arguments of sin, cos and tan that DecimalBackend reduces modulo 2 pi,
+# the reduction needs that many more digits of pi and its time grows with their square.
+MAX_REDUCTION_DIGITS = 1000
+
+class NumericBackend(ABC):
+    """
+    Arithmetic of one kind of numbers for evaluate_with_backend. Subclasses implement the primitive operations,
+    the checks of domains are shared here and are the same as in my_eval, so every backend gives the same errors
+    and differs only in precision.
+    """
+    @abstractmethod
+    def number(self, literal: str) -> Number:
+        ...
+
+    @abstractmethod
+    def convert(self, value: Union[int, float]) -> Number:
+        ...
+
+    @abstractmethod
+    def constant(self, name: str) -> Tuple[Number, str]:
+        ...
+
+    @abstractmethod
+    def is_integer(self, x: Number) -> bool:
+        ...
+
+    @abstractmethod
+    def arithmetic(self, operator: str, x: Number, y: Number) -> Tuple[Number, str]:
+        ...
+
+    @abstractmethod
+    def power(self, x: Number, y: Number) -> Tuple[Number, str]:
+        ...
+
+    @abstractmethod
+    def function(self, name: str, x: Number) -> Tuple[Number, str]:
+        """
+        Returns <name> (sqrt, ln, sin, cos, tan, asin, acos or atan) of <x>, which is in the domain of the function.
+        """
+        ...
+
+    @abstractmethod
+    def format(self, x: Number) -> str:
+        ...
+
+    def root(self, x: Number, y: Number) -> Tuple[Number, str]:
+        # The same cases as root in my_eval
+        if x == 0 and y < 0:
+            return x, "Division by zero"
+
+        if self.is_integer(y) and abs(y) % 2 == 1:
+            if x < 0:
+                result, error = self.power(-x, 1 / y)
+                return -result, error
+
+            return self.power(x, 1 / y)
+
+        if x >= 0:
+            if y == 2:
+                return self.function("sqrt", x)
+
+            return self.power(x, y)
+
+        return x, "Negative number in a root."
+
+    def unary(self, name: str, x: Number) -> Tuple[Number, str]:
+        if name == "sroot":
+            return self.root(x, self.number("2"))
+
+        if name == "abs":
+            return abs(x), ""
+
+        if name == "ln":
+            return self.function("ln", x) if x > 0 else (x, "Non-positive number in ln.")
+
+        if name in ("arcsin", "arccos"):
+            if x < -1 or x > 1:
+                return x, "a" + name[3:] + " value out of [-1, 1]"
+
+            return self.function("a" + name[3:], x)
+
+        if name == "arctan":
+            pi, error = self.constant("pi")
+
+            if error == "" and (x < -pi / 2 or x > pi / 2):
+                return x, "atan value out of [-pi/2, pi/2]"
+
+            return self.function("atan", x)
+
+        return self.function(name, x)
+
+    def binary(self, name: str, x: Number, y: Number) -> Tuple[Number, str]:
+        if name in ("+", "-", "*"):
+            return self.arithmetic(name, x, y)
+
+        if name == "/":
+            return (x, "Division by zero.") if y == 0 else self.arithmetic("/", x, y)
+
+        if name == "mod":
+            if y == 0:
+                return x, "Right operand of mod is 0."
+
+            if not self.is_integer(x) or not self.is_integer(y):
+                return x, "Modulus with non-integer arguments"
+
+            return self.arithmetic("mod", x, y)
+
+        if name == "^":
+            if x == 0 and y == 0:
+                return x, "Undefined"
+
+            if self.is_integer(y):
+                if y < 0 and x == 0:
+                    return x, "Division by zero"
+            elif x <= 0:
+                return x, "non_integer power of negative number"
+
+            return self.power(x, y)
+
+        if name == "log_base":
+            if x <= 0:
+                return x, "Non-positive number in log."
+
+            # math.log fails for these bases
+            if y <= 0 or y == 1:
+                return x, "Math error"
+
+            return self.logarithm(x, y)
+
+        return self.root(x, y)
+
+    def logarithm(self, x: Number, base: Number) -> Tuple[Number, str]:
+        ln_x, error = self.function("ln", x)
+        ln_base, base_error = self.function("ln", base)
+
+        return (ln_x, error or base_error) if error or base_error else self.arithmetic("/", ln_x, ln_base)
+
+@lru_cache(maxsize=64)
+def decimal_pi(precision: int) -> Decimal:
+    """
+    Returns pi with <precision> digits (the recipe from the documentation of decimal).
+    """
+    with localcontext(Context(prec=precision + 2)):
+        three = Decimal(3)
+        last, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+
+        while s != last:
+            last = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+
+    return Context(prec=precision).plus(s)
+
+class DecimalBackend(NumericBackend):
+    """
+    Decimal numbers with <precision> significant digits. The functions, which the decimal module does not have,
+    are computed by series with a few more digits and rounded to the precision.
+    """
+    def __init__(self, precision: int) -> None:
+        self.context = Context(prec=precision)
+        self.pi = decimal_pi(precision)
+        self.e = self.context.exp(Decimal(1))
+
+    def unary(self, name: str, x: Decimal) -> Tuple[Decimal, str]:
+        # The shared cases use operators of Decimal (e.g. -x and 1 / y in root), which round to the current context
+        with localcontext(self.context):
+            return super().unary(name, x)
+
+    def binary(self, name: str, x: Decimal, y: Decimal) -> Tuple[Decimal, str]:
+        with localcontext(self.context):
+            return super().binary(name, x, y)
+
+    def number(self, literal: str) -> Decimal:
+        return self.context.create_decimal(literal.replace(",", "."))
+
+    def convert(self, value: Union[int, float]) -> Decimal:
+        return self.context.create_decimal(value)
+
+    def constant(self, name: str) -> Tuple[Decimal, str]:
+        return (self.pi if name == "pi" else self.e), ""
+
+    def is_integer(self, x: Decimal) -> bool:
+        return x == x.to_integral_value()
+
+    def arithmetic(self, operator: str, x: Decimal, y: Decimal) -> Tuple[Decimal, str]:
+        context = self.context
+
+        if operator == "+":
+            return context.add(x, y), ""
+        if operator == "-":
+            return context.subtract(x, y), ""
+        if operator == "*":
+            return context.multiply(x, y), ""
+        if operator == "/":
+            return context.divide(x, y), ""
+
+        # Integers with more digits than the precision may be rounded, so their remainder would be just digits of the rounding
+        if max(x.adjusted(), y.adjusted()) >= context.prec:
+            return x, MOD_PRECISION_EXCEEDED
+
+        # Both are integers (see NumericBackend.binary), the remainder has the sign of the divisor, as % of Python integers
+        return context.create_decimal(int(x) % int(y)), ""
+
+    def power(self, x: Decimal, y: Decimal) -> Tuple[Decimal, str]:
+        return self.context.power(x, y), ""
+
+    def function(self, name: str, x: Decimal) -> Tuple[Decimal, str]:
+        if name == "sqrt":
+            return self.context.sqrt(x), ""
+        if name == "ln":
+            return self.context.ln(x), ""
+
+        if name in ("sin", "cos", "tan") and x.adjusted() > MAX_REDUCTION_DIGITS:
+            return x, TOO_LARGE
+
+        with localcontext(self.context) as context:
+            # Guard digits, and digits lost by reducing big arguments modulo 2 pi
+            context.prec += 10 + max(0, x.adjusted())
+
+            if name == "sin":
+                result = self.sin(x, context)
+            elif name == "cos":
+                result = self.sin(x + decimal_pi(context.prec) / 2, context)
+            elif name == "tan":
+                result = self.sin(x, context) / self.sin(x + decimal_pi(context.prec) / 2, context)
+            elif name == "atan":
+                result = self.atan(x)
+            elif name == "asin":
+                result = self.asin(x)
+            else:
+                result = decimal_pi(context.prec) / 2 - self.asin(x)
+
+        return self.context.plus(result), ""
+
+    def logarithm(self, x: Decimal, base: Decimal) -> Tuple[Decimal, str]:
+        # Guard digits, so e.g. 8 log_base 2 is exactly 3
+        with localcontext(self.context) as context:
+            context.prec += 5
+            result = x.ln() / base.ln()
+
+        return self.context.plus(result), ""
+
+    def sin(self, x: Decimal, context: Context) -> Decimal:
+        two_pi = 2 * decimal_pi(context.prec)
+        x = x.remainder_near(two_pi, context)
+
+        with localcontext() as series_context:
+            series_context.prec += 2
+            i, last, s, fact, num, sign = 1, 0, x, 1, x, 1
+
+            while s != last:
+                last = s
+                i += 2
+                fact *= i * (i - 1)
+                num *= x * x
+                sign *= -1
+                s += num / fact * sign
+
+        return +s
+
+    def atan(self, x: Decimal) -> Decimal:
+        # atan x = 2 atan (x / (1 + sqrt (1 + x^2))) makes the argument small, where the series converges fast
+        halvings = 0
+
+        while abs(x) > Decimal("0.1"):
+            x = x / (1 + (1 + x * x).sqrt())
+            halvings += 1
+
+        i, last, s, num = 1, 0, x, x
+
+        while s != last:
+            last = s
+            i += 2
+            num *= -x * x
+            s += num / i
+
+        return s * 2 ** halvings
+
+    def asin(self, x: Decimal) -> Decimal:
+        if abs(x) == 1:
+            return x * decimal_pi(getcontext().prec) / 2
+
+        return self.atan(x / (1 - x * x).sqrt())
+
+    def format(self, x: Decimal) -> str:
+        # Zeros keep the exponent of the computation (e.g. pi - pi is 0E-49)
+        if x.is_zero():
+            x = Decimal(0)
+
+        # Trailing zeros only show the precision (e.g. sin (pi / 2) is 1.000...)
+        mantissa, exponent, power = str(x).partition("E")
+
+        if "." in mantissa:
+            mantissa = mantissa.rstrip("0").rstrip(".")
+
+        return (mantissa + exponent + power).replace(".", ",")
+
+# Functions of rational arguments with rational results, other values of them are irrational.
+RATIONAL_VALUES: Dict[str, Dict[Fraction, Fraction]] = {"ln" : {Fraction(1) : Fraction(0)},
+                                                        "sin" : {Fraction(0) : Fraction(0)},
+                                                        "cos" : {Fraction(0) : Fraction(1)},
+                                                        "tan" : {Fraction(0) : Fraction(0)},
+                                                        "asin" : {Fraction(0) : Fraction(0)},
+                                                        "acos" : {Fraction(1) : Fraction(0)},
+                                                        "atan" : {Fraction(0) : Fraction(0)}}
+
+def fraction_bits(x: Fraction) -> int:
+    return x.numerator.bit_length() + x.denominator.bit_length()
+
+def fraction_log(x: Fraction) -> float:
+    return log(x.numerator) - log(x.denominator)
+
+def integer_root(x: int, n: int) -> Optional[int]:
+    """
+    Returns the non-negative integer r with r ^ <n> == <x>, or None if there is none.
+    """
+    if x < 2:
+        return x
+
+    if n > x.bit_length():
+        return None
+
+    # Newton's method from above, starting with a power of two bigger than the root
+    r = 1 << -(-x.bit_length() // n)
+
+    while True:
+        next_r = ((n - 1) * r + x // r ** (n - 1)) // n
+
+        if next_r >= r:
+            break
+
+        r = next_r
+
+    return r if r ** n == x else None
+
+class FractionBackend(NumericBackend):
+    """
+    Exact rational numbers. Operations with irrational results (e.g. sroot 2, pi, sin 1) end with NOT_RATIONAL error
+    and results with more bits than MAX_INTEGER_BITS of my_eval with TOO_LARGE error.
+    """
+    def number(self, literal: str) -> Fraction:
+        return Fraction(literal.replace(",", "."))
+
+    def convert(self, value: Union[int, float]) -> Fraction:
+        return Fraction(value)
+
+    def constant(self, name: str) -> Tuple[Fraction, str]:
+        return Fraction(0), NOT_RATIONAL
+
+    def is_integer(self, x: Fraction) -> bool:
+        return x.denominator == 1
+
+    def arithmetic(self, operator: str, x: Fraction, y: Fraction) -> Tuple[Fraction, str]:
+        # The result of every operation has at most as many bits as both operands together (and one more for a sum)
+        if fraction_bits(x) + fraction_bits(y) > 2 * my_eval.MAX_INTEGER_BITS:
+            return x, TOO_LARGE
+
+        if operator == "+":
+            return x + y, ""
+        if operator == "-":
+            return x - y, ""
+        if operator == "*":
+            return x * y, ""
+        if operator == "/":
+            return x / y, ""
+
+        return x % y, ""
+
+    def power(self, x: Fraction, y: Fraction) -> Tuple[Fraction, str]:
+        # Powers of 0 and 1 are the same for any exponent (and negative numbers have only integer ones here)
+        if x == 0 or x == 1:
+            return x, ""
+        if x == -1:
+            return Fraction(-1 if y.numerator % 2 == 1 else 1), ""
+
+        if abs(y.numerator) * fraction_bits(x) > 2 * my_eval.MAX_INTEGER_BITS * y.denominator:
+            return x, TOO_LARGE
+
+        # x ^ (p / q) is rational only if x has rational q-th root
+        numerator_root = integer_root(x.numerator, y.denominator)
+        denominator_root = integer_root(x.denominator, y.denominator)
+
+        if numerator_root is None or denominator_root is None:
+            return x, NOT_RATIONAL
+
+        return Fraction(numerator_root, denominator_root) ** y.numerator, ""
+
+    def function(self, name: str, x: Fraction) -> Tuple[Fraction, str]:
+        if name == "sqrt":
+            return self.power(x, Fraction(1, 2))
+
+        value = RATIONAL_VALUES[name].get(x)
+
+        return (x, NOT_RATIONAL) if value is None else (value, "")
+
+    def logarithm(self, x: Fraction, base: Fraction) -> Tuple[Fraction, str]:
+        # Guess the rational logarithm from floats and check it exactly, logarithms of the numerators and denominators
+        # are taken separately, as big fractions do not fit into floats
+        exponent = Fraction(fraction_log(x) / fraction_log(base)).limit_denominator(1000)
+        result, error = self.power(base, exponent)
+
+        return (exponent, "") if error == "" and result == x else (x, NOT_RATIONAL)
+
+    def format(self, x: Fraction) -> str:
+        return str(x)
+
+def down(x: float) -> float:
+    return nextafter(x, -inf)
+
+def up(x: float) -> float:
+    return nextafter(x, inf)
+
+def outward(lower: float, upper: float) -> Interval:
+    """
+    Returns [<lower>, <upper>] rounded outward by one unit in the last place, so it contains the exact result
+    of a correctly rounded operation. NaN from infinite bounds (e.g. inf - inf) becomes an infinite bound.
+    """
+    return down(lower) if lower == lower else -inf, up(upper) if upper == upper else inf
+
+# Smallest positive normal float, products below it may lose bits.
+MIN_NORMAL = 2.2250738585072014e-308
+
+def significand(x: float) -> int:
+    numerator = abs(x.as_integer_ratio()[0])
+    return numerator // (numerator & -numerator)
+
+def sum_bounds(a: float, b: float) -> Interval:
+    """
+    Returns the floats just below and above the exact <a> + <b>, which are the same float if the sum is exact.
+    The rounding error of the sum is computed exactly (TwoSum), so the bounds are widened only in its direction.
+    """
+    total = a + b
+
+    if isinf(total) or total != total:
+        return outward(total, total)
+
+    b_part = total - a
+    error = (a - (total - b_part)) + (b - b_part)
+
+    return total if error >= 0 else down(total), total if error <= 0 else up(total)
+
+def product_bounds(a: float, b: float) -> Interval:
+    if a == 0 or b == 0:
+        # 0 * inf is NaN, but the bound of it is 0
+        return 0.0, 0.0
+
+    product = a * b
+
+    # The product is exact, when the product of the significands fits into 53 bits
+    if MIN_NORMAL <= abs(product) < inf and (significand(a) * significand(b)).bit_length() <= 53:
+        return product, product
+
+    return outward(product, product)
+
+def quotient_bounds(a: float, b: float) -> Interval:
+    quotient = a / b
+
+    if quotient != 0 and product_bounds(quotient, b) == (a, a):
+        return quotient, quotient
+
+    return outward(quotient, quotient)
+
+def outward_function(lower: float, upper: float) -> Interval:
+    # The functions of the math module are not correctly rounded, but their error is within one unit in the last place
+    return down(down(lower)), up(up(upper))
+
+@lru_cache(maxsize=4096)
+def literal_interval(literal: str) -> Interval:
+    value = float(literal.replace(",", "."))
+
+    if isinf(value):
+        return 1.7976931348623157e308, inf
+
+    if Fraction(literal.replace(",", ".")) == value:
+        return value, value
+
+    return down(value), up(value)
+
+def is_integer_point(x: Interval) -> bool:
+    return x[0] == x[1] and x[0].is_integer()
+
+def contains_integer(x: Interval) -> bool:
+    return isinf(x[0]) or isinf(x[1]) or ceil(x[0]) <= x[1]
+
+def contains_maximum(lower: float, upper: float, maximum_at: float, period: float) -> bool:
+    """
+    Returns whether [<lower>, <upper>] contains maximum_at + k * period for some integer k. Near the boundaries
+    it rather answers True, which only makes the bounds wider.
+    """
+    margin = 1e-12 * max(1.0, abs(lower), abs(upper))
+    k = ceil((lower - margin - maximum_at) / period)
+
+    return maximum_at + k * period <= upper + margin
+
+# Names of NumericBackend.function in the unary functions of expressions
+INTERVAL_FUNCTION_NAMES: Dict[str, str] = {"sqrt" : "sroot", "asin" : "arcsin", "acos" : "arccos", "atan" : "arctan"}
+
+class IntervalBackend(NumericBackend):
+    """
+    Float intervals rounded outward, so the result of an expression is guaranteed to contain the exact value
+    of the expression (with its decimal numbers as written). Domain checks are applied to whole intervals,
+    e.g. ln of an interval containing 0 is an error, even if the point estimate is positive.
+    """
+    def __init__(self) -> None:
+        self.unary_functions: Dict[str, Callable[[Interval], Tuple[Interval, str]]] = {
+            "sroot" : lambda x: self.binary("yth_root", x, (2.0, 2.0)), "ln" : self.ln, "abs" : self.abs,
+            "sin" : lambda x: self.periodic(sin, x, pi / 2), "cos" : lambda x: self.periodic(cos, x, 0.0), "tan" : self.tan,
+            "arcsin" : lambda x: self.inverse(asin, x, "asin"), "arccos" : lambda x: self.inverse(acos, x, "acos"), "arctan" : self.atan}
+        self.binary_functions: Dict[str, Callable[[Interval, Interval], Tuple[Interval, str]]] = {
+            "+" : self.add, "-" : self.subtract, "*" : self.multiply, "/" : self.divide, "^" : self.power,
+            "mod" : self.modulo, "yth_root" : self.root, "log_base" : self.logarithm}
+
+    def number(self, literal: str) -> Interval:
+        return literal_interval(literal)
+
+    def convert(self, value: Union[int, float]) -> Interval:
+        point = float(value)
+        return (point, point) if point == value else outward(point, point)
+
+    def constant(self, name: str) -> Tuple[Interval, str]:
+        # math.pi and math.e are both just below the exact constants
+        return ((pi, up(pi)) if name == "pi" else (e, up(e))), ""
+
+    def unary(self, name: str, x: Interval) -> Tuple[Interval, str]:
+        return self.unary_functions[name](x)
+
+    def binary(self, name: str, x: Interval, y: Interval) -> Tuple[Interval, str]:
+        return self.binary_functions[name](x, y)
+
+    def is_integer(self, x: Interval) -> bool:
+        return is_integer_point(x)
+
+    def arithmetic(self, operator: str, x: Interval, y: Interval) -> Tuple[Interval, str]:
+        return self.binary_functions[operator](x, y)
+
+    def function(self, name: str, x: Interval) -> Tuple[Interval, str]:
+        # Domains of intervals are checked by the functions themselves, unary and binary do not use the shared checks
+        return self.unary_functions[INTERVAL_FUNCTION_NAMES.get(name, name)](x)
+
+    @staticmethod
+    def add(x: Interval, y: Interval) -> Tuple[Interval, str]:
+        return (sum_bounds(x[0], y[0])[0], sum_bounds(x[1], y[1])[1]), ""
+
+    @staticmethod
+    def subtract(x: Interval, y: Interval) -> Tuple[Interval, str]:
+        return (sum_bounds(x[0], -y[1])[0], sum_bounds(x[1], -y[0])[1]), ""
+
+    @staticmethod
+    def multiply(x: Interval, y: Interval) -> Tuple[Interval, str]:
+        if x[0] == x[1] and y[0] == y[1]:
+            return product_bounds(x[0], y[0]), ""
+
+        products = [product_bounds(a, b) for a in x for b in y]
+        return (min(lower for lower, _ in products), max(upper for _, upper in products)), ""
+
+    @staticmethod
+    def divide(x: Interval, y: Interval) -> Tuple[Interval, str]:
+        if y[0] <= 0 <= y[1]:
+            return x, "Division by zero."
+
+        # Division is monotonic in both arguments, when the divisor does not contain 0
+        quotients = [quotient_bounds(a, b) for a in x for b in y]
+        lower, upper = min(lower for lower, _ in quotients), max(upper for _, upper in quotients)
+
+        return (lower if lower == lower else -inf, upper if upper == upper else inf), ""
+
+    @staticmethod
+    def modulo(x: Interval, y: Interval) -> Tuple[Interval, str]:
+        if y[0] <= 0 <= y[1]:
+            return x, "Right operand of mod is 0."
+
+        if not contains_integer(x) or not contains_integer(y):
+            return x, "Modulus with non-integer arguments"
+
+        # Bounds of a number that is not exact in floats (e.g. an integer above 2 ^ 53) do not show if it is an integer
+        if not is_integer_point(x) or not is_integer_point(y):
+            return x, TOO_WIDE
+
+        result = x[0] % y[0]
+        return (result, result), ""
+
+    @staticmethod
+    def corners(x: Interval, y: Interval) -> Tuple[Interval, str]:
+        """
+        Returns bounds of x ^ y for positive x, where the power is monotonic in both arguments.
+        """
+        try:
+            powers = [a ** b for a in x for b in y]
+        except OverflowError:
+            return x, TOO_LARGE
+        except ZeroDivisionError:
+            return x, "Division by zero"
+
+        return outward_function(min(powers), max(powers)), ""
+
+    def power(self, x: Interval, y: Interval) -> Tuple[Interval, str]:
+        if x[0] <= 0 <= x[1] and y[0] <= 0 <= y[1]:
+            return x, "Undefined"
+
+        if not is_integer_point(y):
+            if x[0] <= 0:
+                return x, "non_integer power of negative number"
+
+            return self.corners(x, y)
+
+        n = int(y[0])
+
+        if n < 0:
+            if x[0] <= 0 <= x[1]:
+                return x, "Division by zero"
+
+            return self.power(self.divide((1.0, 1.0), x)[0], (-y[0], -y[0]))
+
+        try:
+            lower, upper = self.integer_power(x[0], n), self.integer_power(x[1], n)
+        except OverflowError:
+            return x, TOO_LARGE
+
+        if n % 2 == 1:
+            return (lower[0], upper[1]), ""
+
+        # Even powers are not negative, even when the rounded bound of a tiny power is
+        if x[0] >= 0:
+            return (max(lower[0], 0.0), upper[1]), ""
+
+        if x[1] <= 0:
+            return (max(upper[0], 0.0), lower[1]), ""
+
+        return (0.0, max(lower[1], upper[1])), ""
+
+    @staticmethod
+    def integer_power(a: float, n: int) -> Interval:
+        power = a ** n
+
+        # Powers of short significands are exact, e.g. 2 ^ 10 or 0.5 ^ 3
+        if a == 0 or MIN_NORMAL <= abs(power) < inf and n * significand(a).bit_length() <= 53:
+            return power, power
+
+        return outward_function(power, power)
+
+    def root(self, x: Interval, y: Interval) -> Tuple[Interval, str]:
+        if y[0] == y[1] or ceil(y[0]) > y[1]:
+            return self.root_cases(x, y)
+
+        # root jumps from powers to roots at odd integers and 2, so the bounds cover both cases
+        integer = float(ceil(y[0]))
+
+        if integer + 1 <= y[1]:
+            return x, TOO_WIDE
+
+        (lower, upper), error = self.root_cases(x, (integer, integer))
+        (other_lower, other_upper), other_error = self.root_cases(x, y)
+
+        return (x, error or other_error) if error or other_error else ((min(lower, other_lower), max(upper, other_upper)), "")
+
+    def root_cases(self, x: Interval, y: Interval) -> Tuple[Interval, str]:
+        # The same cases as root in my_eval
+        if is_integer_point(y) and y[0] % 2 == 1:
+            if y[0] < 0 and x[0] <= 0 <= x[1]:
+                return x, "Division by zero"
+
+            exponent = outward(1 / y[0], 1 / y[0])
+            bounds: List[Interval] = []
+
+            for value in x:
+                magnitude, error = self.corners((abs(value), abs(value)), exponent)
+
+                if error != "":
+                    return x, error
+
+                bounds.append(magnitude if value >= 0 else (-magnitude[1], -magnitude[0]))
+
+            # Odd roots are increasing, their reciprocals decreasing
+            return ((bounds[0][0], bounds[1][1]) if y[0] > 0 else (bounds[1][0], bounds[0][1])), ""
+
+        if x[0] >= 0:
+            if y == (2.0, 2.0):
+                lower, upper = sqrt(x[0]), sqrt(x[1])
+
+                # sqrt is correctly rounded and exact roots (e.g. sroot 4) stay exact
+                return ((lower if product_bounds(lower, lower) == (x[0], x[0]) else down(lower),
+                         upper if product_bounds(upper, upper) == (x[1], x[1]) else up(upper))), ""
+
+            return self.power(x, y)
+
+        return x, "Negative number in a root."
+
+    @staticmethod
+    def ln(x: Interval) -> Tuple[Interval, str]:
+        if x[0] <= 0:
+            return x, "Non-positive number in ln."
+
+        return outward_function(log(x[0]), log(x[1])), ""
+
+    def logarithm(self, x: Interval, base: Interval) -> Tuple[Interval, str]:
+        if x[0] <= 0:
+            return x, "Non-positive number in log."
+
+        # math.log fails for these bases
+        if base[0] <= 0 or base[0] <= 1 <= base[1]:
+            return x, "Math error"
+
+        return self.divide(self.ln(x)[0], self.ln(base)[0])
+
+    @staticmethod
+    def abs(x: Interval) -> Tuple[Interval, str]:
+        if x[0] >= 0:
+            return x, ""
+
+        if x[1] <= 0:
+            return (-x[1], -x[0]), ""
+
+        return (0.0, max(-x[0], x[1])), ""
+
+    @staticmethod
+    def periodic(function: Callable[[float], float], x: Interval, maximum_at: float) -> Tuple[Interval, str]:
+        """
+        Returns bounds of sin or cos (<function> with maxima at <maximum_at> + 2 k pi) on <x>.
+        """
+        if x[1] - x[0] >= 2 * pi or max(abs(x[0]), abs(x[1])) > 2 ** 50:
+            return (-1.0, 1.0), ""
+
+        lower, upper = outward_function(min(function(x[0]), function(x[1])), max(function(x[0]), function(x[1])))
+
+        if contains_maximum(x[0], x[1], maximum_at, 2 * pi):
+            upper = 1.0
+
+        if contains_maximum(x[0], x[1], maximum_at + pi, 2 * pi):
+            lower = -1.0
+
+        return (max(lower, -1.0), min(upper, 1.0)), ""
+
+    @staticmethod
+    def tan(x: Interval) -> Tuple[Interval, str]:
+        if x[1] - x[0] >= pi or contains_maximum(x[0], x[1], pi / 2, pi):
+            return x, UNBOUNDED
+
+        return outward_function(tan(x[0]), tan(x[1])), ""
+
+    @staticmethod
+    def inverse(function: Callable[[float], float], x: Interval, name: str) -> Tuple[Interval, str]:
+        if x[0] < -1 or x[1] > 1:
+            return x, name + " value out of [-1, 1]"
+
+        bounds = function(x[0]), function(x[1])
+        return outward_function(min(bounds), max(bounds)), ""
+
+    @staticmethod
+    def atan(x: Interval) -> Tuple[Interval, str]:
+        if x[0] < -pi / 2 or x[1] > pi / 2:
+            return x, "atan value out of [-pi/2, pi/2]"
+
+        return outward_function(atan(x[0]), atan(x[1])), ""
+
+    def format(self, x: Interval) -> str:
+        return ("[" + str(x[0]) + "; " + str(x[1]) + "]").replace(".", ",")
+
+@lru_cache(maxsize=None)
+def decimal_backend(precision: int) -> DecimalBackend:
+    """
+    Returns the backend with <precision> digits, its context and constants are computed only once.
+    """
+    return DecimalBackend(precision)
+
+FRACTION_BACKEND = FractionBackend()
+INTERVAL_BACKEND = IntervalBackend()
+
+BACKENDS = ["float", "decimal", "fraction", "interval"]
+
+@lru_cache(maxsize=256)
+def parse_for_backend(expression: str, variables: Tuple[str, ...]) -> Tuple[Optional[Ast_node], str]:
+    lexemes = lex_expr(expression, variables)
+
+    if lexemes is None:
+        return None, invalid_at(expression, lexing_error_position(expression, variables))
+
+    return parse_expr(expression, lexemes)
+
+def evaluate_backend_ast(root: Ast_node, backend: NumericBackend, variables: Dict[str, Union[int, float]]) -> Tuple[Number, str]:
+    """
+    Evaluates AST with root node equal to <root> with the numbers of <backend>, returns the result and the error
+    (empty string if no error occured) like evaluate_ast.
+    """
+    values: List[Number] = []
+    stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+    while stack:
+        node, children_evaluated = stack.pop()
+
+        if not children_evaluated and node.children:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+            continue
+
+        if node.token.type == Type.VARIABLE:
+            if node.token.value not in variables:
+                return 0, "Missing value of variable " + node.token.value
+
+            result, error = backend.convert(variables[node.token.value]), ""
+        elif node.token.value in ("pi", "e"):
+            result, error = backend.constant(node.token.value)
+        elif not node.children:
+            result, error = backend.number(node.token.value), ""
+        elif len(node.children) == 1:
+            result, error = backend.unary(node.token.value, values.pop())
+        else:
+            y = values.pop()
+            result, error = backend.binary(node.token.value, values.pop(), y)
+
+        if error != "":
+            return result, error
+
+        values.append(result)
+
+    return values[0], ""
+
+def evaluate_with_backend(expression: str, backend: str = "float", precision: int = 28,
+                          variables: Optional[Dict[str, Union[int, float]]] = None) -> str:
+    """
+    Evaluates <expression> like evaluation, but with the numbers of <backend>: "float" (evaluation itself),
+    "decimal" (Decimal with <precision> significant digits), "fraction" (exact rational numbers) or "interval"
+    (bounds of the exact result, see IntervalBackend).
+    E.g. evaluate_with_backend("0,1 + 0,2", "decimal") returns "0,3", which is "0,30000000000000004" with floats.
+    """
+    if backend == "float":
+        return evaluation(expression, variables)
+
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend " + backend + ", use one of " + ", ".join(BACKENDS))
+
+    variables = variables or {}
+    root, error = parse_for_backend(expression, tuple(sorted(variables)))
+
+    if error != "":
+        return error
+
+    if root is None:
+        return "0"
+
+    if backend == "decimal":
+        numbers: NumericBackend = decimal_backend(precision)
+    elif backend == "fraction":
+        numbers = FRACTION_BACKEND
+    else:
+        numbers = INTERVAL_BACKEND
+
+    try:
+        result, error = evaluate_backend_ast(root, numbers, variables)
+    except (Overflow, OverflowError):
+        return TOO_LARGE
+    except (DecimalException, ZeroDivisionError, ValueError):
+        # The same as batch_eval.evaluate_line, where the math module raises
+        return "Math error"
+
+    return error if error != "" else numbers.format(result)
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from math import floor, log2
+from typing import List, Tuple
+
+import numpy as np
+
+from my_eval import Ast_node, lex_expr, parse_expr, optimize_ast, invalid_at, lexing_error_position
+from vectorized_eval import evaluate_ast_vectorized, NO_ERROR
+
+# Samples of the first pass are SAMPLE_PIXELS apart, then the midpoint of every interval is evaluated and its halves
+# are refined the same way (until samples are MIN_SAMPLE_PIXELS apart) when the midpoint is further than TOLERANCE_PIXELS
+# from the straight line between the ends or when only some of the three points have a value (the interval is at
+# the border of the domain, e.g. of ln or arcsin).
+SAMPLE_PIXELS = 4
+MIN_SAMPLE_PIXELS = 1 / 8
+TOLERANCE_PIXELS = 0.5
+
+# Samples are cached in tiles of TILE_PIXELS for every scale (power of two units per pixel), so panning samples only
+# the newly visible tiles and zooming back samples nothing. At most MAX_TILES tiles are kept.
+TILE_PIXELS = 256
+MAX_TILES = 512
+
+TileKey = Tuple[int, int, int]
+
+class View():
+    """
+    Visible rectangle [x_min, x_max] x [y_min, y_max] of the plane drawn into <width> x <height> pixels.
+    """
+    def __init__(self, x_min: float, x_max: float, y_min: float, y_max: float, width: int, height: int) -> None:
+        self.x_min = x_min
+        self.x_max = x_max
+        self.y_min = y_min
+        self.y_max = y_max
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def centered(cls, x_min: float, x_max: float, width: int, height: int) -> 'View':
+        """
+        Returns view of [<x_min>, <x_max>] with the same scale on both axes and the x axis in the middle.
+        """
+        half_height = (x_max - x_min) * height / width / 2
+        return cls(x_min, x_max, -half_height, half_height, width, height)
+
+    def pan(self, dx: float, dy: float) -> 'View':
+        """
+        Returns the view moved by <dx>, <dy> pixels (the picture moves right and down for positive ones).
+        """
+        x_shift = dx * (self.x_max - self.x_min) / self.width
+        y_shift = dy * (self.y_max - self.y_min) / self.height
+
+        return View(self.x_min - x_shift, self.x_max - x_shift, self.y_min + y_shift, self.y_max + y_shift, self.width, self.height)
+
+    def zoom(self, factor: float, x: float, y: float) -> 'View':
+        """
+        Returns the view zoomed in <factor> times (zoomed out for factor < 1) around pixel <x>, <y>, which stays in place.
+        """
+        center_x = self.x_min + x * (self.x_max - self.x_min) / self.width
+        center_y = self.y_max - y * (self.y_max - self.y_min) / self.height
+
+        return View(center_x - (center_x - self.x_min) / factor, center_x + (self.x_max - center_x) / factor,
+                    center_y - (center_y - self.y_min) / factor, center_y + (self.y_max - center_y) / factor, self.width, self.height)
+
+    def resized(self, width: int, height: int) -> 'View':
+        """
+        Returns the view with the same scale and top left corner in a picture of a new size.
+        """
+        return View(self.x_min, self.x_min + (self.x_max - self.x_min) * width / self.width,
+                    self.y_max - (self.y_max - self.y_min) * height / self.height, self.y_max, width, height)
+
+    def to_pixel(self, x: float, y: float) -> Tuple[float, float]:
+        """
+        Returns point (<x>, <y>) in pixels.
+        """
+        return ((x - self.x_min) * self.width / (self.x_max - self.x_min), (self.y_max - y) * self.height / (self.y_max - self.y_min))
+
+    def to_pixels(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Returns points (<xs>, <ys>) in pixels as an array of shape (n, 2). Points far outside are moved closer,
+        so their coordinates fit into integers of painters.
+        """
+        pixels = np.empty((len(xs), 2))
+        pixels[:, 0] = (xs - self.x_min) * (self.width / (self.x_max - self.x_min))
+        pixels[:, 1] = (self.y_max - ys) * (self.height / (self.y_max - self.y_min))
+        np.clip(pixels[:, 1], -10 * self.height, 11 * self.height, out=pixels[:, 1])
+
+        return pixels
+
+class Plotter():
+    """
+    Graph of <expression> in <variable> (e.g. Plotter("sin x ^ 2")). Raises ValueError if the expression is not valid.
+    """
+    def __init__(self, expression: str, variable: str = "x") -> None:
+        lexemes = lex_expr(expression, [variable])
+
+        if lexemes is None:
+            raise ValueError(invalid_at(expression, lexing_error_position(expression, [variable])))
+
+        root, error = parse_expr(expression, lexemes)
+
+        if error != "":
+            raise ValueError(error)
+
+        if root is None:
+            raise ValueError(invalid_at(expression, 0))
+
+        self.expression = expression
+        self.variable = variable
+        self.root: Ast_node = optimize_ast(root)
+        self.tiles: 'OrderedDict[TileKey, Tuple[np.ndarray, np.ndarray]]' = OrderedDict()
+        # Number of evaluated points, which shows how much the cache saves
+        self.evaluated_points = 0
+
+    def evaluate(self, xs: np.ndarray) -> np.ndarray:
+        """
+        Returns values of the expression for <xs>, nan where its evaluation ends with an error.
+        """
+        result, errors, _ = evaluate_ast_vectorized(self.root, {self.variable : xs})
+        ys = np.broadcast_to(np.asarray(result, dtype=float), xs.shape).copy()
+        ys[np.broadcast_to(errors, xs.shape) != NO_ERROR] = np.nan
+        ys[~np.isfinite(ys)] = np.nan
+        self.evaluated_points += len(xs)
+
+        return ys
+
+    def sample_tiles(self, keys: List[TileKey]) -> None:
+        """
+        Samples tiles of <keys> (x scale, y scale and index, which all have the same scales) together, so every pass
+        evaluates the points of all of them at once.
+        """
+        x_scale, y_scale, _ = keys[0]
+        unit = 2.0 ** x_scale
+        tolerance = TOLERANCE_PIXELS * 2.0 ** y_scale
+        intervals_per_tile = TILE_PIXELS // SAMPLE_PIXELS
+
+        starts = np.array([index * TILE_PIXELS * unit for _, _, index in keys])
+        xs = (starts[:, None] + np.arange(intervals_per_tile + 1) * (SAMPLE_PIXELS * unit)).ravel()
+        ys = self.evaluate(xs)
+        tiles = np.repeat(np.arange(len(keys)), intervals_per_tile + 1)
+
+        all_xs, all_ys, all_tiles = [xs], [ys], [tiles]
+
+        # Intervals between neighbouring samples of the same tile
+        left = np.flatnonzero(tiles[:-1] == tiles[1:])
+        left_x, left_y, right_x, right_y, tiles = xs[left], ys[left], xs[left + 1], ys[left + 1], tiles[left]
+
+        while len(left_x):
+            middle_x = (left_x + right_x) / 2
+            middle_y = self.evaluate(middle_x)
+
+            with np.errstate(invalid="ignore"):
+                bend = np.abs(middle_y - (left_y + right_y) / 2) > tolerance
+                outside = (middle_y > np.maximum(left_y, right_y)) | (middle_y < np.minimum(left_y, right_y))
+
+            left_valid, middle_valid, right_valid = ~np.isnan(left_y), ~np.isnan(middle_y), ~np.isnan(right_y)
+            border = (left_valid != middle_valid) | (middle_valid != right_valid)
+            refine = (bend | border) & (right_x - left_x > 2 * MIN_SAMPLE_PIXELS * unit)
+
+            # Intervals that still bend at the smallest width and whose middle is not between their ends are jumps
+            # (e.g. tan at its poles), the graph is broken there instead of joining the ends.
+            middle_y[bend & outside & ~refine] = np.nan
+
+            all_xs.append(middle_x)
+            all_ys.append(middle_y)
+            all_tiles.append(tiles)
+
+            left_x, left_y, right_x, right_y, tiles = (np.concatenate([left_x[refine], middle_x[refine]]),
+                                                       np.concatenate([left_y[refine], middle_y[refine]]),
+                                                       np.concatenate([middle_x[refine], right_x[refine]]),
+                                                       np.concatenate([middle_y[refine], right_y[refine]]),
+                                                       np.concatenate([tiles[refine], tiles[refine]]))
+
+        xs, ys, tiles = np.concatenate(all_xs), np.concatenate(all_ys), np.concatenate(all_tiles)
+        order = np.lexsort((xs, tiles))
+        xs, ys, tiles = xs[order], ys[order], tiles[order]
+        bounds = np.searchsorted(tiles, np.arange(len(keys) + 1))
+
+        for i, key in enumerate(keys):
+            self.tiles[key] = (xs[bounds[i] : bounds[i + 1]], ys[bounds[i] : bounds[i + 1]])
+
+        while len(self.tiles) > MAX_TILES:
+            self.tiles.popitem(last=False)
+
+    def samples(self, view: View) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns sorted points of the graph covering the x range of <view>, with nan where it is broken.
+        Samples are taken with the scale that is the nearest power of two at least as fine as the scale of <view>.
+        """
+        x_scale = floor(log2((view.x_max - view.x_min) / view.width))
+        y_scale = floor(log2((view.y_max - view.y_min) / view.height))
+        tile_width = TILE_PIXELS * 2.0 ** x_scale
+
+        keys = [(x_scale, y_scale, index) for index in range(floor(view.x_min / tile_width), floor(view.x_max / tile_width) + 1)]
+        missing = [key for key in keys if key not in self.tiles]
+
+        if missing:
+            self.sample_tiles(missing)
+
+        for key in keys:
+            self.tiles.move_to_end(key)
+
+        return (np.concatenate([self.tiles[key][0] for key in keys]), np.concatenate([self.tiles[key][1] for key in keys]))
+
+    def polylines(self, view: View) -> List[np.ndarray]:
+        """
+        Returns the graph in <view> as polylines in pixels (arrays of shape (n, 2)), one for every continuous part.
+        """
+        xs, ys = self.samples(view)
+        pixels = view.to_pixels(xs, ys)
+        valid = ~np.isnan(ys)
+
+        # Starts and ends of the runs of valid points
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], valid, [False]]).astype(np.int8)))
+
+        return [pixels[start : end] for start, end in zip(edges[::2], edges[1::2]) if end - start > 1]
@@ -0,0 +1,155 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from my_eval import result_value, normalize_expression, cache_stats
+from batch_eval import evaluate_line, chunks, CHUNK_SIZE
+from async_eval import MEMORY_EXCEEDED
+from history import HistoryEntry, HistoryStore, HISTORY_FILE
+
+# Results recorded when the expression ran out of its budget (the GUI shows TIMED_OUT like this), replaying them
+# without the budget could take forever
+SKIPPED_RESULTS = {"timed out", MEMORY_EXCEEDED}
+
+Variables = Dict[str, Union[int, float]]
+# Normalized expression and the result that is its ans, if the expression can use it (the result and not its value,
+# so ans 2 and 2,0 are different)
+JobKey = Tuple[str, Optional[str]]
+
+class ReplayDifference(NamedTuple):
+    expression: str
+    # Result that was ans when the expression was evaluated
+    ans: Optional[str]
+    recorded: str
+    replayed: str
+
+class ReplayReport(NamedTuple):
+    entries: int
+    skipped: int
+    # Number of distinct (expression, ans) pairs, each of them is evaluated once
+    evaluated: int
+    differences: List[ReplayDifference]
+    seconds: float
+    cache_hits: int
+
+def entries_from_notes(text: str) -> List[HistoryEntry]:
+    """
+    Returns entries written to a tab of notes by "Save to notes" (the expression on a line ending with " =",
+    the result on the next one), in the order of <text>. Notes do not record times, they are 0.
+    """
+    lines = text.splitlines()
+
+    return [HistoryEntry(line[:-len(" =")], lines[i + 1], 0) for i, line in enumerate(lines[:-1]) if line.endswith(" =")]
+
+def evaluate_jobs(jobs: List[Tuple[str, Variables]]) -> List[str]:
+    return [evaluate_line(expression, variables) for expression, variables in jobs]
+
+def results_equal(recorded: str, replayed: str, tolerance: float) -> bool:
+    """
+    Returns whether the results are the same, numbers may differ by <tolerance> relative to their size.
+    """
+    if recorded == replayed:
+        return True
+
+    recorded_value, replayed_value = result_value(recorded), result_value(replayed)
+
+    if recorded_value is None or replayed_value is None:
+        return False
+
+    return abs(recorded_value - replayed_value) <= tolerance * max(abs(recorded_value), abs(replayed_value))
+
+def replay(entries: Iterable[HistoryEntry], workers: int = 1, tolerance: float = 0.0) -> ReplayReport:
+    """
+    Evaluates expressions of <entries> (oldest first) again and returns the results which differ from the recorded ones.
+    ans of every expression is the recorded result before it, like it was in the calculator, so every distinct
+    expression with its ans is evaluated only once and they do not depend on each other. They are evaluated in chunks
+    by <workers> processes, if there are more of them.
+    """
+    start = perf_counter()
+    hits_before = cache_stats()["hits"]
+
+    jobs: Dict[JobKey, Tuple[str, Variables]] = {}
+    replayed_entries: List[Tuple[HistoryEntry, JobKey]] = []
+    count = 0
+    ans: Optional[str] = None
+
+    # History repeats the same expressions and results many times
+    normalize = lru_cache(maxsize=None)(normalize_expression)
+    value = lru_cache(maxsize=None)(result_value)
+
+    for entry in entries:
+        count += 1
+
+        if entry.result not in SKIPPED_RESULTS:
+            expression = normalize(entry.expression)
+            # Expressions without ans have the same result for any of its values
+            key = (expression, ans if "ans" in expression else None)
+
+            if key not in jobs:
+                jobs[key] = (expression, {} if ans is None else {"ans" : value(ans)})
+
+            replayed_entries.append((entry, key))
+
+        if value(entry.result) is not None:
+            ans = entry.result
+
+    if workers > 1 and len(jobs) > CHUNK_SIZE:
+        with ProcessPoolExecutor(workers) as executor:
+            results = [result for chunk in executor.map(evaluate_jobs, chunks(jobs.values(), CHUNK_SIZE)) for result in chunk]
+    else:
+        results = evaluate_jobs(list(jobs.values()))
+
+    replayed = dict(zip(jobs, results))
+    differences = [ReplayDifference(entry.expression, key[1], entry.result, replayed[key]) for entry, key in replayed_entries
+                   if not results_equal(entry.result, replayed[key], tolerance)]
+
+    return ReplayReport(count, count - len(replayed_entries), len(jobs), differences, perf_counter() - start,
+                        cache_stats()["hits"] - hits_before)
+
+def print_report(report: ReplayReport) -> None:
+    for difference in report.differences:
+        ans = "" if difference.ans is None or "ans" not in difference.expression else f" (ans = {difference.ans})"
+        print(f"{difference.expression} ={ans}\n    recorded: {difference.recorded}\n    replayed: {difference.replayed}")
+
+    rate = report.evaluated / report.seconds if report.seconds > 0 else 0
+    print(f"{report.entries} entries, {report.skipped} skipped, {report.evaluated} evaluated in {report.seconds:.3f} s "
+          f"({rate:.0f} expressions/s, {report.cache_hits} cache hits), {len(report.differences)} differences")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluates saved history or notes again and shows results that changed.")
+    parser.add_argument("--history", default=HISTORY_FILE, help="database of history (the one of the calculator by default)")
+    parser.add_argument("--notes", help="text file of notes to replay instead of history")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="number of worker processes (0 for one per CPU)")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="relative difference of numbers that is not reported")
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.workers < 0:
+        parser.error("number of workers can not be negative")
+
+    workers = arguments.workers or os.cpu_count() or 1
+
+    if arguments.notes is not None:
+        with open(arguments.notes, encoding="utf-8") as file:
+            report = replay(entries_from_notes(file.read()), workers, arguments.tolerance)
+    else:
+        if not os.path.exists(arguments.history):
+            parser.error("history " + arguments.history + " does not exist")
+
+        store = HistoryStore(arguments.history)
+
+        try:
+            report = replay(store.all_entries(), workers, arguments.tolerance)
+        finally:
+            store.close()
+
+    print_report(report)
+
+    return 1 if report.differences else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
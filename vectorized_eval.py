@@ -0,0 +1,273 @@
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from my_eval import Ast_node, Type, lex_expr, parse_expr, optimize_ast, invalid_at, lexing_error_position, TOO_LARGE
+
+# Index in this list is the error code used in the error arrays, 0 means no error. Messages are the same
+# as in my_eval, "Math error" is used where the scalar evaluation raises an exception of the math module.
+ERROR_MESSAGES: List[str] = ["",
+                             "Negative number in a root.",
+                             "Non-positive number in ln.",
+                             "Non-positive number in log.",
+                             "asin value out of [-1, 1]",
+                             "acos value out of [-1, 1]",
+                             "atan value out of [-pi/2, pi/2]",
+                             "Division by zero.",
+                             "Right operand of mod is 0.",
+                             "Modulus with non-integer arguments",
+                             "Undefined",
+                             "Division by zero",
+                             "non_integer power of negative number",
+                             TOO_LARGE,
+                             "Math error"]
+
+ERROR_CODES: Dict[str, int] = {message : code for code, message in enumerate(ERROR_MESSAGES)}
+
+NO_ERROR = 0
+MATH_ERROR = ERROR_CODES["Math error"]
+
+INT64_MIN, INT64_MAX = int(np.iinfo(np.int64).min), int(np.iinfo(np.int64).max)
+
+# Values of one node: array of values, array of error codes and whether the values are integers
+# (which is known for the whole array, because it depends only on the expression and dtypes of the inputs).
+Vector = Tuple[np.ndarray, np.ndarray, bool]
+
+def errors_where(mask: np.ndarray, message: str) -> np.ndarray:
+    return np.where(mask, ERROR_CODES[message], NO_ERROR).astype(np.int8)
+
+def math_errors(result: np.ndarray, *arguments: np.ndarray) -> np.ndarray:
+    """
+    Returns error codes for elements where a function of the math module would raise an exception,
+    that is where <result> is nan but no argument is or it is infinite while all arguments are finite.
+    """
+    nan_arguments = np.zeros(np.shape(result), dtype=bool)
+    finite_arguments = np.ones(np.shape(result), dtype=bool)
+
+    for argument in arguments:
+        nan_arguments |= np.isnan(argument)
+        finite_arguments &= np.isfinite(argument)
+
+    failed = np.isnan(result) & ~nan_arguments | np.isinf(result) & finite_arguments
+    return np.where(failed, MATH_ERROR, NO_ERROR).astype(np.int8)
+
+def overflow_errors(result: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Returns TOO_LARGE error codes for elements where a power of finite numbers does not fit into a float
+    (infinite power of zero is a math error, as math.pow raises ValueError for it).
+    """
+    return errors_where(np.isinf(result) & np.isfinite(x) & np.isfinite(y) & (x != 0), TOO_LARGE)
+
+def first_error(*errors: np.ndarray) -> np.ndarray:
+    """
+    Returns for every element the first non-zero error code from <errors> (or 0).
+    """
+    result = errors[-1]
+
+    for error in reversed(errors[:-1]):
+        result = np.where(error != NO_ERROR, error, result)
+
+    return result
+
+def vector_root(x: np.ndarray, x_integer: bool, y: np.ndarray, y_integer: bool) -> Vector:
+    x = np.asarray(x, dtype=float)
+    odd = (y % 2 == 1) if y_integer else np.zeros(np.shape(y), dtype=bool)
+    odd_root = np.where(x < 0, -np.power(np.abs(x), 1 / y), np.power(np.abs(x), 1 / y))
+    other_root = np.where(y == 2, np.sqrt(np.abs(x)), np.power(np.abs(x), y))
+
+    result = np.where(odd, odd_root, other_root)
+    errors = first_error(errors_where((x == 0) & (y < 0), "Division by zero"), errors_where(~odd & (x < 0), "Negative number in a root."),
+                         overflow_errors(result, x, y), math_errors(result, x, y))
+
+    return result, errors, False
+
+def vector_sroot(x: np.ndarray, x_integer: bool) -> Vector:
+    return vector_root(x, x_integer, np.asarray(2), True)
+
+def vector_ln(x: np.ndarray, x_integer: bool) -> Vector:
+    result = np.log(np.where(x > 0, x, 1))
+    return result, errors_where(~(x > 0), "Non-positive number in ln."), False
+
+def vector_log(x: np.ndarray, x_integer: bool, base: np.ndarray, base_integer: bool) -> Vector:
+    # math.log fails for base outside of the domain of ln or equal to 1
+    wrong_base = np.where((base <= 0) | (base == 1), MATH_ERROR, NO_ERROR).astype(np.int8)
+    result = np.log(np.where(x > 0, x, 1)) / np.log(np.where(wrong_base != NO_ERROR, 2, base))
+    errors = first_error(errors_where(x <= 0, "Non-positive number in log."), wrong_base, math_errors(result, x, base))
+
+    return result, errors, False
+
+def vector_asin(x: np.ndarray, x_integer: bool) -> Vector:
+    outside = (x < -1) | (x > 1)
+    return np.arcsin(np.where(outside, 0, x)), errors_where(outside, "asin value out of [-1, 1]"), False
+
+def vector_acos(x: np.ndarray, x_integer: bool) -> Vector:
+    outside = (x < -1) | (x > 1)
+    return np.arccos(np.where(outside, 0, x)), errors_where(outside, "acos value out of [-1, 1]"), False
+
+def vector_atan(x: np.ndarray, x_integer: bool) -> Vector:
+    outside = (x < -np.pi / 2) | (x > np.pi / 2)
+    return np.arctan(x), errors_where(outside, "atan value out of [-pi/2, pi/2]"), False
+
+def vector_math_function(function: Callable[[np.ndarray], np.ndarray]) -> Callable[[np.ndarray, bool], Vector]:
+    def vector_function(x: np.ndarray, x_integer: bool) -> Vector:
+        result = function(x)
+        return result, math_errors(result, x), False
+
+    return vector_function
+
+def vector_abs(x: np.ndarray, x_integer: bool) -> Vector:
+    return np.abs(x), np.zeros(np.shape(x), dtype=np.int8), x_integer
+
+def vector_div(x: np.ndarray, x_integer: bool, y: np.ndarray, y_integer: bool) -> Vector:
+    zero = y == 0
+    return np.true_divide(x, np.where(zero, 1, y)), errors_where(zero, "Division by zero."), False
+
+def vector_mod(x: np.ndarray, x_integer: bool, y: np.ndarray, y_integer: bool) -> Vector:
+    zero = y == 0
+    errors = errors_where(zero, "Right operand of mod is 0.")
+
+    if not x_integer or not y_integer:
+        return np.zeros(np.broadcast(x, y).shape), first_error(errors, errors_where(~zero, "Modulus with non-integer arguments")), True
+
+    return np.mod(x, np.where(zero, 1, y)), errors, True
+
+def vector_pow(x: np.ndarray, x_integer: bool, y: np.ndarray, y_integer: bool) -> Vector:
+    undefined = (x == 0) & (y == 0)
+
+    if y_integer:
+        domain = errors_where((x == 0) & (y < 0), "Division by zero")
+    else:
+        domain = errors_where(x <= 0, "non_integer power of negative number")
+
+    result = np.power(np.asarray(x, dtype=float), y)
+
+    return result, first_error(errors_where(undefined, "Undefined"), domain, overflow_errors(result, x, y), math_errors(result, x, y)), False
+
+def vector_arithmetic(operation: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> Callable[[np.ndarray, bool, np.ndarray, bool], Vector]:
+    def vector_function(x: np.ndarray, x_integer: bool, y: np.ndarray, y_integer: bool) -> Vector:
+        result = operation(x, y)
+
+        # Integers of NumPy wrap around (e.g. 2 ^ 40 * 2 ^ 40 is 0), where the integers of evaluate_ast just grow,
+        # so results out of the range of the dtype are computed with floats, as all of them are converted at the end
+        if np.issubdtype(np.result_type(result), np.integer) and np.size(result) > 0:
+            limits = np.iinfo(np.result_type(result))
+
+            # +, - and * are extreme at the corners of the ranges of the operands, the elements are checked only if those
+            # get near the limits of the dtype
+            corners = [operation(float(a), float(b)) for a in (np.min(x), np.max(x)) for b in (np.min(y), np.max(y))]
+
+            if min(corners) < float(limits.min) / 2 or max(corners) >= float(limits.max) / 2:
+                float_result = operation(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+                # Wrapped results differ from the floats by a multiple of 2 ^ bits, far more than the rounding of the floats
+                if np.any(np.abs(float_result - np.asarray(result, dtype=float)) >= 2.0 ** (limits.bits - 1)):
+                    result = float_result
+
+        return result, np.zeros(np.shape(result), dtype=np.int8), x_integer and y_integer
+
+    return vector_function
+
+VECTOR_UNARY_FUNCTIONS: Dict[str, Callable[[np.ndarray, bool], Vector]] = {"sroot" : vector_sroot,
+                                                                           "ln" : vector_ln,
+                                                                           "abs" : vector_abs,
+                                                                           "sin" : vector_math_function(np.sin),
+                                                                           "cos" : vector_math_function(np.cos),
+                                                                           "tan" : vector_math_function(np.tan),
+                                                                           "arcsin" : vector_asin,
+                                                                           "arccos" : vector_acos,
+                                                                           "arctan" : vector_atan}
+
+VECTOR_BINARY_FUNCTIONS: Dict[str, Callable[[np.ndarray, bool, np.ndarray, bool], Vector]] = {"+" : vector_arithmetic(np.add),
+                                                                                               "-" : vector_arithmetic(np.subtract),
+                                                                                               "*" : vector_arithmetic(np.multiply),
+                                                                                               "/" : vector_div,
+                                                                                               "^" : vector_pow,
+                                                                                               "mod" : vector_mod,
+                                                                                               "log_base" : vector_log,
+                                                                                               "yth_root" : vector_root}
+
+def evaluate_leaf(node: Ast_node, arrays: Dict[str, np.ndarray]) -> Vector:
+    if node.token.type == Type.VARIABLE:
+        array = arrays[node.token.value]
+        return array, np.zeros(np.shape(array), dtype=np.int8), bool(np.issubdtype(array.dtype, np.integer))
+
+    if node.number is not None:
+        if INT64_MIN <= node.number <= INT64_MAX:
+            return np.asarray(node.number), np.asarray(NO_ERROR, dtype=np.int8), True
+
+        # Bigger integers would make arrays of Python objects, which NumPy functions do not support, so they are floats
+        # (with integer values, like the results of vector_arithmetic out of the range of their dtype)
+        try:
+            return np.asarray(float(node.number)), np.asarray(NO_ERROR, dtype=np.int8), True
+        except OverflowError:
+            return np.asarray(np.nan), np.asarray(ERROR_CODES[TOO_LARGE], dtype=np.int8), True
+
+    return np.asarray(node.decimal_number), np.asarray(NO_ERROR, dtype=np.int8), False
+
+def evaluate_ast_vectorized(root: Ast_node, arrays: Dict[str, np.ndarray]) -> Vector:
+    """
+    Evaluates AST with root node equal to <root> for all elements of <arrays> (bound to variables by their names) at once.
+    Every node is evaluated by NumPy functions for the whole arrays, errors of the children take precedence
+    over the error of the node, so every element gets the same error as evaluate_ast would return.
+    """
+    values: List[Vector] = []
+    stack: List[Tuple[Ast_node, bool]] = [(root, False)]
+
+    with np.errstate(all="ignore"):
+        while stack:
+            node, children_evaluated = stack.pop()
+
+            if not node.children:
+                values.append(evaluate_leaf(node, arrays))
+                continue
+
+            if not children_evaluated:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            if len(node.children) == 1:
+                x, x_errors, x_integer = values.pop()
+                result, errors, integer = VECTOR_UNARY_FUNCTIONS[node.token.value](x, x_integer)
+                values.append((result, first_error(x_errors, errors), integer))
+                continue
+
+            y, y_errors, y_integer = values.pop()
+            x, x_errors, x_integer = values.pop()
+            result, errors, integer = VECTOR_BINARY_FUNCTIONS[node.token.value](x, x_integer, y, y_integer)
+            values.append((result, first_error(x_errors, y_errors, errors), integer))
+
+    return values[0]
+
+def evaluate_vectorized(expression: str, **arrays: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluates <expression> for every element of <arrays>, which are bound to the variables of the same name
+    and broadcast against each other (e.g. evaluate_vectorized("sin x ^ 2", x=np.linspace(0, 1, 10 ** 6))).
+
+    Returns an array of results (nan where an error occured) and an array of error codes, which are indices
+    to ERROR_MESSAGES. Raises ValueError if the expression is not valid.
+    """
+    arrays = {name : np.asarray(array) for name, array in arrays.items()}
+
+    lexemes = lex_expr(expression, arrays.keys())
+
+    if lexemes is None:
+        raise ValueError(invalid_at(expression, lexing_error_position(expression, arrays.keys())))
+
+    root, error = parse_expr(expression, lexemes)
+
+    if error != "":
+        raise ValueError(error)
+
+    shape = np.broadcast_shapes(*(np.shape(array) for array in arrays.values()))
+
+    if root is None:
+        return np.zeros(shape), np.zeros(shape, dtype=np.int8)
+
+    result, errors, _ = evaluate_ast_vectorized(optimize_ast(root), arrays)
+
+    result = np.broadcast_to(np.asarray(result, dtype=float), shape).copy()
+    errors = np.broadcast_to(errors, shape).copy()
+    result[errors != NO_ERROR] = np.nan
+
+    return result, errors